@@ -0,0 +1,3 @@
+"""
+Benchmarks, run from the repository root with ``python -m bench.<name>``.
+"""
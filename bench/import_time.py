@@ -0,0 +1,128 @@
+"""
+Import time of the package and the scripts, and what each import pulls in.
+
+Usage::
+
+    python -m bench.import_time [--repeat 5] [--check] [--json]
+
+Every module is imported in a fresh interpreter, ``--repeat`` times, and the
+best time is kept. The report also lists which heavy dependencies (NumPy,
+Pillow, cryptography, art, termcolor) the import loaded and whether it printed
+anything.
+
+With ``--check``, the run fails (exit status 1) if a module listed in
+``LAZY_MODULES`` loads a heavy dependency or if any import prints: those
+imports have to stay side-effect free and start in milliseconds. The modules
+doing the pixel work are measured too, for reference. ``tests/test_import_time.py``
+runs the same checks under pytest.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ('numpy', 'PIL', 'cryptography', 'art', 'termcolor')
+
+# Imports that must not load any heavy dependency
+LAZY_MODULES = (
+    'stego', 'stego.crypto', 'stego.output', 'stego.batch', 'stego.cli',
+    'stego.service', 'stego.server', 'stego.parallel', 'stego.scan',
+    'stego.scripts',
+    'main', 'hide_text_in_image',
+)
+# Imports that need NumPy and Pillow, measured for reference
+EAGER_MODULES = ('stego.container', 'stego.core', 'stego.tiled', 'stego.cache',
+                 'stego.candidates', 'stego.frames', 'stego.stream', 'stego.web')
+
+PROBE = """
+import io, json, sys, time
+captured = io.StringIO()
+stdout, sys.stdout = sys.stdout, captured
+started = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - started
+sys.stdout = stdout
+print(json.dumps({{
+    'seconds': seconds,
+    'loaded': [name for name in {heavy!r} if name in sys.modules],
+    'printed': bool(captured.getvalue()),
+}}))
+"""
+
+
+# Import a module in a fresh interpreter
+def probe(module):
+    """
+    Import a module in a fresh interpreter run from the repository root.
+
+    Args:
+        module (str): The module to import.
+
+    Returns:
+        dict: ``seconds`` taken by the import, the heavy dependencies it
+        ``loaded``, and whether it ``printed`` anything.
+    """
+
+    completed = subprocess.run(
+        [sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY)],
+        capture_output=True, text=True, cwd=ROOT, check=True,
+    )
+    return json.loads(completed.stdout.splitlines()[-1])
+
+# Measure one module over several fresh interpreters
+def measure(module, repeat):
+    """
+    Measure the import of a module, keeping the best of several runs.
+
+    Args:
+        module (str): The module to import.
+        repeat (int): The number of fresh interpreters to use.
+
+    Returns:
+        dict: The module, its best import time in milliseconds, the heavy
+        dependencies loaded and whether the import printed.
+    """
+
+    runs = [probe(module) for _ in range(repeat)]
+    return {
+        'module': module,
+        'milliseconds': round(min(run['seconds'] for run in runs) * 1000, 2),
+        'loaded': runs[0]['loaded'],
+        'printed': any(run['printed'] for run in runs),
+    }
+
+# Run the measurement
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure import times.")
+    parser.add_argument('--repeat', type=int, default=5, help="fresh interpreters per module")
+    parser.add_argument('--check', action='store_true',
+                        help="fail if a lazy import loads a heavy dependency or prints")
+    parser.add_argument('--json', action='store_true', help="print JSON lines instead of a table")
+    args = parser.parse_args(argv)
+
+    failures = []
+    for module in LAZY_MODULES + EAGER_MODULES:
+        result = measure(module, args.repeat)
+        if result['printed']:
+            failures.append(f"importing {module} printed output")
+        if module in LAZY_MODULES and result['loaded']:
+            failures.append(f"importing {module} loaded {', '.join(result['loaded'])}")
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print(f"{module:<20} {result['milliseconds']:>8.2f} ms  "
+                  f"{', '.join(result['loaded']) or '-'}")
+
+    if args.check:
+        for failure in failures:
+            print(failure, file=sys.stderr)
+        return 1 if failures else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,255 @@
+"""
+Load test of the HTTP stand-in server, reporting latency percentiles.
+
+Usage::
+
+    python -m bench.load [--image photo.jpg] [--requests 200] [--concurrency 8]
+                         [--mix 0.5] [--preset fast] [--workers N]
+                         [--max-queue N] [--timeout SECONDS]
+                         [--url http://127.0.0.1:8080] [--json]
+
+Unless ``--url`` points at a running server, ``python -m stego.server`` is
+started on a free port with the given ``--workers``, ``--max-queue`` and
+``--timeout``, and stopped afterwards. ``--concurrency`` clients then send
+``--requests`` requests in total over keep-alive connections, a ``--mix``
+fraction of them ``/hide`` of a short message into ``--image`` and the rest
+``/extract`` from an image hidden once beforehand.
+
+Each request is timed from sending to the last byte of the response. The
+report gives the p50, p90, p99 and max latency of the successful requests by
+endpoint, the throughput, the count of each status and the server's own
+counters. Statuses other than 200 are expected under overload (503 when the
+queue is full, 504 past the timeout) and are counted, not treated as errors.
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_IMAGE = os.path.join(ROOT, 'photo.jpg')
+PASSWORD = 'bench'
+MESSAGE = 'The quick brown fox jumps over the lazy dog.'
+
+
+# Send one request and read its response on a keep-alive connection
+async def request(reader, writer, host, method, path, body=b''):
+    """
+    Send one HTTP/1.1 request and read the whole response.
+
+    Args:
+        reader (asyncio.StreamReader): The connection's reader.
+        writer (asyncio.StreamWriter): The connection's writer.
+        host (str): The value of the Host header.
+        method (str): The HTTP method.
+        path (str): The request path.
+        body (bytes): The request body.
+
+    Returns:
+        tuple: The status code and the response body.
+    """
+
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: {host}\r\n"
+        f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n"
+        .encode('latin-1') + body
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+# Compute a percentile of sorted values
+def percentile(values, fraction):
+    """
+    Pick a percentile of sorted values, by the nearest-rank method.
+
+    Args:
+        values (list): The values, sorted.
+        fraction (float): The percentile, between 0 and 1.
+
+    Returns:
+        float: The value, or None if there are none.
+    """
+
+    if not values:
+        return None
+    return values[max(0, min(len(values), round(fraction * len(values) + 0.5)) - 1)]
+
+# Send requests from a queue over one connection
+async def client(address, jobs, results):
+    host, port = address
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while True:
+            try:
+                endpoint, body = jobs.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            started = time.perf_counter()
+            status, _ = await request(reader, writer, f"{host}:{port}", 'POST', endpoint, body)
+            results.append((endpoint, status, time.perf_counter() - started))
+    finally:
+        writer.close()
+
+# Run the load and collect the results
+async def load(address, bodies, total, concurrency, mix):
+    """
+    Send requests from concurrent clients.
+
+    Args:
+        address (tuple): The host and port of the server.
+        bodies (dict): The request body of each endpoint.
+        total (int): The number of requests.
+        concurrency (int): The number of concurrent connections.
+        mix (float): The fraction of ``/hide`` requests.
+
+    Returns:
+        dict: The report, see the module documentation.
+    """
+
+    jobs = asyncio.Queue()
+    hides = round(total * mix)
+    # Interleave the endpoints so both see the same load
+    for index in range(total):
+        endpoint = '/hide' if (index * hides) // total != ((index + 1) * hides) // total else '/extract'
+        jobs.put_nowait((endpoint, bodies[endpoint]))
+
+    results = []
+    started = time.perf_counter()
+    await asyncio.gather(*(client(address, jobs, results) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    reader, writer = await asyncio.open_connection(*address)
+    _, stats = await request(reader, writer, f"{address[0]}:{address[1]}", 'GET', '/stats')
+    writer.close()
+
+    latency = {}
+    for endpoint in ('/hide', '/extract'):
+        times = sorted(seconds for name, status, seconds in results
+                       if name == endpoint and status == 200)
+        latency[endpoint] = {
+            'ok': len(times),
+            **{name: None if value is None else round(value * 1000, 1)
+               for name, value in (('p50_ms', percentile(times, 0.5)),
+                                   ('p90_ms', percentile(times, 0.9)),
+                                   ('p99_ms', percentile(times, 0.99)),
+                                   ('max_ms', times[-1] if times else None))},
+        }
+    return {
+        'requests': len(results),
+        'concurrency': concurrency,
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round(len(results) / elapsed, 2),
+        'statuses': dict(sorted(Counter(status for _, status, _ in results).items())),
+        'latency': latency,
+        'server': json.loads(stats),
+    }
+
+# Build the request bodies, hiding the extract image through the server
+async def prepare(address, image_path, preset):
+    with open(image_path, 'rb') as f:
+        image = base64.b64encode(f.read()).decode('ascii')
+    hide = json.dumps({
+        'image': image, 'message': MESSAGE, 'password': PASSWORD, 'preset': preset,
+    }).encode()
+
+    reader, writer = await asyncio.open_connection(*address)
+    status, hidden = await request(reader, writer, f"{address[0]}:{address[1]}", 'POST', '/hide', hide)
+    writer.close()
+    if status != 200:
+        raise RuntimeError(f"Preparing the extract image failed with {status}: {hidden[:200]!r}")
+    extract = json.dumps({
+        'image': base64.b64encode(hidden).decode('ascii'), 'password': PASSWORD,
+    }).encode()
+    return {'/hide': hide, '/extract': extract}
+
+# Start the server on a free port
+def start_server(args):
+    """
+    Start ``python -m stego.server`` on a free port.
+
+    Args:
+        args (argparse.Namespace): The parsed options.
+
+    Returns:
+        tuple: The server process, and its host and port.
+    """
+
+    command = [sys.executable, '-m', 'stego.server', '--port', '0']
+    for option in ('workers', 'max_queue', 'timeout'):
+        value = getattr(args, option)
+        if value is not None:
+            command += [f"--{option.replace('_', '-')}", str(value)]
+    process = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line.startswith('listening on '):
+        process.kill()
+        raise RuntimeError(f"The server did not start: {line!r}")
+    address = urlsplit(line.split()[-1])
+    return process, (address.hostname, address.port)
+
+# Run the load test
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the HTTP stand-in server.")
+    parser.add_argument('--image', default=DEFAULT_IMAGE, help="carrier image (default: photo.jpg)")
+    parser.add_argument('--requests', type=int, default=200, help="requests in total")
+    parser.add_argument('--concurrency', type=int, default=8, help="concurrent connections")
+    parser.add_argument('--mix', type=float, default=0.5, help="fraction of /hide requests")
+    parser.add_argument('--preset', default='fast', help="output preset of /hide")
+    parser.add_argument('--workers', type=int, help="server worker processes")
+    parser.add_argument('--max-queue', type=int, help="server queue bound")
+    parser.add_argument('--timeout', type=float, help="server timeout in seconds")
+    parser.add_argument('--url', help="use a running server instead of starting one")
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    process = None
+    if args.url:
+        url = urlsplit(args.url)
+        address = (url.hostname, url.port or 80)
+    else:
+        process, address = start_server(args)
+
+    async def run():
+        bodies = await prepare(address, args.image, args.preset)
+        return await load(address, bodies, args.requests, args.concurrency, args.mix)
+
+    try:
+        report = asyncio.run(run())
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    if args.json:
+        print(json.dumps(report))
+        return 0
+    print(f"{report['requests']} requests, {report['concurrency']} connections, "
+          f"{report['seconds']} s, {report['throughput_rps']} req/s")
+    print("statuses: " + ', '.join(f"{status} x{count}" for status, count in report['statuses'].items()))
+    for endpoint, stats in report['latency'].items():
+        if stats['ok']:
+            print(f"{endpoint:<9} ok={stats['ok']:<5} p50={stats['p50_ms']} ms  p90={stats['p90_ms']} ms  "
+                  f"p99={stats['p99_ms']} ms  max={stats['max_ms']} ms")
+    print("server: " + json.dumps(report['server']))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
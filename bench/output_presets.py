@@ -0,0 +1,92 @@
+"""
+Time and size of each output preset of ``stego.output``.
+
+Usage::
+
+    python -m bench.output_presets [--image photo.jpg] [--scale 1] [--repeat 5] [--json]
+
+A message is hidden in the image once, then the result is encoded with every
+preset. Each line reports the median encoding time, the encoded size, and
+whether the message still extracts from the encoded bytes.
+"""
+
+import argparse
+import io
+import json
+import statistics
+import time
+
+from PIL import Image
+
+from stego.container import FLAG_RAW, embed_payload, to_carrier
+from stego.core import extract_text
+from stego.crypto import encrypt_bytes
+from stego.output import PRESETS, check_output, encode_image
+
+
+MESSAGE = "The quick brown fox jumps over the lazy dog. " * 20
+PASSWORD = 'bench'
+
+
+# Time the encoding of an image with one preset
+def measure(img, preset, repeat):
+    """
+    Encode an image with a preset several times.
+
+    Args:
+        img (PIL.Image.Image): The image with the hidden message.
+        preset (str): One of the ``PRESETS``.
+        repeat (int): The number of encodings to time.
+
+    Returns:
+        dict: The preset, median seconds, size in bytes and round-trip result.
+    """
+
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        data = encode_image(img, preset)
+        times.append(time.perf_counter() - started)
+    return {
+        'preset': preset,
+        'format': PRESETS[preset][0],
+        'seconds': round(statistics.median(times), 4),
+        'bytes': len(data),
+        'round_trip': extract_text(io.BytesIO(data), PASSWORD) == MESSAGE,
+    }
+
+# Run the benchmark
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time and size of each output preset.")
+    parser.add_argument('--image', default='photo.jpg', help="carrier image (default: photo.jpg)")
+    parser.add_argument('--scale', type=int, default=1, help="upscale the image by this factor")
+    parser.add_argument('--repeat', type=int, default=5, help="encodings timed per preset")
+    parser.add_argument('--json', action='store_true', help="print JSON lines instead of a table")
+    args = parser.parse_args(argv)
+
+    img = to_carrier(Image.open(args.image))
+    if args.scale > 1:
+        img = img.resize((img.width * args.scale, img.height * args.scale))
+    embed_payload(img, encrypt_bytes(MESSAGE.encode(), PASSWORD), PASSWORD, FLAG_RAW)
+
+    if not args.json:
+        print(f"{args.image}: {img.width}x{img.height} {img.mode}, "
+              f"{img.width * img.height / 1e6:.2f} MP")
+        print(f"{'preset':<10} {'format':<6} {'seconds':>8} {'bytes':>10} {'ratio':>6}  round trip")
+    raw_size = len(img.tobytes())
+    for preset in PRESETS:
+        try:
+            check_output(img.mode, None, preset)
+        except ValueError:
+            continue
+        result = measure(img, preset, args.repeat)
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print(f"{preset:<10} {result['format']:<6} {result['seconds']:>8.4f} "
+                  f"{result['bytes']:>10} {result['bytes'] / raw_size:>6.3f}  "
+                  f"{'ok' if result['round_trip'] else 'FAILED'}")
+
+
+if __name__ == '__main__':
+    main()
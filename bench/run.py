@@ -0,0 +1,652 @@
+"""
+Benchmark hide and extract across image sizes, payload sizes and modes.
+
+Usage::
+
+    python -m bench.run [--quick] [--sizes 0.1 1 5] [--payloads 16 1024]
+                        [--modes rgb rgb-d2 tiled] [--scenarios decode-cache]
+                        [--repeat 3] [--output results.json]
+                        [--baseline bench/baseline.json] [--tolerance 0.5]
+                        [--save-baseline]
+
+Synthetic images from 0.1 to 50 MP are generated once per size, from a fixed
+seed, and written as uncompressed TIFF so reading them costs little. Each
+(size, payload, mode) case then runs in a fresh worker process and times
+these stages separately, as the best of ``--repeat`` runs after a warm-up (the
+minimum is the least noisy estimate of what the code costs):
+
+- ``kdf``: deriving the key and building the cipher, with no cache
+- ``permutation``: building the pixel order and the positions the payload uses
+- ``embed``: writing the encrypted payload into the decoded pixels
+- ``save``: encoding the result with the default output preset
+- ``hide``: ``stego.core.hide_text`` end to end, file to file
+- ``extract``: ``stego.core.extract_text`` end to end
+
+``hide_text_in_image`` and ``extract_text_from_image`` in the scripts are thin
+wrappers around the last two. Each case also records the peak memory seen by
+``tracemalloc`` over one more hide and extract (NumPy buffers included, Pillow
+buffers not) and the peak resident size of the worker process.
+
+The scenarios then time the features built on top, on an RGB image of each
+of the ``SCENARIO_SIZES``, each in a fresh worker process too:
+
+- ``decode-cache``: extraction with ``CANDIDATES`` passwords in turn, the
+  right one last, with no ``stego.cache.DecodeCache`` (``none``), one
+  starting empty (``memory``) and one over a directory a previous run filled
+  (``disk``). The end-marker scan is skipped, to time the decoding alone;
+- ``candidates``: the same passwords tried by one ``extract_text`` each,
+  sharing a decode cache (``sequential``), and by one
+  ``extract_with_candidates`` call (``single-pass``);
+- ``parallel``: hiding a payload filling the image and extracting it, on one
+  thread of ``stego.parallel`` (``serial``) and on all of them
+  (``threaded``), and over the image split into two frames (``frames``);
+- ``stream``: hiding half the room of the image at 4 bits per channel from a
+  file and extracting it to one, with ``hide_bytes`` (mode ``bytes``) and
+  ``hide_stream`` (mode ``stream``). Their peak memory is recorded: that of
+  ``bytes`` grows with the payload, that of ``stream`` stays flat;
+- ``scan``: ``stego.scan.run_scan`` over a store of clean images and images
+  carrying payloads, from the statistics alone (mode ``statistics``) and
+  with the key of the payloads (mode ``keys``). The verdicts by kind of image
+  are recorded.
+
+Results are written as JSON. Given a baseline, every stage slower than the
+baseline by more than the tolerance, and every case whose peak traced memory
+grew by more than it, is reported as a regression and the exit status is 1.
+``--save-baseline`` writes the results as the new baseline.
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+PASSWORD = 'bench'
+SEED = 1234
+MESSAGE = "The quick brown fox jumps over the lazy dog. " * 20
+
+SIZES = (0.1, 0.5, 1, 5, 10, 25, 50)
+PAYLOADS = (16, 1024, 65536, 1048576)
+QUICK_SIZES = (0.1, 1)
+QUICK_PAYLOADS = (16, 1024, 65536)
+
+# Carrier mode and hide options of each benchmarked mode
+MODES = {
+    'rgb': ('RGB', {}),
+    'rgb-d2': ('RGB', {'depth': 2}),
+    'rgba-alpha': ('RGBA', {'alpha': True}),
+    'gray': ('L', {}),
+    'tiled': ('RGB', {'tiled': True}),
+}
+QUICK_MODES = ('rgb', 'tiled')
+
+SCENARIO_SIZES = (1, 5)
+QUICK_SCENARIO_SIZES = (1,)
+# Passwords tried per image, the right one last
+CANDIDATES = 4
+# Bits per channel of the stream scenario
+STREAM_DEPTH = 4
+# Images in the store of the scan scenario, of each kind in turn
+SCAN_IMAGES = 8
+SCAN_KINDS = ('clean', 'full', 'half', 'short')
+
+# Stages timed under this many seconds are too noisy to flag
+NOISE_FLOOR = 0.02
+# Peak memory under this many bytes is too small to flag
+MEMORY_FLOOR = 4 * 2**20
+
+
+# Write a synthetic image of about a given size
+def make_image(path, megapixels, mode):
+    """
+    Write a reproducible synthetic image: smooth gradients plus sensor-like noise.
+
+    Args:
+        path (str): The TIFF file to write.
+        megapixels (float): The image size in megapixels, with a 4:3 aspect.
+        mode (str): The image mode, one of the carrier modes.
+
+    Returns:
+        tuple: The width and height.
+    """
+
+    height = max(1, int(round((megapixels * 1e6 * 3 / 4) ** 0.5)))
+    width = max(1, int(round(megapixels * 1e6 / height)))
+    channels = len(mode)
+    rng = np.random.default_rng(SEED)
+    rows = np.linspace(0, 160, height, dtype=np.float32)[:, None]
+    cols = np.linspace(0, 80, width, dtype=np.float32)[None, :]
+    base = (rows + cols).astype(np.uint8)
+    pixels = np.empty((height, width, channels), dtype=np.uint8)
+    for channel in range(channels):
+        noise = rng.integers(0, 16, (height, width), dtype=np.uint8)
+        pixels[..., channel] = base + noise + channel * 8
+    if channels == 1:
+        pixels = pixels[..., 0]
+    Image.fromarray(pixels, mode).save(path, 'TIFF')
+    return width, height
+
+# Time a callable a number of times, after one untimed warm-up call
+def _time(function, repeat):
+    function()
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - started)
+    return round(min(times), 6)
+
+# Time a callable as ``_time`` does, and check what its last call returned
+def _time_checked(function, expected, repeat, what):
+    returned = []
+    seconds = _time(lambda: returned.append(function()), repeat)
+    if returned[-1] != expected:
+        raise RuntimeError(f"{what}: the extracted payload does not match")
+    return seconds
+
+# The passwords tried by the scenarios, the right one last
+def _passwords():
+    return [f'wrong-{n}' for n in range(CANDIDATES - 1)] + [PASSWORD]
+
+# Run one benchmark case in a worker process
+def run_case(image_path, workdir, payload_size, mode, repeat):
+    """
+    Time every stage of one (image, payload, mode) case.
+
+    Args:
+        image_path (str): The synthetic input image.
+        workdir (str): A directory for the output images.
+        payload_size (int): The message length in bytes.
+        mode (str): One of the ``MODES``.
+        repeat (int): The number of runs per stage.
+
+    Returns:
+        dict: The stage timings, peak memory and case description, or a
+        ``skipped`` reason when the payload does not fit.
+    """
+
+    from cryptography.fernet import Fernet
+
+    from stego.container import KEYED, embed_payload, header_pixels, to_carrier
+    from stego.core import PayloadTooLargeError, check_fits, extract_text, hide_text
+    from stego.crypto import encrypt_bytes, generate_key, token_size
+    from stego.output import encode_image
+    from stego.permutation import TiledPermutation, make_permutation
+
+    options = MODES[mode][1]
+    tiled = options.get('tiled', False)
+    message = 'x' * payload_size
+    try:
+        room = check_fits(image_path, payload_size, **options)
+    except PayloadTooLargeError as e:
+        return {'skipped': str(e)}
+
+    stages = {}
+    stages['kdf'] = _time(lambda: Fernet(generate_key(PASSWORD)), repeat)
+
+    # Enough positions for the header and payload at 1 bit per channel
+    width, height = room.width, room.height
+    needed = header_pixels(room.mode) + -(-token_size(payload_size) * 8 // len(room.mode))
+    if tiled:
+        stages['permutation'] = _time(
+            lambda: TiledPermutation(PASSWORD, width, height)[:needed], repeat
+        )
+    else:
+        stages['permutation'] = _time(
+            lambda: make_permutation(PASSWORD, width * height, KEYED)[:needed], repeat
+        )
+
+    if not tiled:
+        img = to_carrier(Image.open(image_path))
+        img.load()
+        token = encrypt_bytes(message.encode(), PASSWORD)
+        stages['embed'] = _time(
+            lambda: embed_payload(img, token, PASSWORD, depth=options.get('depth', 1),
+                                  alpha=options.get('alpha', False)),
+            repeat,
+        )
+        stages['save'] = _time(lambda: encode_image(img), repeat)
+        del img
+
+    output = os.path.join(workdir, f'out-{mode}.' + ('tif' if tiled else 'png'))
+    stages['hide'] = _time(lambda: hide_text(image_path, message, output, PASSWORD, **options),
+                           repeat)
+    recovered = []
+    stages['extract'] = _time(
+        lambda: recovered.append(extract_text(output, PASSWORD, tiled)), repeat
+    )
+    if recovered[-1] != message:
+        raise RuntimeError(f"Round trip failed for {mode} with {payload_size} bytes")
+
+    # Tracing slows allocations down, so peak memory gets a run of its own
+    tracemalloc.start()
+    hide_text(image_path, message, output, PASSWORD, **options)
+    extract_text(output, PASSWORD, tiled)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'width': width,
+        'height': height,
+        'stages': stages,
+        'peak_traced_bytes': peak,
+        'max_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    }
+
+# Time extraction with and without the decode cache
+def scenario_decode_cache(image_path, workdir, repeat):
+    """
+    Time extraction with candidate passwords in turn, with each kind of cache.
+
+    Args:
+        image_path (str): The synthetic input image.
+        workdir (str): A directory of the scenario's own.
+        repeat (int): The number of runs per stage.
+
+    Returns:
+        list: The cases of the scenario.
+    """
+
+    from stego.cache import DecodeCache
+    from stego.core import StegoError, extract_text, hide_text
+
+    output = os.path.join(workdir, 'hidden.png')
+    hide_text(image_path, MESSAGE, output, PASSWORD)
+    directory = os.path.join(workdir, 'cache')
+    DecodeCache(directory=directory).load(output)
+
+    def extract_all(cache):
+        for password in _passwords():
+            try:
+                return extract_text(output, password, cache=cache, legacy=False)
+            except StegoError:
+                continue
+        return None
+
+    stages = {}
+    for stage, make_cache in (('none', lambda: None), ('memory', DecodeCache),
+                              ('disk', lambda: DecodeCache(directory=directory))):
+        stages[stage] = _time_checked(
+            lambda: extract_all(make_cache()), MESSAGE, repeat, f"decode-cache {stage}"
+        )
+    return [{'mode': 'extract', 'stages': stages}]
+
+# Time candidate passwords tried one by one and in a single pass
+def scenario_candidates(image_path, workdir, repeat):
+    """
+    Time finding the right one of the candidate passwords.
+
+    Args:
+        image_path (str): The synthetic input image.
+        workdir (str): A directory of the scenario's own.
+        repeat (int): The number of runs per stage.
+
+    Returns:
+        list: The cases of the scenario.
+    """
+
+    from stego.cache import DecodeCache
+    from stego.candidates import extract_with_candidates
+    from stego.core import StegoError, extract_text, hide_text
+
+    output = os.path.join(workdir, 'hidden.png')
+    hide_text(image_path, MESSAGE, output, PASSWORD)
+
+    def sequential():
+        cache = DecodeCache()
+        for password in _passwords():
+            try:
+                return extract_text(output, password, cache=cache)
+            except StegoError:
+                continue
+        return None
+
+    def single_pass():
+        return extract_with_candidates(output, _passwords()).plaintext.decode()
+
+    stages = {
+        stage: _time_checked(function, MESSAGE, repeat, f"candidates {stage}")
+        for stage, function in (('sequential', sequential), ('single-pass', single_pass))
+    }
+    return [{'mode': 'extract', 'stages': stages}]
+
+# Time hiding and extracting a full payload on one thread and on all of them
+def scenario_parallel(image_path, workdir, repeat):
+    """
+    Time a payload filling the image, over thread counts and over frames.
+
+    Args:
+        image_path (str): The synthetic input image.
+        workdir (str): A directory of the scenario's own.
+        repeat (int): The number of runs per stage.
+
+    Returns:
+        list: The cases of the scenario.
+    """
+
+    from stego import parallel
+    from stego.core import capacity, extract_bytes, hide_bytes
+
+    frames_path = os.path.join(workdir, 'frames.tif')
+    with Image.open(image_path) as img:
+        half = img.height // 2
+        frames = [img.crop((0, top, img.width, top + half)) for top in (0, half)]
+    frames[0].save(frames_path, save_all=True, append_images=frames[1:])
+    output = os.path.join(workdir, 'hidden.tif')
+
+    def round_trip(carrier, data):
+        hide_bytes(carrier, data, output, PASSWORD, preset='tiff')
+        return extract_bytes(output, PASSWORD)
+
+    stages = {}
+    for stage, carrier, threads in (('serial', image_path, 1), ('threaded', image_path, None),
+                                    ('frames', frames_path, None)):
+        data = os.urandom(capacity(carrier).max_plaintext)
+        parallel.set_threads(threads)
+        stages[stage] = _time_checked(
+            lambda: round_trip(carrier, data), data, repeat, f"parallel {stage}"
+        )
+    return [{'mode': 'fill', 'threads': parallel.thread_count(), 'stages': stages}]
+
+# Time hiding and extracting in one piece and as a stream, with peak memory
+def scenario_stream(image_path, workdir, repeat):
+    """
+    Time and trace a large payload hidden from a file and extracted to one.
+
+    Args:
+        image_path (str): The synthetic input image.
+        workdir (str): A directory of the scenario's own.
+        repeat (int): The number of runs per stage.
+
+    Returns:
+        list: The cases of the scenario.
+    """
+
+    from stego.core import capacity, extract_bytes, extract_stream, hide_bytes, hide_stream
+
+    output = os.path.join(workdir, 'hidden.tif')
+    source = os.path.join(workdir, 'payload.bin')
+    target = os.path.join(workdir, 'extracted.bin')
+    size = capacity(image_path, STREAM_DEPTH).max_plaintext // 2
+    with open(source, 'wb') as f:
+        f.write(os.urandom(size))
+
+    def hide_in_piece():
+        with open(source, 'rb') as f:
+            hide_bytes(image_path, f.read(), output, PASSWORD, depth=STREAM_DEPTH,
+                       preset='tiff')
+
+    def extract_in_piece():
+        with open(target, 'wb') as f:
+            f.write(extract_bytes(output, PASSWORD))
+
+    def hide_as_stream():
+        with open(source, 'rb') as f:
+            hide_stream(image_path, f, output, PASSWORD, depth=STREAM_DEPTH, preset='tiff')
+
+    def extract_as_stream():
+        with open(target, 'wb') as f:
+            extract_stream(output, PASSWORD, f)
+
+    cases = []
+    for mode, hide, extract in (('bytes', hide_in_piece, extract_in_piece),
+                                ('stream', hide_as_stream, extract_as_stream)):
+        stages = {'hide': _time(hide, repeat), 'extract': _time(extract, repeat)}
+        with open(source, 'rb') as a, open(target, 'rb') as b:
+            if a.read() != b.read():
+                raise RuntimeError(f"stream {mode}: the extracted payload does not match")
+        tracemalloc.start()
+        hide()
+        extract()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        cases.append({'mode': mode, 'payload': size, 'stages': stages,
+                      'peak_traced_bytes': peak})
+    return cases
+
+# Time the audit scanner over a store of images
+def scenario_scan(image_path, workdir, repeat):
+    """
+    Time a scan of clean images and images carrying payloads, and record the
+    verdicts.
+
+    Args:
+        image_path (str): The synthetic input image.
+        workdir (str): A directory of the scenario's own.
+        repeat (int): The number of runs per stage.
+
+    Returns:
+        list: The cases of the scenario.
+    """
+
+    from stego.core import capacity, hide_bytes
+    from stego.scan import INTACT, run_scan
+
+    room = capacity(image_path).max_plaintext
+    sizes = {'full': room, 'half': room // 2, 'short': 32}
+    store = os.path.join(workdir, 'store')
+    os.makedirs(store)
+    for number in range(SCAN_IMAGES):
+        kind = SCAN_KINDS[number % len(SCAN_KINDS)]
+        output = os.path.join(store, f'{kind}-{number:03d}.png')
+        if kind == 'clean':
+            with Image.open(image_path) as img:
+                img.save(output, compress_level=1)
+        else:
+            hide_bytes(image_path, os.urandom(sizes[kind]), output, PASSWORD, preset='fast')
+    report = os.path.join(workdir, 'scan.jsonl')
+
+    cases = []
+    for mode, keys in (('statistics', None), ('keys', {'bench': PASSWORD})):
+        stages = {'scan': _time(lambda: run_scan([store], report, keys, workers=1), repeat)}
+        verdicts = {}
+        with open(report, encoding='utf-8') as lines:
+            for line in lines:
+                result = json.loads(line)
+                by_kind = verdicts.setdefault(os.path.basename(result['input']).split('-')[0], {})
+                by_kind[result['verdict']] = by_kind.get(result['verdict'], 0) + 1
+        if keys and any(verdict != INTACT for kind, by_kind in verdicts.items()
+                        if kind != 'clean' for verdict in by_kind):
+            raise RuntimeError("scan: payloads found with their key are not all intact")
+        cases.append({'mode': mode, 'stages': stages, 'verdicts': verdicts})
+    return cases
+
+
+SCENARIOS = {
+    'decode-cache': scenario_decode_cache,
+    'candidates': scenario_candidates,
+    'parallel': scenario_parallel,
+    'stream': scenario_stream,
+    'scan': scenario_scan,
+}
+
+
+# Run one scenario in a worker process
+def run_scenario(name, image_path, workdir, repeat):
+    return SCENARIOS[name](image_path, workdir, repeat)
+
+# Describe the machine and code the results come from
+def environment():
+    """
+    Describe the machine, library versions and commit of a run.
+
+    Returns:
+        dict: The run metadata.
+    """
+
+    import cryptography
+    import PIL
+
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pillow': PIL.__version__,
+        'cryptography': cryptography.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'commit': commit,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+# Key results by case and measure for comparison, with the floor of each
+def _measures(results):
+    measures = {}
+    for result in results:
+        case = (result.get('scenario'), result['megapixels'], result.get('payload'),
+                result.get('mode'))
+        for stage, seconds in result.get('stages', {}).items():
+            measures[case + (stage,)] = (seconds, NOISE_FLOOR)
+        if 'peak_traced_bytes' in result:
+            measures[case + ('peak_traced_bytes',)] = (result['peak_traced_bytes'], MEMORY_FLOOR)
+    return measures
+
+# Compare results against a baseline
+def compare(results, baseline, tolerance):
+    """
+    Find the stages that got slower than the baseline, and the cases whose
+    peak traced memory grew.
+
+    Stages faster than ``NOISE_FLOOR``, and peaks under ``MEMORY_FLOOR``, in
+    both runs are ignored, as are cases missing from either run.
+
+    Args:
+        results (list): The case results of this run.
+        baseline (list): The case results of the baseline.
+        tolerance (float): The allowed growth, 0.5 for 50%.
+
+    Returns:
+        list: One dict per regression, worst first.
+    """
+
+    current = _measures(results)
+    regressions = []
+    for key, (before, floor) in _measures(baseline).items():
+        after = current.get(key, (None,))[0]
+        if after is None or max(before, after) < floor:
+            continue
+        if after > before * (1 + tolerance):
+            scenario, megapixels, payload, mode, stage = key
+            regressions.append({
+                'scenario': scenario, 'megapixels': megapixels, 'payload': payload,
+                'mode': mode, 'stage': stage, 'baseline': before, 'current': after,
+                'ratio': round(after / before, 3),
+            })
+    return sorted(regressions, key=lambda regression: -regression['ratio'])
+
+# Run the benchmark matrix
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark hide and extract.")
+    parser.add_argument('--quick', action='store_true',
+                        help="small matrix: 0.1 and 1 MP, payloads up to 64 KiB, rgb and tiled")
+    parser.add_argument('--sizes', type=float, nargs='+', help="image sizes in megapixels")
+    parser.add_argument('--payloads', type=int, nargs='+', help="message sizes in bytes")
+    parser.add_argument('--modes', nargs='*', choices=list(MODES),
+                        help="embedding modes, none to skip the matrix")
+    parser.add_argument('--scenarios', nargs='*', choices=list(SCENARIOS),
+                        help="feature scenarios, none to skip them (default: all)")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per stage (default: 3)")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help="baseline JSON to compare with (default: bench/baseline.json)")
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help="allowed slowdown against the baseline (default: 0.5)")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="write the results as the new baseline")
+    args = parser.parse_args(argv)
+
+    sizes = args.sizes or (QUICK_SIZES if args.quick else SIZES)
+    payloads = args.payloads or (QUICK_PAYLOADS if args.quick else PAYLOADS)
+    modes = (QUICK_MODES if args.quick else tuple(MODES)) if args.modes is None else args.modes
+    scenarios = tuple(SCENARIOS) if args.scenarios is None else args.scenarios
+    scenario_sizes = (QUICK_SCENARIO_SIZES if args.quick else SCENARIO_SIZES) if scenarios else ()
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='stego-bench-') as workdir:
+        for megapixels in sizes:
+            images = {}
+            for mode in modes:
+                image_mode = MODES[mode][0]
+                if image_mode not in images:
+                    path = os.path.join(workdir, f'{megapixels}mp-{image_mode}.tif')
+                    make_image(path, megapixels, image_mode)
+                    images[image_mode] = path
+                for payload in payloads:
+                    # A fresh process per case keeps the peak resident size per case
+                    with ProcessPoolExecutor(max_workers=1) as pool:
+                        result = pool.submit(
+                            run_case, images[image_mode], workdir, payload, mode, args.repeat
+                        ).result()
+                    result.update(megapixels=megapixels, payload=payload, mode=mode)
+                    results.append(result)
+                    if 'skipped' in result:
+                        print(f"{megapixels:>5} MP {payload:>8} B {mode:<10} skipped",
+                              file=sys.stderr)
+                        continue
+                    timings = ' '.join(f"{stage}={seconds:.4f}"
+                                       for stage, seconds in result['stages'].items())
+                    print(f"{megapixels:>5} MP {payload:>8} B {mode:<10} {timings} "
+                          f"rss={result['max_rss_bytes'] / 2**20:.0f}MiB", file=sys.stderr)
+            for path in images.values():
+                os.remove(path)
+
+        for megapixels in scenario_sizes:
+            image_path = os.path.join(workdir, f'{megapixels}mp-scenarios.tif')
+            make_image(image_path, megapixels, 'RGB')
+            for name in scenarios:
+                with ProcessPoolExecutor(max_workers=1) as pool:
+                    cases = pool.submit(
+                        run_scenario, name, image_path, tempfile.mkdtemp(dir=workdir),
+                        args.repeat
+                    ).result()
+                for case in cases:
+                    case.update(scenario=name, megapixels=megapixels)
+                    results.append(case)
+                    timings = ' '.join(f"{stage}={seconds:.4f}"
+                                       for stage, seconds in case['stages'].items())
+                    peak = case.get('peak_traced_bytes')
+                    print(f"{megapixels:>5} MP {name:<12} {case['mode']:<10} {timings}"
+                          + ('' if peak is None else f" peak={peak / 2**20:.1f}MiB"),
+                          file=sys.stderr)
+            os.remove(image_path)
+
+    run = {'environment': environment(), 'repeat': args.repeat, 'results': results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump(run, output, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as output:
+            json.dump(run, output, indent=2)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, nothing to compare", file=sys.stderr)
+        return 0
+    with open(args.baseline, encoding='utf-8') as baseline_file:
+        baseline = json.load(baseline_file)
+    regressions = compare(results, baseline['results'], args.tolerance)
+    for regression in regressions:
+        print(json.dumps(regression))
+    print(f"{len(regressions)} regression(s) against {args.baseline}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,6 @@
+"""
+Golden images made by each implementation, run from the repository root.
+
+``python -m corpus.verify`` checks that the Python code still reads them all;
+``python -m corpus.build`` rebuilds them (the browser images need Node.js).
+"""
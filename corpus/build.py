@@ -0,0 +1,243 @@
+"""
+Rebuild the golden images of the corpus.
+
+Usage::
+
+    python -m corpus.build
+
+Writes the carriers, the images each implementation hides messages in, and
+``manifest.json``, replacing what is there:
+
+- ``python``: every kind of payload of ``stego.core`` (text, bytes, files,
+  depth, alpha, grayscale, tiled, multi-frame, shared slots, streams);
+- ``browser``: the helpers of ``script.js``, run by Node.js on the raw RGBA
+  pixels a canvas would hold (see ``web.js``), saved as the RGBA PNG the
+  browser tool downloads.
+
+Fernet tokens carry a random IV and a timestamp, so every rebuild changes
+the ``python`` images; rebuild only when the formats change on purpose, and
+commit the result. Run ``python -m corpus.verify`` afterwards.
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+from stego.core import hide_bytes, hide_file, hide_for_recipients, hide_stream, hide_text
+
+
+CORPUS_DIR = os.path.dirname(os.path.abspath(__file__))
+MANIFEST = 'manifest.json'
+WIDTH, HEIGHT = 64, 48
+
+TEXT = "The quick brown fox jumps over the lazy dog."
+UNICODE_TEXT = "Grüße aus Dhaka — ঢাকা থেকে শুভেচ্ছা 🌏"
+LONG_TEXT = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 12
+
+
+# Hash a file or bytes
+def sha256(data):
+    """
+    Hash bytes, or the content of a file.
+
+    Args:
+        data: The bytes, or the path of the file.
+
+    Returns:
+        str: The hex SHA-256 digest.
+    """
+
+    if isinstance(data, str):
+        with open(data, 'rb') as f:
+            data = f.read()
+    return hashlib.sha256(data).hexdigest()
+
+# Make a carrier image
+def make_carrier(mode, seed):
+    """
+    Make a small carrier: a smooth gradient with a little noise, like a photo.
+
+    Args:
+        mode (str): The image mode, ``'RGB'``, ``'RGBA'`` or ``'L'``.
+        seed (int): The seed of the noise.
+
+    Returns:
+        PIL.Image.Image: The carrier.
+    """
+
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:HEIGHT, 0:WIDTH]
+    base = np.stack([x * 255 / WIDTH, y * 255 / HEIGHT, (x + y) * 255 / (WIDTH + HEIGHT)], -1)
+    pixels = np.clip(base + rng.normal(0, 6, base.shape), 0, 255).astype(np.uint8)
+    img = Image.fromarray(pixels, 'RGB')
+    if mode == 'RGBA':
+        img.putalpha(255)
+    return img.convert(mode)
+
+# Write the carriers
+def build_carriers():
+    """
+    Write the carriers under ``carriers/``.
+
+    Returns:
+        dict: The carrier paths, relative to the corpus, by name.
+    """
+
+    carriers = {}
+    os.makedirs(os.path.join(CORPUS_DIR, 'carriers'), exist_ok=True)
+    for seed, (name, mode) in enumerate((('rgb', 'RGB'), ('rgba', 'RGBA'), ('gray', 'L'))):
+        carriers[name] = f'carriers/{name}.png'
+        make_carrier(mode, seed).save(os.path.join(CORPUS_DIR, carriers[name]))
+    frames = [make_carrier('RGB', 10 + index) for index in range(2)]
+    carriers['frames'] = 'carriers/frames.tiff'
+    frames[0].save(os.path.join(CORPUS_DIR, carriers['frames']), save_all=True,
+                   append_images=frames[1:])
+    return carriers
+
+# Hide the payloads of the Python implementation
+def build_python(carriers, workdir):
+    """
+    Hide one payload of each kind with ``stego.core``.
+
+    Args:
+        carriers (dict): The carrier paths by name.
+        workdir (str): A scratch directory.
+
+    Returns:
+        list: The manifest entries.
+    """
+
+    entries = []
+
+    def path(name):
+        return os.path.join(CORPUS_DIR, name)
+
+    def add(image, api, password, expected, carrier, **options):
+        entries.append({
+            'image': image, 'producer': 'python', 'api': api, 'password': password,
+            'carrier': carriers[carrier], 'options': options, 'expected': expected,
+        })
+
+    rgb, rgba, gray = path(carriers['rgb']), path(carriers['rgba']), path(carriers['gray'])
+    hide_text(rgb, TEXT, path('images/python-text.png'), 'python-text')
+    add('images/python-text.png', 'text', 'python-text', {'message': TEXT}, 'rgb')
+
+    hide_text(gray, UNICODE_TEXT, path('images/python-gray.png'), 'python-gray')
+    add('images/python-gray.png', 'text', 'python-gray', {'message': UNICODE_TEXT}, 'gray')
+
+    data = bytes(range(256)) * 6
+    hide_bytes(rgb, data, path('images/python-depth2.png'), 'python-depth2', depth=2)
+    add('images/python-depth2.png', 'bytes', 'python-depth2',
+        {'bytes': len(data), 'sha256': sha256(data)}, 'rgb', depth=2)
+
+    record = os.path.join(workdir, 'notes.txt')
+    content = (TEXT + '\n').encode() * 10
+    with open(record, 'wb') as f:
+        f.write(content)
+    hide_file(rgba, record, path('images/python-file-alpha.png'), 'python-file', alpha=True)
+    add('images/python-file-alpha.png', 'file', 'python-file',
+        {'file': 'notes.txt', 'bytes': len(content), 'sha256': sha256(content)}, 'rgba',
+        alpha=True)
+
+    hide_text(rgb, TEXT, path('images/python-tiled.tiff'), 'python-tiled', tiled=True)
+    add('images/python-tiled.tiff', 'text', 'python-tiled', {'message': TEXT}, 'rgb', tiled=True)
+
+    hide_text(path(carriers['frames']), LONG_TEXT * 3, path('images/python-frames.tiff'),
+              'python-frames')
+    add('images/python-frames.tiff', 'text', 'python-frames', {'message': LONG_TEXT * 3},
+        'frames')
+
+    recipients = {'python-alice': "For Alice only.", 'python-bob': "For Bob only."}
+    hide_for_recipients(rgb, recipients, path('images/python-recipients.png'))
+    for password, message in recipients.items():
+        add('images/python-recipients.png', 'text', password, {'message': message}, 'rgb',
+            slots=len(recipients))
+
+    data = os.urandom(1800)
+    hide_stream(rgb, io.BytesIO(data), path('images/python-stream.png'), 'python-stream',
+                depth=2, chunk_size=1024)
+    add('images/python-stream.png', 'stream', 'python-stream',
+        {'bytes': len(data), 'sha256': sha256(data)}, 'rgb', depth=2, chunk_size=1024)
+    return entries
+
+# Hide messages with the helpers of script.js
+def build_browser(carriers, workdir):
+    """
+    Hide messages with the browser tool's code, run by Node.js.
+
+    Args:
+        carriers (dict): The carrier paths by name.
+        workdir (str): A scratch directory.
+
+    Returns:
+        list: The manifest entries.
+
+    Raises:
+        RuntimeError: If Node.js is not installed.
+    """
+
+    node = shutil.which('node')
+    if node is None:
+        raise RuntimeError("Building the browser images needs Node.js (node) on the PATH")
+    cases = (
+        ('images/browser-text.png', 'rgb', TEXT, 'browser-text'),
+        ('images/browser-unicode.png', 'rgba', UNICODE_TEXT, 'clé-ñ'),
+        ('images/browser-gray.png', 'gray', TEXT, 'browser-gray'),
+        ('images/browser-long.png', 'rgb', LONG_TEXT, 'browser-long'),
+    )
+    jobs, sizes = [], []
+    for index, (image, carrier, text, password) in enumerate(cases):
+        # A canvas holds RGBA pixels, whatever the mode of the file
+        img = Image.open(os.path.join(CORPUS_DIR, carriers[carrier])).convert('RGBA')
+        raw = os.path.join(workdir, f'carrier-{index}.rgba')
+        with open(raw, 'wb') as f:
+            f.write(img.tobytes())
+        jobs.append({'carrier': raw, 'output': raw + '.out', 'text': text, 'password': password})
+        sizes.append(img.size)
+    completed = subprocess.run(
+        [node, os.path.join(CORPUS_DIR, 'web.js')], input=json.dumps(jobs).encode(),
+        capture_output=True, check=True,
+    )
+
+    entries = []
+    for (image, carrier, text, password), size, result in zip(
+            cases, sizes, json.loads(completed.stdout)):
+        with open(result['output'], 'rb') as f:
+            Image.frombytes('RGBA', size, f.read()).save(os.path.join(CORPUS_DIR, image))
+        entries.append({
+            'image': image, 'producer': 'browser', 'api': 'web', 'password': password,
+            'carrier': carriers[carrier], 'options': {},
+            'expected': {'message': text, 'token': result['token'],
+                         'browser_extract': result['browser_extract']},
+        })
+    return entries
+
+# Rebuild the corpus
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild the golden image corpus.")
+    parser.parse_args(argv)
+
+    os.makedirs(os.path.join(CORPUS_DIR, 'images'), exist_ok=True)
+    with tempfile.TemporaryDirectory() as workdir:
+        carriers = build_carriers()
+        entries = build_python(carriers, workdir) + build_browser(carriers, workdir)
+    for entry in entries:
+        entry['image_sha256'] = sha256(os.path.join(CORPUS_DIR, entry['image']))
+    with open(os.path.join(CORPUS_DIR, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump({'entries': entries}, f, indent=1, ensure_ascii=False)
+        f.write('\n')
+    print(f"{len(entries)} entries written to {os.path.join(CORPUS_DIR, MANIFEST)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
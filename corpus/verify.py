@@ -0,0 +1,159 @@
+"""
+Check that the Python code still reads every golden image of the corpus.
+
+Usage::
+
+    python -m corpus.verify [--json]
+
+For each entry of ``manifest.json``:
+
+- the image must be unchanged (its SHA-256), so a check never passes
+  against images silently rewritten by the code under test;
+- the payload must come back through the API the entry names, and text
+  through ``extract_text_from_image`` of the scripts as well;
+- for ``browser`` entries, ``stego.web.hide_web_text`` must write the very
+  same pixels as the browser tool did, from the same carrier.
+
+One line per entry is printed, and the exit status is 1 if any check fails.
+``tests/test_corpus.py`` runs the same checks under pytest.
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import sys
+
+import numpy as np
+from PIL import Image
+
+from stego.core import extract_bytes, extract_file, extract_stream, extract_text
+from stego.scripts import extract_text_from_image
+from stego.web import extract_web_text, hide_web_text
+
+
+CORPUS_DIR = os.path.dirname(os.path.abspath(__file__))
+MANIFEST = 'manifest.json'
+
+
+# Check that extraction gives what an entry expects
+def check_payload(image_path, entry):
+    """
+    Extract the payload of an entry with the API it names.
+
+    Args:
+        image_path (str): The path to the golden image.
+        entry (dict): The manifest entry.
+
+    Returns:
+        list: The failed checks, empty if all passed.
+    """
+
+    api, password, expected = entry['api'], entry['password'], entry['expected']
+    failures = []
+    if api in ('text', 'web'):
+        extract = extract_web_text if api == 'web' else extract_text
+        if extract(image_path, password) != expected['message']:
+            failures.append(f"{extract.__name__} does not return the message")
+        if extract_text_from_image(image_path, password) != expected['message']:
+            failures.append("extract_text_from_image does not return the message")
+        return failures
+    if api == 'file':
+        name, data = extract_file(image_path, password)
+        if name != expected['file']:
+            failures.append(f"extract_file returns the name {name!r}")
+    elif api == 'stream':
+        sink = io.BytesIO()
+        extract_stream(image_path, password, sink)
+        data = sink.getvalue()
+    else:
+        data = extract_bytes(image_path, password)
+    if hashlib.sha256(data).hexdigest() != expected['sha256']:
+        failures.append(f"the {api} payload does not match ({len(data)} bytes)")
+    return failures
+
+# Check that the Python writer of the browser format matches the browser
+def check_browser_pixels(image_path, entry):
+    """
+    Hide the message of a browser entry again in Python and compare pixels.
+
+    Args:
+        image_path (str): The path to the golden image.
+        entry (dict): The manifest entry.
+
+    Returns:
+        list: The failed checks, empty if all passed.
+    """
+
+    output = io.BytesIO()
+    hide_web_text(os.path.join(CORPUS_DIR, entry['carrier']), entry['expected']['message'],
+                  output, entry['password'])
+    ours = np.asarray(Image.open(output).convert('RGBA'))
+    theirs = np.asarray(Image.open(image_path).convert('RGBA'))
+    if ours.shape != theirs.shape or not np.array_equal(ours, theirs):
+        return ["hide_web_text does not write the pixels the browser wrote"]
+    return []
+
+# Read the entries of the manifest
+def load_entries():
+    """
+    Read the entries of the corpus manifest.
+
+    Returns:
+        list: The manifest entries, in order.
+    """
+
+    with open(os.path.join(CORPUS_DIR, MANIFEST), encoding='utf-8') as f:
+        return json.load(f)['entries']
+
+# Run every check of an entry
+def check_entry(entry):
+    """
+    Check that the image of an entry is unchanged and still gives its payload.
+
+    Args:
+        entry (dict): The manifest entry.
+
+    Returns:
+        list: The failed checks, empty if all passed.
+    """
+
+    image_path = os.path.join(CORPUS_DIR, entry['image'])
+    with open(image_path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    if digest != entry['image_sha256']:
+        return ["the image changed; rebuild with python -m corpus.build"]
+    try:
+        failures = check_payload(image_path, entry)
+        if entry['producer'] == 'browser':
+            failures += check_browser_pixels(image_path, entry)
+    except Exception as e:
+        failures = [f"{type(e).__name__}: {e}"]
+    return failures
+
+# Check every entry of the manifest
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the golden image corpus.")
+    parser.add_argument('--json', action='store_true', help="print JSON lines instead of text")
+    args = parser.parse_args(argv)
+
+    entries = load_entries()
+    failed = 0
+    for entry in entries:
+        failures = check_entry(entry)
+        failed += bool(failures)
+        if args.json:
+            print(json.dumps({'image': entry['image'], 'producer': entry['producer'],
+                              'api': entry['api'], 'ok': not failures, 'failures': failures}))
+        else:
+            status = 'ok' if not failures else 'FAIL'
+            print(f"{status:<4} {entry['producer']:<7} {entry['api']:<6} {entry['image']}"
+                  + ''.join(f"\n       {failure}" for failure in failures))
+    if not args.json:
+        print(f"{len(entries) - failed} of {len(entries)} entries pass")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,51 @@
+// Run the helpers of script.js on raw RGBA pixels, outside a browser.
+//
+// Usage: node corpus/web.js < jobs.json
+//
+// Standard input holds a JSON array of jobs, each naming a carrier file of
+// raw RGBA bytes (what getImageData returns), the output file to write the
+// pixels with the hidden text to, the text and the password. The helpers are
+// cut out of script.js as they are and run unchanged, so the corpus records
+// what the browser tool really writes. One result per job is printed, as a
+// JSON array: the base64 token and whether the browser's own extraction reads
+// the text back.
+
+const fs = require('fs');
+const path = require('path');
+const vm = require('vm');
+
+const source = fs.readFileSync(path.join(__dirname, '..', 'script.js'), 'utf8');
+const start = source.indexOf('// Helper functions');
+const end = source.lastIndexOf('});');
+if (start === -1 || end < start) {
+    throw new Error('script.js no longer has its helper functions where expected');
+}
+const helpers = vm.runInNewContext(
+    source.slice(start, end) +
+        '\n({ encryptText, decryptText, hideTextInImage, extractTextFromImage });',
+    { TextEncoder, TextDecoder, btoa, atob }
+);
+
+async function main() {
+    const jobs = JSON.parse(fs.readFileSync(0, 'utf8'));
+    const results = [];
+    for (const job of jobs) {
+        const data = new Uint8ClampedArray(fs.readFileSync(job.carrier));
+        const token = await helpers.encryptText(job.text, job.password);
+        helpers.hideTextInImage(data, token);
+        fs.writeFileSync(job.output, data);
+
+        // What the extract tab of the browser tool would show
+        let browserExtract;
+        try {
+            const found = helpers.extractTextFromImage(data);
+            browserExtract = (await helpers.decryptText(found, job.password)) === job.text;
+        } catch (error) {
+            browserExtract = false;
+        }
+        results.push({ output: job.output, token, browser_extract: browserExtract });
+    }
+    process.stdout.write(JSON.stringify(results));
+}
+
+main();
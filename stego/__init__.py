@@ -0,0 +1,57 @@
+"""
+Image steganography engine shared by the command-line scripts.
+
+The scripts in the repository root (``main.py`` and
+``hide_text_in_image.py``) handle user interaction and share the functions
+of ``stego.scripts``; the modules in this package do the pixel-level work on
+NumPy arrays.
+
+The library calls of ``stego.core``, ``stego.candidates``, ``stego.web`` (the
+format of the browser tool) and ``stego.output`` are available from the
+package itself (``stego.hide_text(...)``). They are imported on first
+access, so ``import stego`` loads neither NumPy, Pillow nor cryptography and
+has no side effects.
+"""
+
+import importlib
+
+
+# Module each name of the public API lives in
+_API = {
+    'hide_text': 'stego.core',
+    'extract_text': 'stego.core',
+    'hide_bytes': 'stego.core',
+    'extract_bytes': 'stego.core',
+    'hide_file': 'stego.core',
+    'hide_for_recipients': 'stego.core',
+    'hide_stream': 'stego.core',
+    'extract_stream': 'stego.core',
+    'extract_file': 'stego.core',
+    'capacity': 'stego.core',
+    'check_fits': 'stego.core',
+    'extract_with_candidates': 'stego.candidates',
+    'hide_web_text': 'stego.web',
+    'extract_web_text': 'stego.web',
+    'StegoError': 'stego.core',
+    'NoHiddenTextError': 'stego.core',
+    'IncorrectPasswordError': 'stego.core',
+    'PayloadTypeError': 'stego.core',
+    'CorruptPayloadError': 'stego.core',
+    'PayloadTooLargeError': 'stego.core',
+    'encode_image': 'stego.output',
+}
+
+__all__ = sorted(_API)
+
+
+# Import a name of the public API on first access
+def __getattr__(name):
+    if name not in _API:
+        raise AttributeError(f"module 'stego' has no attribute {name!r}")
+    value = getattr(importlib.import_module(_API[name]), name)
+    globals()[name] = value
+    return value
+
+# List the lazy names along with the loaded ones
+def __dir__():
+    return sorted(set(globals()) | set(_API))
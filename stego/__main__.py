@@ -0,0 +1,6 @@
+import sys
+
+from stego.cli import main
+
+
+sys.exit(main())
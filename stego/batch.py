@@ -0,0 +1,271 @@
+"""
+Batch hide/extract over a manifest of images, spread over a process pool.
+
+A manifest is a CSV file with a header row, or a JSONL file with one object
+per line, with these fields:
+
+- hide: ``input``, ``output``, ``key_id`` and either ``message`` (text) or
+  ``file`` (the path of a file to hide)
+- extract: ``input``, ``key_id`` and, for images carrying a file, ``output``
+  (where to write the recovered file); ``format`` set to ``web`` reads the
+  text the browser tool hid (see ``stego.web``) instead
+
+Key ids are resolved to passwords through a JSON key file
+(``{"key_id": "password", ...}``) or, failing that, the environment variable
+``STEGO_KEY_<KEY_ID>``. Passwords never appear in the manifest or the report.
+
+Hide items are checked against the capacity of their image before they are
+submitted, from the image header alone, so items that cannot fit are reported
+at once instead of taking up a worker.
+
+Each item runs in a worker process and produces one JSON line in the report,
+written as soon as the item finishes. Only a bounded number of items are in
+flight at a time, so manifests of any length stream through in constant memory.
+Extraction can keep the decoded low bits of each image in a ``DecodeCache``
+(see ``stego.cache``), one per worker in memory and optionally one shared
+directory, so manifests that list an image several times, for instance once
+per candidate key, decode it once. Images without a container header are
+scanned for the end-marker format of older versions as ``legacy`` allows
+(see ``stego.core.extract_bytes``).
+
+The imaging modules and the process pool are imported when a batch runs
+rather than with this module, so the command line starts without them;
+workers forked after the first item inherit them already loaded.
+"""
+
+import csv
+import json
+import os
+import time
+
+
+HIDE = 'hide'
+EXTRACT = 'extract'
+WEB_FORMAT = 'web'
+REQUIRED_FIELDS = {
+    HIDE: ('input', 'output', 'key_id'),
+    EXTRACT: ('input', 'key_id'),
+}
+
+# Decode caches of this process, by cache directory
+_caches = {}
+
+
+# Read the items of a manifest
+def read_manifest(path):
+    """
+    Read the items of a CSV or JSONL manifest lazily.
+
+    Files ending in ``.jsonl`` or ``.json`` are read as JSON lines, anything
+    else as CSV with a header row.
+
+    Args:
+        path (str): The path to the manifest.
+
+    Yields:
+        dict: One item per manifest row.
+    """
+
+    with open(path, newline='', encoding='utf-8') as manifest:
+        if path.endswith(('.jsonl', '.json')):
+            for line in manifest:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(manifest)
+
+# Load the key id to password mapping
+def load_keys(path=None):
+    """
+    Load the key id to password mapping.
+
+    Args:
+        path (str): The path to a JSON object mapping key ids to passwords,
+            or None to rely on ``STEGO_KEY_<KEY_ID>`` environment variables only.
+
+    Returns:
+        dict: The key id to password mapping.
+    """
+
+    if path is None:
+        return {}
+    with open(path, encoding='utf-8') as key_file:
+        return json.load(key_file)
+
+# Look up the password of a key id
+def resolve_password(key_id, keys):
+    """
+    Look up the password of a key id.
+
+    Args:
+        key_id (str): The key id from the manifest.
+        keys (dict): The mapping loaded by ``load_keys``.
+
+    Returns:
+        str: The password.
+
+    Raises:
+        KeyError: If the key id is neither in the mapping nor the environment.
+    """
+
+    if key_id in keys:
+        return keys[key_id]
+    env_name = 'STEGO_KEY_' + key_id.upper().replace('-', '_')
+    if env_name in os.environ:
+        return os.environ[env_name]
+    raise KeyError(f"Unknown key id: {key_id!r}")
+
+# Get the decode cache of this process for a cache directory
+def _decode_cache(directory):
+    if directory not in _caches:
+        from stego.cache import DecodeCache
+
+        _caches[directory] = DecodeCache(directory=directory)
+    return _caches[directory]
+
+# Process one manifest item in a worker
+def run_item(command, item, password, tiled=False, depth=1, alpha=False, preset=None,
+             cache=False, cache_dir=None, legacy=None):
+    """
+    Hide or extract for one manifest item.
+
+    This runs in a worker process. Every failure is caught and reported in
+    the result, so one bad image never stops the batch.
+
+    Args:
+        command (str): ``'hide'`` or ``'extract'``.
+        item (dict): The manifest item.
+        password (str): The password of the item's key id.
+        tiled (bool): Use the memory-bounded tiled mode.
+        depth (int): The number of low bits to use in each channel when hiding.
+        alpha (bool): Also use the alpha channel when hiding.
+        preset (str): The output preset when hiding, see ``stego.output``.
+        cache (bool): Keep decoded images in the memory of the worker when
+            extracting.
+        cache_dir (str): Also keep them in this directory; implies ``cache``.
+        legacy (bool): Scan for payloads written before containers had a
+            header when extracting, see ``stego.core.extract_bytes``.
+
+    Returns:
+        dict: The report line for the item.
+    """
+
+    from stego.core import extract_file, extract_text, hide_file, hide_text
+    from stego.web import extract_web_text
+
+    decode_cache = _decode_cache(cache_dir) if cache or cache_dir else None
+    result = {'input': item.get('input'), 'key_id': item.get('key_id')}
+    started = time.perf_counter()
+    try:
+        if command == HIDE:
+            result['output'] = item['output']
+            if item.get('file'):
+                result['bits'] = hide_file(
+                    item['input'], item['file'], item['output'], password, tiled, depth, alpha,
+                    preset
+                )
+            else:
+                result['bits'] = hide_text(
+                    item['input'], item['message'], item['output'], password, tiled, depth, alpha,
+                    preset
+                )
+        elif item.get('format') == WEB_FORMAT:
+            result['message'] = extract_web_text(item['input'], password)
+        elif item.get('output'):
+            name, content = extract_file(item['input'], password, tiled, decode_cache, legacy)
+            with open(item['output'], 'wb') as recovered:
+                recovered.write(content)
+            result.update(output=item['output'], file=name, bytes=len(content))
+        else:
+            result['message'] = extract_text(
+                item['input'], password, tiled, decode_cache, legacy
+            )
+        result['status'] = 'ok'
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['seconds'] = round(time.perf_counter() - started, 6)
+    return result
+
+# Check an item, and that its payload fits, and attach its password
+def _prepare(command, item, keys, tiled, depth, alpha, preset):
+    from stego.core import check_fits, plaintext_size
+    from stego.output import check_output
+
+    missing = [field for field in REQUIRED_FIELDS[command] if not item.get(field)]
+    if command == HIDE and not item.get('message') and not item.get('file'):
+        missing.append('message or file')
+    if missing:
+        raise ValueError(f"Missing field(s): {', '.join(missing)}")
+    password = resolve_password(item['key_id'], keys)
+    if command == HIDE:
+        size = plaintext_size(item.get('message') or None, item.get('file'))
+        room = check_fits(item['input'], size, depth, alpha, tiled)
+        if not tiled:
+            check_output(room.mode, item['output'], preset)
+    return password
+
+# Run a whole manifest through a process pool
+def run_batch(command, manifest_path, report, keys=None, workers=None, tiled=False, depth=1,
+              alpha=False, preset=None, cache=False, cache_dir=None, legacy=None):
+    """
+    Run every item of a manifest through a process pool.
+
+    Report lines are written in completion order. Each carries the item's
+    ``line`` (1-based position in the manifest) so it can be matched back.
+
+    Args:
+        command (str): ``'hide'`` or ``'extract'``.
+        manifest_path (str): The path to the CSV or JSONL manifest.
+        report (file): A text stream the JSONL report is written to.
+        keys (dict): The key id to password mapping, see ``load_keys``.
+        workers (int): The number of worker processes, by default one per core.
+        tiled (bool): Use the memory-bounded tiled mode for every item.
+        depth (int): The number of low bits to use in each channel when hiding.
+        alpha (bool): Also use the alpha channel when hiding.
+        preset (str): The output preset when hiding, see ``stego.output``.
+        cache (bool): Keep decoded images in the memory of each worker when
+            extracting.
+        cache_dir (str): Also keep them in this directory, shared by the
+            workers and later runs; implies ``cache``.
+        legacy (bool): Scan for payloads written before containers had a
+            header when extracting, see ``stego.core.extract_bytes``.
+
+    Returns:
+        tuple: The number of items that succeeded and that failed.
+    """
+
+    from stego.parallel import imap_bounded, worker_pool
+
+    keys = keys or {}
+    workers = workers or os.cpu_count() or 1
+    succeeded = failed = 0
+
+    def write(result):
+        nonlocal succeeded, failed
+        if result['status'] == 'ok':
+            succeeded += 1
+        else:
+            failed += 1
+        report.write(json.dumps(result) + '\n')
+        report.flush()
+
+    # Items that fail their checks are reported without taking up a worker
+    def jobs():
+        for index, item in enumerate(read_manifest(manifest_path), start=1):
+            try:
+                password = _prepare(command, item, keys, tiled, depth, alpha, preset)
+            except (KeyError, OSError, ValueError) as e:
+                write({
+                    'line': index, 'input': item.get('input'), 'key_id': item.get('key_id'),
+                    'status': 'error', 'error': f"{type(e).__name__}: {e}",
+                })
+                continue
+            yield index, run_item, (
+                command, item, password, tiled, depth, alpha, preset, cache, cache_dir, legacy
+            )
+
+    with worker_pool(workers) as pool:
+        for index, result in imap_bounded(pool, jobs(), workers):
+            write({'line': index, **result})
+    return succeeded, failed
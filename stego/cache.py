@@ -0,0 +1,262 @@
+"""
+Cache of decoded low bits for repeated extraction.
+
+Extraction decodes the whole image although it reads only the low bits of
+the channels. Verification jobs extract the same images again and again,
+often trying several passwords, so ``DecodeCache`` keeps those bits, packed
+eight to a byte, keyed by a hash of the file content:
+
+- in memory, evicting the least recently used entries past ``max_bytes``;
+- optionally in a directory as well, shared between processes and runs.
+
+Looking up a path hashes the file again only when its size or modification
+time changed since the last lookup (or on every lookup with ``verify``), so
+a repeated extraction costs a ``stat``, unpacking the bits and reading them.
+A file object is read and hashed on every lookup. Entries keyed by content
+are never stale; an entry that fails to load from disk is dropped.
+
+An entry holds the lowest bit plane, which is all headers, end-marker
+payloads and depth-1 payloads read. A container written with more bits per
+channel makes the cache decode the image once more and keep the planes it
+needs. ``stats`` reports hits, misses and the hit rate.
+"""
+
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+from PIL import Image
+
+from stego.container import to_carrier
+from stego.metrics import count, span
+
+
+DEFAULT_MAX_BYTES = 256 * 2**20
+DIGEST_SIZE = 20
+
+# Image mode, pixel array shape and one packed array per low bit plane
+Planes = namedtuple('Planes', ['mode', 'shape', 'planes'])
+
+
+# Pack the low bits of a pixel array
+def pack_planes(pixels, mode, depth=1):
+    """
+    Pack the ``depth`` low bit planes of a pixel array.
+
+    Args:
+        pixels (numpy.ndarray): A ``uint8`` pixel array.
+        mode (str): The image mode.
+        depth (int): The number of low bit planes to keep.
+
+    Returns:
+        Planes: The packed planes, each 1/8 of the size of the array.
+    """
+
+    flat = pixels.reshape(-1)
+    planes = tuple(np.packbits((flat >> bit) & 1) for bit in range(depth))
+    return Planes(mode, pixels.shape, planes)
+
+# Rebuild a pixel array holding only the cached low bits
+def unpack_planes(entry):
+    """
+    Rebuild a pixel array whose low bits are those of the cached image.
+
+    Args:
+        entry (Planes): The packed planes.
+
+    Returns:
+        numpy.ndarray: A ``uint8`` array of the original shape, holding the
+        ``len(entry.planes)`` low bits of each channel and zeros above them.
+    """
+
+    size = int(np.prod(entry.shape))
+    pixels = np.unpackbits(entry.planes[0], count=size)
+    for bit, plane in enumerate(entry.planes[1:], start=1):
+        pixels |= np.unpackbits(plane, count=size) << bit
+    return pixels.reshape(entry.shape)
+
+
+class DecodeCache:
+    """
+    Decoded low bits of images, keyed by content hash.
+
+    Args:
+        max_bytes (int): The memory budget for packed planes. The least
+            recently used entries are evicted past it.
+        directory (str): A directory to also keep entries in, or None to keep
+            them in memory only. It is created if needed.
+        verify (bool): Hash a path on every lookup instead of trusting an
+            unchanged size and modification time.
+
+    The cache can be shared by threads.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, directory=None, verify=False):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.verify = verify
+        self._entries = OrderedDict()
+        self._paths = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(
+            ('hits', 'disk_hits', 'misses', 'evictions', 'rehashes'), 0
+        )
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    # Hash an image source, reusing the digest of an unchanged path
+    def _digest(self, source):
+        if not isinstance(source, (str, os.PathLike)):
+            start = source.tell()
+            data = source.read()
+            source.seek(start)
+            return hashlib.blake2b(data, digest_size=DIGEST_SIZE).hexdigest(), data
+
+        path = os.path.abspath(source)
+        stat = os.stat(path)
+        signature = (stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            known = self._paths.get(path)
+        if known is not None and known[0] == signature and not self.verify:
+            return known[1], None
+        with open(path, 'rb') as f:
+            data = f.read()
+        digest = hashlib.blake2b(data, digest_size=DIGEST_SIZE).hexdigest()
+        with self._lock:
+            if known is not None and known[1] != digest:
+                self._counts['rehashes'] += 1
+            self._paths[path] = (signature, digest)
+        return digest, data
+
+    # Keep an entry in memory, evicting the least recently used ones
+    def _remember(self, digest, entry):
+        size = sum(plane.nbytes for plane in entry.planes)
+        with self._lock:
+            previous = self._entries.pop(digest, None)
+            if previous is not None:
+                self._bytes -= sum(plane.nbytes for plane in previous.planes)
+            self._entries[digest] = entry
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= sum(plane.nbytes for plane in evicted.planes)
+                self._counts['evictions'] += 1
+
+    # Path of the disk entry of a digest
+    def _disk_path(self, digest):
+        return os.path.join(self.directory, digest + '.npz')
+
+    # Load an entry from disk, dropping it if it is unreadable
+    def _load_disk(self, digest):
+        path = self._disk_path(digest)
+        try:
+            with np.load(path, allow_pickle=False) as stored:
+                entry = Planes(
+                    str(stored['mode']), tuple(int(n) for n in stored['shape']),
+                    tuple(stored[f'plane{bit}'] for bit in range(int(stored['depth']))),
+                )
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # A partial or foreign file: drop it, so the entry is written again
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        expected = -(-int(np.prod(entry.shape)) // 8)
+        if not entry.planes or any(plane.size != expected for plane in entry.planes):
+            return None
+        return entry
+
+    # Write an entry to disk atomically
+    def _store_disk(self, digest, entry):
+        path = self._disk_path(digest)
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        planes = {f'plane{bit}': plane for bit, plane in enumerate(entry.planes)}
+        with open(temporary, 'wb') as f:
+            np.savez(f, mode=np.array(entry.mode), shape=np.array(entry.shape),
+                     depth=np.array(len(entry.planes)), **planes)
+        os.replace(temporary, path)
+
+    def load(self, source, depth=1):
+        """
+        Get the low bits of an image, decoding it only on a miss.
+
+        Args:
+            source: The path of the image, or a seekable binary file object.
+                Its position is left where it was.
+            depth (int): The number of exact low bits needed per channel.
+
+        Returns:
+            tuple: A pixel array holding at least ``depth`` exact low bits per
+            channel, in the mode ``stego.container.to_carrier`` gives the
+            image, and that mode.
+        """
+
+        digest, data = self._digest(source)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None and len(entry.planes) >= depth:
+                self._entries.move_to_end(digest)
+                self._counts['hits'] += 1
+            else:
+                entry = None
+        if entry is None and self.directory is not None:
+            entry = self._load_disk(digest)
+            if entry is not None and len(entry.planes) >= depth:
+                self._remember(digest, entry)
+                with self._lock:
+                    self._counts['disk_hits'] += 1
+            else:
+                entry = None
+        if entry is not None:
+            count('cache_hits', 1)
+            with span('unpack'):
+                return unpack_planes(entry), entry.mode
+
+        with self._lock:
+            self._counts['misses'] += 1
+        count('cache_misses', 1)
+        if data is None:
+            with open(source, 'rb') as f:
+                data = f.read()
+        with span('decode'):
+            img = to_carrier(Image.open(io.BytesIO(data)))
+            pixels = np.asarray(img, dtype=np.uint8)
+        entry = pack_planes(pixels, img.mode, depth)
+        self._remember(digest, entry)
+        if self.directory is not None:
+            self._store_disk(digest, entry)
+        return pixels, img.mode
+
+    def stats(self):
+        """
+        Report the counters and size of the cache.
+
+        Returns:
+            dict: ``hits`` (in memory), ``disk_hits``, ``misses``,
+            ``evictions``, ``rehashes`` (paths whose content changed),
+            ``hit_rate``, and the ``entries`` and ``bytes`` held in memory.
+        """
+
+        with self._lock:
+            counts = dict(self._counts)
+            entries, size = len(self._entries), self._bytes
+        lookups = counts['hits'] + counts['disk_hits'] + counts['misses']
+        hit_rate = (counts['hits'] + counts['disk_hits']) / lookups if lookups else 0.0
+        return {**counts, 'hit_rate': round(hit_rate, 4), 'entries': entries, 'bytes': size}
+
+    def clear(self):
+        """
+        Forget the entries held in memory. Disk entries are kept.
+        """
+
+        with self._lock:
+            self._entries.clear()
+            self._paths.clear()
+            self._bytes = 0
@@ -0,0 +1,276 @@
+"""
+Find which of several candidate passwords opens an image, decoding it once.
+
+Without this, a job holding N possible keys for an image runs N extractions.
+Each one decodes the image, and for a wrong password each one also scans the
+end-marker format in the keyed and legacy pixel orders before failing at
+decryption. The legacy scan shuffles a list of every pixel, which takes
+seconds on a large image. ``extract_with_candidates`` decodes the image once
+and then works in three steps:
+
+1. It reads the container header of every candidate in the pixel orders of
+   ``stego.container.container_orders``. That means 32 pixels per order and
+   no decryption. The magic and version of a header match random bits about
+   once in 2**40 tries, so wrong keys are rejected here. The whole-image
+   orders are tried for all candidates first, at about 1.5 ms each, and the
+   slots of shared images only if no header turned up, at about 10 ms each.
+   The probes run on the thread pool of ``stego.parallel``, a candidate per
+   task; ``probe_headers`` is the public entry point of this step.
+2. It decrypts the payload of the candidates whose header matched, in
+   candidate order. Fernet checks the HMAC before decrypting.
+3. Only if no header matched does it scan the end-marker format for every
+   candidate. This covers images written before containers had a header.
+   The scan runs in a process pool, because the legacy order costs a full
+   shuffle per password; by default that order is only scanned in small
+   images (see ``stego.container.legacy_orders``). Payloads that are not shaped like a Fernet token
+   (see ``stego.crypto.looks_like_token``) are rejected without deriving a
+   key.
+"""
+
+import os
+from collections import namedtuple
+
+from stego.cache import pack_planes, unpack_planes
+from stego.container import (
+    FLAG_CONTINUED, FLAG_FILE, find_header, find_legacy_payload, legacy_orders, read_container,
+)
+from stego.core import (
+    IncorrectPasswordError, NoHiddenTextError, decode_pixels, decrypt_payload, split_file_record,
+)
+from stego.crypto import decrypt_text, looks_like_token
+from stego.frames import read_frames
+from stego.metrics import count, operation, span
+from stego.parallel import map_chunks
+
+
+# Key id of the password that opened the image, the plaintext, and the file
+# name for a hidden file (None for text and bytes)
+Match = namedtuple('Match', ['key_id', 'plaintext', 'name'])
+
+# Candidates probed per task of the thread pool
+PROBE_CHUNK = 1
+
+# Pixels, mode and pixel orders the end-marker scan of a worker process reads
+_scan_pixels = None
+
+
+# Build the result for a decrypted payload
+def _match(key_id, flags, plaintext):
+    if flags & FLAG_FILE:
+        name, content = split_file_record(plaintext)
+        return Match(key_id, content, name)
+    return Match(key_id, plaintext, None)
+
+# Find the container headers of the candidates
+def probe_headers(pixels, mode, candidates):
+    """
+    Find the candidates whose container header is in an image.
+
+    The whole-image pixel orders are probed for every candidate first, and
+    the slots of shared images only if no header turned up. Probes run on the
+    thread pool of ``stego.parallel``.
+
+    Args:
+        pixels (numpy.ndarray): The pixel array (only the lowest bits are read).
+        mode (str): The image mode.
+        candidates (list): The ``(key_id, password)`` pairs.
+
+    Returns:
+        list: ``(key_id, password, (positions, header))`` for each candidate
+        whose header was found, in candidate order; see
+        ``stego.container.find_header``.
+    """
+
+    for shared in (False, True):
+        # Probe the candidates of one task
+        def probe(start, stop):
+            return [(key_id, password, find_header(pixels, mode, password, shared))
+                    for key_id, password in candidates[start:stop]]
+
+        probed = [match for chunk in map_chunks(probe, len(candidates), PROBE_CHUNK)
+                  for match in chunk]
+        headers = [(key_id, password, found) for key_id, password, found in probed if found]
+        if headers:
+            return headers
+    return []
+
+# Read the payload of a header found by probe_headers
+def read_match(image_path, pixels, mode, password, found, reload=None):
+    """
+    Read the payload of a header found by ``probe_headers``, following it
+    through the next frames of multi-frame images. Nothing is decrypted.
+
+    Args:
+        image_path: The path to the image, or a seekable binary file object.
+        pixels (numpy.ndarray): The pixel array the header was found in.
+        mode (str): The image mode.
+        password (str): The password of the header.
+        found (tuple): The positions and header, as ``probe_headers`` gives.
+        reload (callable): Returns pixels holding more low bits, see
+            ``stego.container.find_payload``; None if ``pixels`` has them all.
+
+    Returns:
+        tuple: The header flags and the whole payload, for
+        ``stego.core.decrypt_payload``, or None if a frame the payload goes on
+        in is missing or has no container.
+    """
+
+    positions, header = found
+    if reload is not None and header.bits_per_channel > 1:
+        pixels = reload(header.bits_per_channel)
+    flags, payload = read_container(pixels, positions, mode, header)
+    if flags & FLAG_CONTINUED:
+        return read_frames(image_path, password, flags, payload)
+    return flags, payload
+
+# Scan the end-marker format of one candidate
+def _scan(pixels, mode, password, orders):
+    """
+    Look for an end-marker payload of one candidate in every pixel order.
+
+    Args:
+        pixels (numpy.ndarray): The pixel array (only the lowest bits are read).
+        mode (str): The image mode.
+        password (str): The candidate password.
+        orders (tuple): The pixel orders to scan, see ``legacy_orders``.
+
+    Returns:
+        tuple: Whether a token-shaped payload was found, and its plaintext if
+        it decrypted (None otherwise).
+    """
+
+    found = False
+    for order in orders:
+        payload = find_legacy_payload(pixels, mode, password, order)
+        if payload is None or not looks_like_token(payload, raw=False):
+            continue
+        found = True
+        try:
+            return found, decrypt_text(payload.decode('latin-1'), password).encode()
+        except Exception:
+            continue
+    return found, None
+
+# Unpack the low bits the end-marker scans of a worker read
+def _init_scan_worker(planes, orders):
+    global _scan_pixels
+
+    _scan_pixels = (unpack_planes(planes), planes.mode, orders)
+
+# Scan the end-marker format of one candidate in a worker process
+def _scan_job(password):
+    pixels, mode, orders = _scan_pixels
+    return _scan(pixels, mode, password, orders)
+
+# Scan the end-marker format of every candidate, in parallel
+def _scan_all(pixels, mode, candidates, workers, orders):
+    """
+    Scan the end-marker format of the candidates until one decrypts.
+
+    Args:
+        pixels (numpy.ndarray): The pixel array.
+        mode (str): The image mode.
+        candidates (list): The ``(key_id, password)`` pairs.
+        workers (int): The number of processes, or None for one per core.
+        orders (tuple): The pixel orders to scan, see ``legacy_orders``.
+
+    Returns:
+        tuple: Whether any token-shaped payload was found, and the ``Match``
+        of the first candidate, in candidate order, that decrypted (or None).
+    """
+
+    workers = min(workers or os.cpu_count() or 1, len(candidates))
+    if workers <= 1:
+        found = False
+        for key_id, password in candidates:
+            seen, plaintext = _scan(pixels, mode, password, orders)
+            found = found or seen
+            if plaintext is not None:
+                return True, Match(key_id, plaintext, None)
+        return found, None
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    # Workers get the lowest bit plane once, 1/8 of the pixels, packed
+    pool = ProcessPoolExecutor(
+        workers, initializer=_init_scan_worker, initargs=(pack_planes(pixels, mode), orders)
+    )
+    try:
+        futures = [(key_id, pool.submit(_scan_job, password)) for key_id, password in candidates]
+        found = False
+        for key_id, future in futures:
+            seen, plaintext = future.result()
+            found = found or seen
+            if plaintext is not None:
+                return True, Match(key_id, plaintext, None)
+        return found, None
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+# Extract with whichever candidate password opens the image
+def extract_with_candidates(image_path, candidates, cache=None, workers=None, legacy=None):
+    """
+    Find the candidate password that opens an image and extract with it.
+
+    The image is decoded once for all the candidates; see the module
+    documentation for how wrong keys are rejected early.
+
+    Args:
+        image_path: The path to the image, or a binary file object.
+        candidates: A mapping of key ids to passwords, or a sequence of
+            passwords whose key ids are their indices.
+        cache (stego.cache.DecodeCache): Take the decoded low bits of the image
+            from this cache, and keep them there.
+        workers (int): The processes scanning the end-marker format, one per
+            core by default.
+        legacy (bool): Fall back to the end-marker format when no candidate
+            finds a container header: True in both pixel orders, False not at
+            all. By default the legacy order is only scanned in small images.
+
+    Returns:
+        Match: The key id of the first candidate, in candidate order, that
+        decrypts the payload, the plaintext (the file content for a hidden
+        file) and the file name (None for text and bytes).
+
+    Raises:
+        NoHiddenTextError: If no candidate finds a payload.
+        IncorrectPasswordError: If payloads are found but none decrypts.
+    """
+
+    if hasattr(candidates, 'items'):
+        candidates = list(candidates.items())
+    else:
+        candidates = list(enumerate(candidates))
+
+    with operation('extract_candidates'):
+        count('candidates', len(candidates))
+        pixels, mode, reload = decode_pixels(image_path, cache)
+
+        with span('headers'):
+            headers = probe_headers(pixels, mode, candidates)
+        count('header_matches', len(headers))
+        for key_id, password, found in headers:
+            read = read_match(image_path, pixels, mode, password, found, reload)
+            if read is None:
+                continue
+            flags, payload = read
+            count('bytes_in', len(payload))
+            try:
+                with span('decrypt'):
+                    plaintext = decrypt_payload(flags, payload, password)
+            except Exception:
+                continue
+            count('bytes_out', len(plaintext))
+            return _match(key_id, flags, plaintext)
+
+        found = bool(headers)
+        orders = legacy_orders(pixels.shape[0] * pixels.shape[1], legacy)
+        if not found and orders and candidates:
+            with span('scan'):
+                found, match = _scan_all(pixels, mode, candidates, workers, orders)
+            if match is not None:
+                count('bytes_out', len(match.plaintext))
+                return match
+        if found:
+            raise IncorrectPasswordError("No candidate password decrypts the hidden text.")
+        raise NoHiddenTextError("No hidden text found with any candidate password.")
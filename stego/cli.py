@@ -0,0 +1,258 @@
+"""
+Non-interactive command line.
+
+Usage::
+
+    python -m stego hide MANIFEST [--keys KEYS.json] [--report REPORT.jsonl] [--workers N] [--tiled]
+                               [--depth N] [--alpha] [--preset PRESET]
+    python -m stego extract MANIFEST [--keys KEYS.json] [--report REPORT.jsonl] [--workers N] [--tiled]
+                                  [--cache] [--cache-dir DIR] [--legacy | --no-legacy]
+    python -m stego capacity IMAGE [IMAGE ...] [--depth N] [--alpha] [--tiled] [--slots N]
+                                   [--message TEXT | --file PATH | --size N]
+    python -m stego identify IMAGE [IMAGE ...] --keys KEYS.json [--workers N]
+                                            [--legacy | --no-legacy]
+    python -m stego scan PATH [PATH ...] [--keys KEYS.json] [--report REPORT.jsonl] [--workers N]
+                                        [--resume] [--no-verify] [--threshold P] [--rate R]
+
+``capacity`` reads only the image headers. It prints one JSON line per image
+with how many plaintext bytes fit, and whether the given message, file or
+size does; it exits with 1 if any image cannot take it.
+
+``identify`` tries every key of the key file on each image, decoding it once
+(see ``stego.candidates``). It prints one JSON line per image with the key id
+that opens it and the message, or the name and size of a hidden file; it
+exits with 1 if no key opens some image.
+
+``extract`` and ``identify`` look for payloads written before containers had
+a header only in small images, since the legacy pixel order costs seconds
+per password on a large one (see ``stego.container.legacy_orders``);
+``--legacy`` scans every image, ``--no-legacy`` none.
+
+``scan`` audits images, and the images in directories, for hidden payloads
+(see ``stego.scan``). It writes one JSON line per image with its verdict and
+low-bit statistics, and keeps a checkpoint next to the report so ``--resume``
+carries on a scan that was cut short. Without its key, a payload makes an
+image suspect once it fills about a tenth of it. It exits with 1 if any
+image is damaged or unreadable.
+
+``main.py`` forwards to this command line when it is given arguments, so
+``python main.py hide manifest.csv`` works too and skips the interactive menu,
+banner and logo animation.
+
+Parsing the arguments loads neither NumPy, Pillow nor cryptography; the
+modules doing the work are imported once a command actually runs.
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from stego.batch import EXTRACT, HIDE, load_keys, run_batch
+from stego.crypto import token_size
+from stego.output import PRESETS
+
+
+CAPACITY = 'capacity'
+IDENTIFY = 'identify'
+SCAN = 'scan'
+
+
+# Add the options choosing when to scan for the end-marker format
+def _add_legacy_options(command):
+    legacy = command.add_mutually_exclusive_group()
+    legacy.add_argument('--legacy', dest='legacy', action='store_true', default=None,
+                        help="scan every image without a container header for the end-marker "
+                             "format (default: small images only)")
+    legacy.add_argument('--no-legacy', dest='legacy', action='store_false',
+                        help="only look for container headers, skipping the end-marker scan")
+
+# Build the argument parser
+def build_parser():
+    """
+    Build the argument parser of the command line.
+
+    Returns:
+        argparse.ArgumentParser: The parser.
+    """
+
+    parser = argparse.ArgumentParser(
+        prog='stego', description="Hide or extract encrypted text in images in bulk."
+    )
+    commands = parser.add_subparsers(dest='command', required=True)
+    for name, summary in ((HIDE, "hide messages listed in a manifest"),
+                          (EXTRACT, "extract messages from images listed in a manifest")):
+        command = commands.add_parser(name, help=summary, description=summary.capitalize() + ".")
+        command.add_argument('manifest', help="CSV (with header row) or JSONL manifest")
+        command.add_argument('--keys', help="JSON file mapping key ids to passwords")
+        command.add_argument('--report', default='-',
+                             help="JSONL report path, '-' for standard output (default)")
+        command.add_argument('--workers', type=int, default=None,
+                             help="worker processes (default: one per core)")
+        command.add_argument('--tiled', action='store_true',
+                             help="process images band by band with bounded memory "
+                                  "(hide writes TIFF output)")
+        if name == HIDE:
+            command.add_argument('--depth', type=int, default=1,
+                                 help="low bits used in each channel, 1 to 4 (default: 1)")
+            command.add_argument('--alpha', action='store_true',
+                                 help="also use the alpha channel of images that have one")
+            command.add_argument('--preset', choices=list(PRESETS), default=None,
+                                 help="output encoding (default: from the output extension)")
+            command.set_defaults(cache=False, cache_dir=None, legacy=None)
+        else:
+            command.add_argument('--cache', action='store_true',
+                                 help="keep decoded images in memory for items that repeat them")
+            command.add_argument('--cache-dir',
+                                 help="also keep decoded images in this directory (implies --cache)")
+            _add_legacy_options(command)
+            command.set_defaults(depth=1, alpha=False, preset=None)
+
+    summary = "report how much images can carry, from their headers only"
+    command = commands.add_parser(CAPACITY, help=summary, description=summary.capitalize() + ".")
+    command.add_argument('images', nargs='+', help="images to measure")
+    command.add_argument('--depth', type=int, default=1,
+                         help="low bits used in each channel, 1 to 4 (default: 1)")
+    command.add_argument('--alpha', action='store_true',
+                         help="also use the alpha channel of images that have one")
+    command.add_argument('--tiled', action='store_true', help="measure for the tiled mode")
+    command.add_argument('--slots', type=int, default=1,
+                         help="measure one slot of an image shared by this many recipients")
+    payload = command.add_mutually_exclusive_group()
+    payload.add_argument('--message', help="check that this message fits")
+    payload.add_argument('--file', help="check that this file fits")
+    payload.add_argument('--size', type=int, help="check that this many plaintext bytes fit")
+
+    summary = "find which key of a key file opens each image"
+    command = commands.add_parser(IDENTIFY, help=summary, description=summary.capitalize() + ".")
+    command.add_argument('images', nargs='+', help="images to try the keys on")
+    command.add_argument('--keys', required=True, help="JSON file mapping key ids to passwords")
+    command.add_argument('--workers', type=int, default=None,
+                         help="processes scanning images without a container header "
+                              "(default: one per core)")
+    _add_legacy_options(command)
+    command.set_defaults(depth=1)
+
+    summary = "audit images for hidden payloads, with or without their keys"
+    command = commands.add_parser(SCAN, help=summary, description=summary.capitalize() + ".")
+    command.add_argument('paths', nargs='+', help="images, and directories to walk for images")
+    command.add_argument('--keys', help="JSON file mapping key ids to passwords")
+    command.add_argument('--report', default='scan.jsonl',
+                         help="JSONL report path (default: scan.jsonl)")
+    command.add_argument('--workers', type=int, default=None,
+                         help="worker processes (default: one per core)")
+    command.add_argument('--resume', action='store_true',
+                         help="carry on the scan recorded in the report and its checkpoint")
+    command.add_argument('--no-verify', dest='verify', action='store_false',
+                         help="report found containers without checking their payload")
+    command.add_argument('--threshold', type=float, default=None,
+                         help="chi-square probability from which an image is suspect "
+                              "(default: 0.95)")
+    command.add_argument('--rate', type=float, default=None,
+                         help="estimated share of replaced low bits from which an image is "
+                              "suspect (default: 0.1)")
+    command.set_defaults(depth=1)
+    return parser
+
+# Measure the images given to the capacity command
+def _run_capacity(args):
+    from stego.core import capacity, plaintext_size
+
+    size = args.size
+    if args.message is not None or args.file is not None:
+        size = plaintext_size(args.message, args.file)
+    status = 0
+    for image_path in args.images:
+        line = {'input': image_path}
+        try:
+            room = capacity(image_path, args.depth, args.alpha, args.tiled, args.slots)
+        except (OSError, ValueError) as e:
+            line.update(status='error', error=f"{type(e).__name__}: {e}")
+            status = 1
+        else:
+            line.update(room._asdict(), status='ok')
+            if size is not None:
+                line.update(plaintext_bytes=size, token_bytes=token_size(size),
+                            fits=token_size(size) <= room.payload_bytes)
+                status = status or int(not line['fits'])
+        print(json.dumps(line))
+    return status
+
+# Find the key of each image given to the identify command
+def _run_identify(args):
+    from stego.candidates import extract_with_candidates
+
+    keys = load_keys(args.keys)
+    status = 0
+    for image_path in args.images:
+        line = {'input': image_path}
+        started = time.perf_counter()
+        try:
+            match = extract_with_candidates(
+                image_path, keys, workers=args.workers, legacy=args.legacy
+            )
+        except Exception as e:
+            line.update(status='error', error=f"{type(e).__name__}: {e}")
+            status = 1
+        else:
+            line.update(status='ok', key_id=match.key_id)
+            if match.name is not None:
+                line.update(file=match.name, bytes=len(match.plaintext))
+            else:
+                line['message'] = match.plaintext.decode()
+        line['seconds'] = round(time.perf_counter() - started, 6)
+        print(json.dumps(line))
+    return status
+
+# Audit the paths given to the scan command
+def _run_scan(args):
+    from stego.scan import DAMAGED, ERROR, SUSPECT_P, SUSPECT_RATE, run_scan
+
+    verdicts = run_scan(
+        args.paths, args.report, load_keys(args.keys), args.workers, args.verify,
+        SUSPECT_P if args.threshold is None else args.threshold, args.resume,
+        SUSPECT_RATE if args.rate is None else args.rate,
+    )
+    print(', '.join(f"{number} {verdict}" for verdict, number in sorted(verdicts.items()))
+          or "nothing to scan", file=sys.stderr)
+    return 1 if verdicts.get(DAMAGED) or verdicts.get(ERROR) else 0
+
+# Run the command line
+def main(argv=None):
+    """
+    Run the command line.
+
+    Args:
+        argv (list): The arguments, by default ``sys.argv[1:]``.
+
+    Returns:
+        int: The exit status, 1 if any item failed or, for ``capacity``, did
+        not fit, for ``identify``, no key opened it, or, for ``scan``, it
+        was damaged or unreadable.
+    """
+
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    from stego.container import MAX_DEPTH
+    if not 1 <= args.depth <= MAX_DEPTH:
+        parser.error(f"--depth must be between 1 and {MAX_DEPTH}")
+    if args.command == CAPACITY:
+        return _run_capacity(args)
+    if args.command == IDENTIFY:
+        return _run_identify(args)
+    if args.command == SCAN:
+        return _run_scan(args)
+    keys = load_keys(args.keys)
+    if args.report == '-':
+        succeeded, failed = run_batch(
+            args.command, args.manifest, sys.stdout, keys, args.workers, args.tiled,
+            args.depth, args.alpha, args.preset, args.cache, args.cache_dir, args.legacy
+        )
+    else:
+        with open(args.report, 'w', encoding='utf-8') as report:
+            succeeded, failed = run_batch(
+                args.command, args.manifest, report, keys, args.workers, args.tiled,
+                args.depth, args.alpha, args.preset, args.cache, args.cache_dir, args.legacy
+            )
+    print(f"{succeeded} succeeded, {failed} failed", file=sys.stderr)
+    return 1 if failed else 0
@@ -0,0 +1,607 @@
+"""
+Container formats for payloads hidden in an image.
+
+Version 1 containers start with a fixed-size header, written in the first
+positions of the keyed pixel order::
+
+    magic (4 bytes) | version | bits per channel | flags | slots | length (4 bytes)
+
+followed by exactly ``length`` payload bytes. A reader decodes the header and
+then only the bits the header announces. Containers written by
+``stego.tiled`` use the banded ``TiledPermutation`` order instead and set
+``FLAG_TILED``.
+
+An image can also carry up to ``MAX_SLOTS`` containers, one per password,
+in the disjoint slots of ``SlotPermutation`` (see ``embed_slots``). The
+slots byte records ``(slots - 1) << 4 | slot``. It is 0 for an image with a
+single container, which is what it always held before slots existed. A
+reader does not know the layout, so it tries the header of every slot of
+every slot count, once the whole-image orders failed (``container_orders``).
+
+The header always takes 1 bit from each color channel (R, G, B, or the gray
+channel of L and LA images), so a reader can find it knowing only the image
+mode. The payload then takes ``bits per channel`` low bits from each color
+channel, plus the alpha channel when ``FLAG_ALPHA`` is set.
+
+Images written before the header existed carry the payload followed by the
+end marker ``1111111111111110`` instead, in either the keyed or the legacy
+pixel order. ``iter_payloads`` detects the format and falls back to them.
+The legacy order shuffles a list of every pixel, seconds and hundreds of
+megabytes on a large image, which every wrong password would pay: by
+default it is only scanned in images of up to ``LEGACY_SCAN_PIXELS``
+pixels (see ``legacy_orders``).
+"""
+
+import struct
+from collections import namedtuple
+
+import numpy as np
+from PIL import Image
+
+from stego.engine import (
+    CHANNELS, bits_to_bytes, bytes_to_bits, embed_bits, extract_bits, read_until_marker,
+)
+from stego.metrics import count, span
+from stego.permutation import (
+    KEYED, ORDERS, SlotPermutation, TiledPermutation, make_permutation, slot_permutation,
+)
+
+
+MAGIC = b'HMSG'
+VERSION = 1
+HEADER = struct.Struct('>4sBBBBI')
+HEADER_BITS = HEADER.size * 8
+HEADER_PIXELS = -(-HEADER_BITS // CHANNELS)
+MAX_DEPTH = 4
+# Readers probe every slot of every layout up to this many slots
+MAX_SLOTS = 8
+# Largest image whose legacy pixel order is scanned unless asked, about 1 s
+LEGACY_SCAN_PIXELS = 1 << 20
+
+# Header flags
+FLAG_TILED = 0x01  # written in the banded order of stego.tiled
+FLAG_RAW = 0x02    # the payload is a binary Fernet token, not its base64 text
+FLAG_FILE = 0x04   # the plaintext is a file record (see stego.core)
+FLAG_ALPHA = 0x08  # the payload also uses the alpha channel
+FLAG_CONTINUED = 0x10  # the payload goes on in the next frame (see stego.frames)
+FLAG_STREAM = 0x20  # the payload is a stream of chunk tokens (see stego.stream)
+
+# Color channel count and alpha channel index of the modes payloads go into
+CARRIER_MODES = {
+    'L': (1, None),
+    'LA': (1, 1),
+    'RGB': (3, None),
+    'RGBA': (3, 3),
+}
+
+Header = namedtuple('Header', ['version', 'bits_per_channel', 'flags', 'length', 'slots', 'slot'])
+
+
+# Build the binary header of a container
+def pack_header(length, bits_per_channel=1, flags=0, slots=1, slot=0):
+    """
+    Build the binary header of a version 1 container.
+
+    Args:
+        length (int): The payload length in bytes.
+        bits_per_channel (int): The number of LSBs used in each channel.
+        flags (int): ``FLAG_*`` values describing the container.
+        slots (int): The number of slots the image is divided into.
+        slot (int): The slot of this container.
+
+    Returns:
+        bytes: The packed header.
+    """
+
+    return HEADER.pack(MAGIC, VERSION, bits_per_channel, flags, (slots - 1) << 4 | slot, length)
+
+# Parse the binary header of a container
+def parse_header(data):
+    """
+    Parse the binary header of a container.
+
+    Args:
+        data (bytes): At least ``HEADER.size`` bytes read from the image.
+
+    Returns:
+        Header: The decoded header, or None if the data is not a header this
+        version understands.
+    """
+
+    magic, version, bits_per_channel, flags, layout, length = HEADER.unpack(data[:HEADER.size])
+    if magic != MAGIC or version != VERSION or not 1 <= bits_per_channel <= MAX_DEPTH:
+        return None
+    slots, slot = (layout >> 4) + 1, layout & 0x0F
+    if slot >= slots:
+        return None
+    return Header(version, bits_per_channel, flags, length, slots, slot)
+
+# Pick the mode payloads go into for an image
+def carrier_mode(img):
+    """
+    Pick the one of the ``CARRIER_MODES`` an image is embedded in.
+
+    Grayscale and RGB images, with or without alpha, keep their mode.
+    Palette images become RGBA if they have transparency, bilevel images
+    become L, and anything else becomes RGB. Only the image header is looked
+    at, so this is cheap on an image that has not been decoded yet.
+
+    Args:
+        img (PIL.Image.Image): The image.
+
+    Returns:
+        str: The carrier mode.
+    """
+
+    if img.mode in CARRIER_MODES:
+        return img.mode
+    if img.mode == 'PA' or (img.mode == 'P' and 'transparency' in img.info):
+        return 'RGBA'
+    if img.mode == '1':
+        return 'L'
+    return 'RGB'
+
+# Convert an image to a mode payloads can go into
+def to_carrier(img):
+    """
+    Convert an image to its ``carrier_mode``.
+
+    Args:
+        img (PIL.Image.Image): The image.
+
+    Returns:
+        PIL.Image.Image: The image itself, or a converted copy.
+    """
+
+    mode = carrier_mode(img)
+    if img.mode == mode:
+        return img
+    return img.convert(mode)
+
+# Channels carrying the header and the payload of a container
+def channel_layout(mode, alpha=False):
+    """
+    Work out which channels carry the header and which carry the payload.
+
+    Args:
+        mode (str): One of the ``CARRIER_MODES``.
+        alpha (bool): Whether the payload also uses the alpha channel.
+
+    Returns:
+        tuple: The header channels and the payload channels.
+
+    Raises:
+        ValueError: If the mode is not a carrier mode, or alpha is asked for
+            on a mode without an alpha channel.
+    """
+
+    if mode not in CARRIER_MODES:
+        raise ValueError(f"Unsupported carrier mode {mode!r}, convert it with to_carrier")
+    color, alpha_index = CARRIER_MODES[mode]
+    header_channels = tuple(range(color))
+    if not alpha:
+        return header_channels, header_channels
+    if alpha_index is None:
+        raise ValueError(f"Mode {mode!r} has no alpha channel")
+    return header_channels, header_channels + (alpha_index,)
+
+# Count the pixels taken by the header
+def header_pixels(mode):
+    """
+    Count the pixels the header takes at the start of the pixel order.
+
+    Args:
+        mode (str): One of the ``CARRIER_MODES``.
+
+    Returns:
+        int: The number of pixels.
+    """
+
+    return -(-HEADER_BITS // CARRIER_MODES[mode][0])
+
+# Compute how many payload bits an image can hold
+def capacity_bits(pixel_count, mode, depth=1, alpha=False):
+    """
+    Compute how many payload bits a container can hold, header excluded.
+
+    Args:
+        pixel_count (int): The number of pixels in the image.
+        mode (str): One of the ``CARRIER_MODES``.
+        depth (int): The number of low bits used in each channel.
+        alpha (bool): Whether the payload also uses the alpha channel.
+
+    Returns:
+        int: The number of payload bits.
+    """
+
+    payload_channels = channel_layout(mode, alpha)[1]
+    return max(0, pixel_count - header_pixels(mode)) * len(payload_channels) * depth
+
+# Hide a payload inside an image
+def embed_payload(img, payload, password, flags=0, depth=1, alpha=False):
+    """
+    Hide a payload inside an image as a version 1 container.
+
+    Args:
+        img (PIL.Image.Image): An image in one of the ``CARRIER_MODES``. Its
+            pixels are replaced in place.
+        payload (bytes): The bytes to hide.
+        password (str): The password that keys the pixel order.
+        flags (int): ``FLAG_*`` values describing the payload.
+        depth (int): The number of low bits to use in each channel, 1 to 4.
+        alpha (bool): Also use the alpha channel of LA and RGBA images.
+
+    Returns:
+        int: The number of bits written, including the header.
+
+    Raises:
+        ValueError: If the payload does not fit in the image, or the mode,
+            depth or alpha setting is not supported.
+    """
+
+    return embed_slots(img, [(password, payload, flags)], depth, alpha)[0]
+
+# Write one container into a pixel array
+def _embed_container(pixels, mode, payload, password, flags, depth, alpha, slots, slot):
+    header_channels, payload_channels = channel_layout(mode, alpha)
+    if alpha:
+        flags |= FLAG_ALPHA
+    height, width = pixels.shape[:2]
+    positions = slot_permutation(password, width * height, slots, slot)
+
+    bits = bytes_to_bits(payload)
+    capacity = capacity_bits(len(positions), mode, depth, alpha)
+    if len(bits) > capacity:
+        raise ValueError(f"Payload needs {len(bits)} bits but the image only holds {capacity}")
+
+    start = header_pixels(mode)
+    needed = -(-len(bits) // (depth * len(payload_channels)))
+    with span('permutation'):
+        header_positions = positions[:start]
+        body_positions = positions[start:start + needed]
+    with span('embed'):
+        header_bits = bytes_to_bits(pack_header(len(payload), depth, flags, slots, slot))
+        embed_bits(pixels, header_bits, header_positions, 1, header_channels)
+        embed_bits(pixels, bits, body_positions, depth, payload_channels)
+    count('bits_written', HEADER_BITS + len(bits))
+    count('pixels_touched', start + needed)
+    return HEADER_BITS + len(bits)
+
+# Hide one payload per password inside an image, in disjoint slots
+def embed_slots(img, entries, depth=1, alpha=False):
+    """
+    Hide several payloads inside an image, one version 1 container per slot.
+
+    The image is decoded and written back once for all the payloads. Each
+    payload goes into its own slot of a ``SlotPermutation``, keyed by its
+    own password, so each password recovers its own payload only and reads
+    none of the others. A single entry is written in the keyed order of the
+    whole image, exactly as ``embed_payload`` does.
+
+    Args:
+        img (PIL.Image.Image): An image in one of the ``CARRIER_MODES``. Its
+            pixels are replaced in place.
+        entries (list): ``(password, payload, flags)`` for each slot, in slot
+            order. The passwords must differ.
+        depth (int): The number of low bits to use in each channel, 1 to 4.
+        alpha (bool): Also use the alpha channel of LA and RGBA images.
+
+    Returns:
+        list: The number of bits written in each slot, including the header.
+
+    Raises:
+        ValueError: If a payload does not fit in its slot, there are too many
+            entries or repeated passwords, or the mode, depth or alpha setting
+            is not supported.
+    """
+
+    if not 1 <= depth <= MAX_DEPTH:
+        raise ValueError(f"Bits per channel must be between 1 and {MAX_DEPTH}")
+    if not 1 <= len(entries) <= MAX_SLOTS:
+        raise ValueError(f"An image holds between 1 and {MAX_SLOTS} payloads")
+    if len({password for password, _, _ in entries}) != len(entries):
+        raise ValueError("Each payload of an image needs its own password")
+    channel_layout(img.mode, alpha)
+
+    with span('decode'):
+        pixels = np.array(img, dtype=np.uint8)
+    written = [
+        _embed_container(pixels, img.mode, payload, password, flags, depth, alpha, len(entries), slot)
+        for slot, (password, payload, flags) in enumerate(entries)
+    ]
+    with span('embed'):
+        # paste, unlike frombytes, copies an image Pillow mapped read-only from its file
+        img.paste(Image.fromarray(pixels, img.mode))
+    return written
+
+# Read the header of a container
+def read_header(pixels, positions, mode):
+    """
+    Read and validate the header at the start of a pixel order.
+
+    Args:
+        pixels (numpy.ndarray): The pixel array of an image.
+        positions: The pixel order the container was written in.
+        mode (str): The image mode, one of the ``CARRIER_MODES``.
+
+    Returns:
+        Header: The header, or None if there is no valid header or the payload
+        it announces does not fit in the image.
+    """
+
+    start = header_pixels(mode)
+    if len(positions) < start:
+        return None
+    header_channels = channel_layout(mode)[0]
+    with span('extract'):
+        bits = extract_bits(pixels, positions[:start], 1, header_channels)[:HEADER_BITS]
+    count('bits_read', HEADER_BITS)
+    count('pixels_touched', start)
+    header = parse_header(bits_to_bytes(bits))
+    if header is None:
+        return None
+    alpha = bool(header.flags & FLAG_ALPHA)
+    if alpha and CARRIER_MODES[mode][1] is None:
+        return None
+    if header.length * 8 > capacity_bits(len(positions), mode, header.bits_per_channel, alpha):
+        return None
+    return header
+
+# Read the payload of a container
+def read_container(pixels, positions, mode, header=None):
+    """
+    Read the header at the start of a pixel order and the payload it announces.
+
+    Args:
+        pixels (numpy.ndarray): The pixel array of an image.
+        positions: The pixel order the container was written in.
+        mode (str): The image mode, one of the ``CARRIER_MODES``.
+        header (Header): The header, if ``read_header`` already read it.
+
+    Returns:
+        tuple: The header flags and the payload, or None if there is no valid
+        header.
+    """
+
+    if header is None:
+        header = read_header(pixels, positions, mode)
+    if header is None:
+        return None
+    depth = header.bits_per_channel
+    payload_channels = channel_layout(mode, bool(header.flags & FLAG_ALPHA))[1]
+    bit_count = header.length * 8
+    start = header_pixels(mode)
+    with span('permutation'):
+        body = positions[start:start + -(-bit_count // (depth * len(payload_channels)))]
+    with span('extract'):
+        payload = bits_to_bytes(extract_bits(pixels, body, depth, payload_channels)[:bit_count])
+    count('bits_read', bit_count)
+    count('pixels_touched', len(body))
+    return header.flags, payload
+
+# Pixel orders a container can be written in
+def container_orders(password, width, height, shared=True):
+    """
+    Yield the pixel orders a version 1 container can be written in, for a
+    password: the keyed order of the whole image, the banded order of tiled
+    containers, then every slot of every slot count up to ``MAX_SLOTS``.
+
+    Args:
+        password (str): The password that keys the orders.
+        width (int): The image width in pixels.
+        height (int): The image height in pixels.
+        shared (bool): Include the slots of images shared by several
+            containers, which cost one Feistel evaluation per slot count.
+
+    Yields:
+        The pixel orders, each with the ``(slots, slot)`` layout a header
+        found in it must record, as a tuple.
+    """
+
+    yield make_permutation(password, width * height, KEYED), (1, 0)
+    yield TiledPermutation(password, width, height), (1, 0)
+    if not shared:
+        return
+    for slots in range(2, MAX_SLOTS + 1):
+        order = None
+        for slot in range(slots):
+            positions = SlotPermutation(password, width * height, slots, slot, order)
+            order = positions.order
+            yield positions, (slots, slot)
+
+# Find the header of a container for a password
+def find_header(pixels, mode, password, shared=True):
+    """
+    Find the header of a version 1 container in a pixel array.
+
+    A header only counts in the slot it records, which rules out headers of
+    one layout read by chance in another.
+
+    Args:
+        pixels (numpy.ndarray): The pixel array of an image in ``mode``.
+        mode (str): The image mode, one of the ``CARRIER_MODES``.
+        password (str): The password that keys the pixel orders.
+        shared (bool): Also look in the slots of shared images, see
+            ``container_orders``.
+
+    Returns:
+        tuple: The pixel order and the header, or None if the pixels hold no
+        container for this password.
+    """
+
+    height, width = pixels.shape[:2]
+    for positions, layout in container_orders(password, width, height, shared):
+        header = read_header(pixels, positions, mode)
+        if header is not None and (header.slots, header.slot) == layout:
+            return positions, header
+    return None
+
+# Recover a payload from the pixels of a container
+def find_payload(pixels, mode, password, reload=None):
+    """
+    Recover the payload of a version 1 container from a pixel array.
+
+    The pixel orders of ``container_orders`` are tried in turn. Only the
+    headers and the ``length`` payload bytes the found one announces are read.
+
+    Args:
+        pixels (numpy.ndarray): The pixel array of an image in ``mode``.
+        mode (str): The image mode, one of the ``CARRIER_MODES``.
+        password (str): The password that keys the pixel order.
+        reload (callable): For pixel arrays holding only the lowest bit of
+            each channel (see ``stego.cache``): called with the bits per
+            channel of a header that uses more, it returns pixels holding at
+            least that many low bits.
+
+    Returns:
+        tuple: The header flags and the payload, or None if the pixels hold no
+        container for this password.
+    """
+
+    found = find_header(pixels, mode, password)
+    if found is None:
+        return None
+    positions, header = found
+    if reload is not None and header.bits_per_channel > 1:
+        pixels = reload(header.bits_per_channel)
+    return read_container(pixels, positions, mode, header)
+
+# Recover a payload from a container
+def extract_payload(img, password):
+    """
+    Recover the payload of a version 1 container, see ``find_payload``.
+
+    Args:
+        img (PIL.Image.Image): An image, converted with ``to_carrier`` if needed.
+        password (str): The password that keys the pixel order.
+
+    Returns:
+        tuple: The header flags and the payload, or None if the image has no
+        container for this password.
+    """
+
+    img = to_carrier(img)
+    with span('decode'):
+        pixels = np.asarray(img, dtype=np.uint8)
+    return find_payload(pixels, img.mode, password)
+
+# Recover a payload written with the end marker from a pixel array
+def find_legacy_payload(pixels, mode, password, order):
+    """
+    Recover a payload written before containers had a header, from a pixel
+    array. Only the lowest bit of each channel is read.
+
+    Args:
+        pixels (numpy.ndarray): The pixel array of an image in ``mode``.
+        mode (str): The image mode, one of the ``CARRIER_MODES``.
+        password (str): The password that keys the pixel order.
+        order (str): The pixel order, ``'keyed'`` or ``'legacy'``.
+
+    Returns:
+        bytes: The bits before the end marker, or None if there is no marker.
+    """
+
+    height, width = pixels.shape[:2]
+    with span('permutation'):
+        positions = make_permutation(password, width * height, order)
+    with span('extract'):
+        bits = read_until_marker(pixels, positions, channel_layout(mode)[0])
+    if bits is None:
+        return None
+    count('bits_read', len(bits))
+    return bits_to_bytes(bits)
+
+# Recover a payload written with the end marker
+def extract_legacy_payload(img, password, order):
+    """
+    Recover a payload written before containers had a header.
+
+    Args:
+        img (PIL.Image.Image): An image, converted with ``to_carrier`` if needed.
+        password (str): The password that keys the pixel order.
+        order (str): The pixel order, ``'keyed'`` or ``'legacy'``.
+
+    Returns:
+        bytes: The bits before the end marker, or None if there is no marker.
+    """
+
+    img = to_carrier(img)
+    with span('decode'):
+        pixels = np.asarray(img, dtype=np.uint8)
+    return find_legacy_payload(pixels, img.mode, password, order)
+
+# Pick the pixel orders the end-marker format is scanned in
+def legacy_orders(pixel_count, legacy=None):
+    """
+    Pick the pixel orders in which to look for an end-marker payload.
+
+    The keyed order is read lazily and costs little; the legacy order costs
+    a full shuffle of the pixels.
+
+    Args:
+        pixel_count (int): The number of pixels of the image.
+        legacy (bool): True to scan both orders, False for neither, None to
+            scan the legacy order only up to ``LEGACY_SCAN_PIXELS`` pixels.
+
+    Returns:
+        tuple: The orders, possibly empty.
+    """
+
+    if legacy is None:
+        return ORDERS if pixel_count <= LEGACY_SCAN_PIXELS else (KEYED,)
+    return ORDERS if legacy else ()
+
+# Yield the candidate payloads of a pixel array, newest format first
+def iter_pixel_payloads(pixels, mode, password, reload=None, legacy=None):
+    """
+    Yield the payloads a pixel array may carry for a password, newest format
+    first. See ``iter_payloads``, and ``find_payload`` for ``reload``.
+
+    Args:
+        pixels (numpy.ndarray): The pixel array of an image in ``mode``.
+        mode (str): The image mode, one of the ``CARRIER_MODES``.
+        password (str): The password that keys the pixel order.
+        reload (callable): Returns pixels holding more low bits, if needed.
+        legacy (bool): Which end-marker scans to fall back to, see
+            ``legacy_orders``.
+
+    Yields:
+        tuple: The header flags and a candidate payload.
+    """
+
+    found = find_payload(pixels, mode, password, reload)
+    if found is not None:
+        yield found
+        return
+    for order in legacy_orders(pixels.shape[0] * pixels.shape[1], legacy):
+        payload = find_legacy_payload(pixels, mode, password, order)
+        if payload is not None:
+            yield 0, payload
+
+# Yield the candidate payloads of an image, newest format first
+def iter_payloads(img, password, legacy=None):
+    """
+    Yield the payloads an image may carry for a password, newest format first.
+
+    A valid version 1 header is authoritative and its payload is the only one
+    yielded. Otherwise the end-marker format is tried in the keyed and then
+    the legacy pixel order, as ``legacy`` allows. A marker can turn up by chance in random bits, so
+    the caller should keep going when a candidate fails to decrypt.
+
+    The image is decoded once for all the formats tried.
+
+    Args:
+        img (PIL.Image.Image): An image, converted with ``to_carrier`` if needed.
+        password (str): The password that keys the pixel order.
+        legacy (bool): Which end-marker scans to fall back to, see
+            ``legacy_orders``.
+
+    Yields:
+        tuple: The header flags and a candidate payload. End-marker payloads
+        have no header and always carry the base64 text of a token (flags 0).
+    """
+
+    img = to_carrier(img)
+    with span('decode'):
+        pixels = np.asarray(img, dtype=np.uint8)
+    yield from iter_pixel_payloads(pixels, img.mode, password, legacy=legacy)
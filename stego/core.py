@@ -0,0 +1,717 @@
+"""
+Hide and extract encrypted text, bytes and files, as library calls.
+
+These are the non-interactive counterparts of the functions in the scripts:
+they raise instead of printing, so callers such as the batch pipeline can
+report failures per item.
+
+Payloads are encrypted to a binary Fernet token (``FLAG_RAW``) that goes into
+the image as is, with no base64 or bit-string expansion. A hidden file is
+stored as a record of ``name length (2 bytes) | UTF-8 name | content``
+inside the encryption, and flagged with ``FLAG_FILE``.
+
+Before any pixel is decoded or anything is encrypted, hiding checks from the
+image header alone that the token will fit (see ``capacity``), so doomed jobs
+fail fast.
+
+The output image goes to a path or a file object, encoded with one of the
+presets of ``stego.output``.
+
+Grayscale and alpha images are kept in their own mode instead of being
+converted to RGB. ``depth`` (low bits per channel) and ``alpha`` (also use the
+alpha channel) trade invisibility for capacity; both are recorded in the
+container header, so extraction needs neither.
+
+The payload of a multi-frame image (multi-page TIFF, animated PNG or WebP)
+is spread over all its frames, and every frame is written to the output;
+see ``stego.frames``.
+
+``hide_for_recipients`` writes one message per password into a single image,
+each in its own slot of the pixels (see ``stego.container.embed_slots``).
+Every recipient extracts with the usual calls and their own password, and
+gets their own message only.
+
+``hide_stream`` and ``extract_stream`` move payloads too large for memory,
+from a file object or iterable to a file-like sink, chunk by chunk; see
+``stego.stream``. ``extract_bytes`` also reads streams, joining their chunks.
+
+Every hide and extract is timed stage by stage and counted as an operation of
+``stego.metrics``.
+"""
+
+import os
+import struct
+from collections import namedtuple
+
+import numpy as np
+from PIL import Image
+
+from stego.container import (
+    FLAG_CONTINUED, FLAG_FILE, FLAG_RAW, FLAG_STREAM, MAX_DEPTH, MAX_SLOTS, capacity_bits,
+    carrier_mode, embed_payload, embed_slots, find_header, iter_pixel_payloads, to_carrier,
+)
+from stego.crypto import (
+    decrypt_bytes, decrypt_chunks, decrypt_text, encrypt_bytes, encrypt_chunks,
+    max_plaintext_size, token_size,
+)
+from stego.frames import carrier_frames, embed_frames, frame_count, frame_rooms, read_frames
+from stego.metrics import count, operation, span
+from stego.output import check_output, save_image
+from stego.stream import (
+    STREAM_CHUNK_SIZE, embed_stream, read_chunks, read_stream, source_size, split_records,
+    stream_size,
+)
+from stego.tiled import (
+    PRESET_LEVELS, embed_payload_tiled, extract_payload_tiled, tiled_capacity_bits,
+)
+
+
+FILE_NAME_LENGTH = struct.Struct('>H')
+
+Capacity = namedtuple('Capacity', ['width', 'height', 'mode', 'payload_bytes', 'max_plaintext'])
+
+
+class StegoError(Exception):
+    """Base class for errors about the hidden payload itself."""
+
+
+class NoHiddenTextError(StegoError):
+    """The image carries no payload that can be found with the password."""
+
+
+class IncorrectPasswordError(StegoError):
+    """A payload was found but it does not decrypt with the password."""
+
+
+class PayloadTypeError(StegoError):
+    """The payload is a file where data was expected, or the other way round."""
+
+
+class CorruptPayloadError(StegoError):
+    """A stream turned out damaged or cut short after part of it was extracted."""
+
+
+class PayloadTooLargeError(ValueError):
+    """The encrypted payload does not fit in the image."""
+
+
+# Work out what an opened image can carry
+def _measure(img, depth, alpha, tiled, slots=1):
+    if not 1 <= depth <= MAX_DEPTH:
+        raise ValueError(f"Bits per channel must be between 1 and {MAX_DEPTH}")
+    if tiled and (depth != 1 or alpha):
+        raise ValueError("Tiled mode only supports 1 bit per RGB channel")
+    if not 1 <= slots <= MAX_SLOTS:
+        raise ValueError(f"An image holds between 1 and {MAX_SLOTS} payloads")
+    if tiled and slots != 1:
+        raise ValueError("Tiled mode only supports one payload per image")
+    width, height = img.size
+    if tiled:
+        mode = 'RGB'
+        payload_bytes = tiled_capacity_bits(width, height) // 8
+    elif slots == 1:
+        # Each frame carries a whole number of bytes of the payload
+        mode = carrier_mode(img)
+        payload_bytes = sum(frame_rooms(img, depth, alpha))
+    else:
+        mode = carrier_mode(img)
+        payload_bytes = capacity_bits(width * height // slots, mode, depth, alpha) // 8
+    return Capacity(width, height, mode, payload_bytes, max_plaintext_size(payload_bytes))
+
+# Raise if a plaintext will not fit
+def _check_fits(room, size):
+    _check_room(room, token_size(size))
+
+# Raise if an encrypted payload will not fit
+def _check_room(room, needed):
+    if needed > room.payload_bytes:
+        raise PayloadTooLargeError(
+            f"The encrypted payload needs {needed} bytes but the image only holds "
+            f"{room.payload_bytes} ({room.width}x{room.height} {room.mode})"
+        )
+
+# Report how much an image can carry
+def capacity(image_path, depth=1, alpha=False, tiled=False, slots=1):
+    """
+    Report how much an image can carry in an embedding mode.
+
+    Only the image header is read: no pixel is decoded. The room of a
+    multi-frame image is that of all its frames, each at its own size.
+
+    Args:
+        image_path (str): The path to the image.
+        depth (int): The number of low bits to use in each channel, 1 to 4.
+        alpha (bool): Also use the alpha channel of LA and RGBA images.
+        tiled (bool): Measure for the tiled mode of ``stego.tiled``.
+        slots (int): Measure one slot of an image shared by this many
+            recipients, see ``hide_for_recipients``.
+
+    Returns:
+        Capacity: The image size, the carrier mode, the room for the
+        encrypted payload in bytes, and the longest plaintext (text, bytes or
+        file record) that fits, None if nothing does.
+
+    Raises:
+        ValueError: If the depth, alpha or slots setting is not supported.
+    """
+
+    with Image.open(image_path) as img:
+        return _measure(img, depth, alpha, tiled, slots)
+
+# Check that a plaintext will fit in an image
+def check_fits(image_path, size, depth=1, alpha=False, tiled=False, slots=1):
+    """
+    Check from the image header alone that a plaintext will fit once encrypted.
+
+    Args:
+        image_path (str): The path to the image.
+        size (int): The plaintext length in bytes, see ``plaintext_size``.
+        depth (int): The number of low bits to use in each channel, 1 to 4.
+        alpha (bool): Also use the alpha channel of LA and RGBA images.
+        tiled (bool): Check for the tiled mode of ``stego.tiled``.
+        slots (int): Check for one slot of an image shared by this many
+            recipients.
+
+    Returns:
+        Capacity: What the image can carry, see ``capacity``.
+
+    Raises:
+        PayloadTooLargeError: If the encrypted plaintext does not fit.
+        ValueError: If the depth, alpha or slots setting is not supported.
+    """
+
+    room = capacity(image_path, depth, alpha, tiled, slots)
+    _check_fits(room, size)
+    return room
+
+# Compute the plaintext length of a message or file
+def plaintext_size(message=None, file_path=None):
+    """
+    Compute the length of what ``hide_text`` or ``hide_file`` encrypts.
+
+    Args:
+        message (str): A message to hide.
+        file_path (str): A file to hide, used when there is no message.
+
+    Returns:
+        int: The plaintext length in bytes.
+    """
+
+    if message is not None:
+        return len(message.encode())
+    name = os.path.basename(file_path).encode()
+    return FILE_NAME_LENGTH.size + len(name) + os.path.getsize(file_path)
+
+# Encrypt and hide a payload
+def _hide(image_path, plaintext, output_image_path, password, tiled, flags, depth, alpha,
+          preset):
+    with operation('hide'):
+        count('bytes_in', len(plaintext))
+        if tiled:
+            if preset is not None and preset not in PRESET_LEVELS:
+                raise ValueError(
+                    f"Tiled output is a TIFF file, use one of {', '.join(PRESET_LEVELS)}"
+                )
+            with span('open'):
+                check_fits(image_path, len(plaintext), depth, alpha, tiled)
+            with span('encrypt'):
+                payload = encrypt_bytes(plaintext, password)
+            return embed_payload_tiled(
+                image_path, payload, output_image_path, password,
+                PRESET_LEVELS[preset or 'default'], flags | FLAG_RAW
+            )
+
+        with span('open'):
+            img = Image.open(image_path)
+            room = _measure(img, depth, alpha, tiled)
+        _check_fits(room, len(plaintext))
+        multi_frame = frame_count(img) > 1
+        check_output(room.mode, output_image_path, preset, multi_frame)
+        with span('encrypt'):
+            payload = encrypt_bytes(plaintext, password)
+        flags |= FLAG_RAW
+        if multi_frame:
+            with span('convert'):
+                frames = carrier_frames(img)
+            written = embed_frames(frames, payload, password, flags, depth, alpha)
+            save_image(frames[0], output_image_path, preset, frames[1:])
+            return written
+        with span('convert'):
+            img = to_carrier(img)
+        written = embed_payload(img, payload, password, flags, depth, alpha)
+        save_image(img, output_image_path, preset)
+        return written
+
+# Decode an image to the pixel array payloads are read from
+def decode_pixels(image_path, cache=None):
+    """
+    Decode an image, or take its low bits from a decode cache.
+
+    Args:
+        image_path: The path to the image, or a binary file object.
+        cache (stego.cache.DecodeCache): The cache to use, or None.
+
+    Returns:
+        tuple: The pixel array, its mode, and the ``reload`` callable of
+        ``stego.container.find_payload`` (None without a cache).
+    """
+
+    if cache is not None:
+        pixels, mode = cache.load(image_path)
+        return pixels, mode, lambda depth: cache.load(image_path, depth)[0]
+    with span('open'):
+        img = Image.open(image_path)
+    with span('convert'):
+        img = to_carrier(img)
+    with span('decode'):
+        pixels = np.asarray(img, dtype=np.uint8)
+    return pixels, img.mode, None
+
+# Split a decrypted file record into the file name and content
+def split_file_record(record):
+    """
+    Split the plaintext of a hidden file into its name and content.
+
+    Args:
+        record (bytes): The decrypted record, see ``FLAG_FILE``.
+
+    Returns:
+        tuple: The file name and the file content.
+    """
+
+    (name_length,) = FILE_NAME_LENGTH.unpack_from(record)
+    start = FILE_NAME_LENGTH.size
+    name = record[start:start + name_length].decode()
+    return name, record[start + name_length:]
+
+# Decrypt a payload read in one piece
+def decrypt_payload(flags, payload, password):
+    """
+    Decrypt a payload read from an image, in whichever format its flags give.
+
+    Args:
+        flags (int): The header flags of the payload, 0 for end-marker payloads.
+        payload (bytes): The payload, all its frames joined.
+        password (str): The password to decrypt with.
+
+    Returns:
+        bytes: The plaintext.
+
+    Raises:
+        Exception: If the payload does not decrypt with the password; the
+            error depends on the format.
+    """
+
+    if flags & FLAG_STREAM:
+        return b''.join(decrypt_chunks(split_records(payload), password))
+    if flags & FLAG_RAW:
+        return decrypt_bytes(payload, password)
+    return decrypt_text(payload.decode('latin-1'), password).encode()
+
+# Decrypt the first of the candidate payloads that decrypts
+def _first_decrypted(image_path, password, candidates):
+    found = False
+    for flags, payload in candidates:
+        found = True
+        if flags & FLAG_CONTINUED:
+            joined = read_frames(image_path, password, flags, payload)
+            if joined is None:
+                continue
+            flags, payload = joined
+        count('bytes_in', len(payload))
+        try:
+            with span('decrypt'):
+                plaintext = decrypt_payload(flags, payload, password)
+        except Exception:
+            continue
+        count('bytes_out', len(plaintext))
+        return flags, plaintext
+    if found:
+        raise IncorrectPasswordError("Incorrect password! Cannot decrypt.")
+    raise NoHiddenTextError("No hidden text found.")
+
+# Find and decrypt a payload
+def _recover(image_path, password, tiled, cache, legacy):
+    with operation('extract'):
+        if tiled:
+            found = extract_payload_tiled(image_path, password)
+            candidates = [] if found is None else [found]
+        else:
+            pixels, mode, reload = decode_pixels(image_path, cache)
+            candidates = iter_pixel_payloads(pixels, mode, password, reload, legacy)
+        return _first_decrypted(image_path, password, candidates)
+
+# Hide encrypted bytes inside an image
+def hide_bytes(image_path, data, output_image_path, password, tiled=False, depth=1,
+               alpha=False, preset=None):
+    """
+    Encrypt bytes and hide them inside an image.
+
+    Args:
+        image_path (str): The path to the image to hide the data in.
+        data (bytes): The bytes to hide.
+        output_image_path: The path, or writable binary file object, to save the
+            image with hidden data to.
+        password (str): The password used to encrypt the data.
+        tiled (bool): Process the image band by band with bounded memory (see
+            ``stego.tiled``). The output must then be a TIFF file.
+        depth (int): The number of low bits to use in each channel, 1 to 4.
+        alpha (bool): Also use the alpha channel of LA and RGBA images.
+        preset (str): The output preset, see ``stego.output``. By default it
+            is picked from the extension of the output path.
+
+    Returns:
+        int: The number of bits written into the image.
+
+    Raises:
+        PayloadTooLargeError: If the encrypted data does not fit in the image.
+        ValueError: If the depth, alpha or preset setting is not supported.
+    """
+
+    return _hide(
+        image_path, bytes(data), output_image_path, password, tiled, 0, depth, alpha, preset
+    )
+
+# Extract encrypted bytes from an image
+def extract_bytes(image_path, password, tiled=False, cache=None, legacy=None):
+    """
+    Extract and decrypt the bytes hidden inside an image.
+
+    Text hidden by ``hide_text`` comes back as its UTF-8 encoding.
+
+    Args:
+        image_path (str): The path to the image to extract data from.
+        password (str): The password used to hide the data.
+        tiled (bool): Only look for a tiled container, decoding just the bands
+            it lies in. Without it, tiled containers are still found, but the
+            whole image is decoded.
+        cache (stego.cache.DecodeCache): Take the decoded low bits of the image
+            from this cache, and keep them there for the next extraction.
+            The tiled mode reads only a few bands and does not use it.
+        legacy (bool): Scan for payloads written before containers had a
+            header when no header is found: True in both pixel orders, False
+            not at all. By default the slow legacy order is only scanned in
+            small images (see ``stego.container.legacy_orders``).
+
+    Returns:
+        bytes: The decrypted data.
+
+    Raises:
+        NoHiddenTextError: If no payload is found for the password.
+        IncorrectPasswordError: If the payload does not decrypt.
+        PayloadTypeError: If the payload is a file, see ``extract_file``.
+    """
+
+    flags, plaintext = _recover(image_path, password, tiled, cache, legacy)
+    if flags & FLAG_FILE:
+        raise PayloadTypeError("The image carries a file, use extract_file")
+    return plaintext
+
+# Hide encrypted text inside an image
+def hide_text(image_path, text, output_image_path, password, tiled=False, depth=1,
+              alpha=False, preset=None):
+    """
+    Encrypt text and hide it inside an image.
+
+    Args:
+        image_path (str): The path to the image to hide the text in.
+        text (str): The plaintext string to hide in the image.
+        output_image_path: The path, or writable binary file object, to save the
+            image with hidden text to.
+        password (str): The password used to encrypt the text.
+        tiled (bool): Process the image band by band with bounded memory (see
+            ``stego.tiled``). The output must then be a TIFF file.
+        depth (int): The number of low bits to use in each channel, 1 to 4.
+        alpha (bool): Also use the alpha channel of LA and RGBA images.
+        preset (str): The output preset, see ``stego.output``. By default it
+            is picked from the extension of the output path.
+
+    Returns:
+        int: The number of bits written into the image.
+
+    Raises:
+        PayloadTooLargeError: If the encrypted text does not fit in the image.
+        ValueError: If the depth, alpha or preset setting is not supported.
+    """
+
+    return hide_bytes(
+        image_path, text.encode(), output_image_path, password, tiled, depth, alpha, preset
+    )
+
+# Extract encrypted text from an image
+def extract_text(image_path, password, tiled=False, cache=None, legacy=None):
+    """
+    Extract and decrypt the text hidden inside an image.
+
+    Args:
+        image_path (str): The path to the image to extract text from.
+        password (str): The password used to hide the text.
+        tiled (bool): Only look for a tiled container, decoding just the bands
+            it lies in. Without it, tiled containers are still found, but the
+            whole image is decoded.
+        cache (stego.cache.DecodeCache): Take the decoded low bits of the image
+            from this cache, and keep them there for the next extraction.
+            The tiled mode reads only a few bands and does not use it.
+        legacy (bool): Scan for payloads written before containers had a
+            header, see ``extract_bytes``.
+
+    Returns:
+        str: The decrypted plaintext string.
+
+    Raises:
+        NoHiddenTextError: If no payload is found for the password.
+        IncorrectPasswordError: If the payload does not decrypt.
+        PayloadTypeError: If the payload is a file, see ``extract_file``.
+    """
+
+    return extract_bytes(image_path, password, tiled, cache, legacy).decode()
+
+# Hide an encrypted file inside an image
+def hide_file(image_path, file_path, output_image_path, password, tiled=False, depth=1,
+              alpha=False, preset=None):
+    """
+    Encrypt a file, with its name, and hide it inside an image.
+
+    Args:
+        image_path (str): The path to the image to hide the file in.
+        file_path (str): The path to the file to hide.
+        output_image_path: The path, or writable binary file object, to save the
+            image with the hidden file to.
+        password (str): The password used to encrypt the file.
+        tiled (bool): Process the image band by band with bounded memory (see
+            ``stego.tiled``). The output must then be a TIFF file.
+        depth (int): The number of low bits to use in each channel, 1 to 4.
+        alpha (bool): Also use the alpha channel of LA and RGBA images.
+        preset (str): The output preset, see ``stego.output``. By default it
+            is picked from the extension of the output path.
+
+    Returns:
+        int: The number of bits written into the image.
+
+    Raises:
+        PayloadTooLargeError: If the encrypted file does not fit in the image.
+        ValueError: If the depth, alpha or preset setting is not supported.
+    """
+
+    name = os.path.basename(file_path).encode()
+    with open(file_path, 'rb') as hidden:
+        record = FILE_NAME_LENGTH.pack(len(name)) + name + hidden.read()
+    return _hide(
+        image_path, record, output_image_path, password, tiled, FLAG_FILE, depth, alpha, preset
+    )
+
+# Hide one encrypted message per recipient inside an image
+def hide_for_recipients(image_path, recipients, output_image_path, depth=1, alpha=False,
+                        preset=None):
+    """
+    Encrypt one message per recipient and hide them all inside one image.
+
+    The image is decoded, written and encoded once. Each message is
+    encrypted with its recipient's password and goes into its own slot of
+    the pixels, so the image holds ``len(recipients)`` disjoint containers.
+    A recipient gets their message back with ``extract_text`` (or
+    ``extract_bytes``) and their password, and cannot read the others.
+
+    Args:
+        image_path (str): The path to the image to hide the messages in.
+        recipients: A mapping of passwords to messages, or a sequence of
+            ``(password, message)`` pairs, with at most ``MAX_SLOTS``
+            distinct passwords. A message is text or bytes.
+        output_image_path: The path, or writable binary file object, to save the
+            image with the hidden messages to.
+        depth (int): The number of low bits to use in each channel, 1 to 4.
+        alpha (bool): Also use the alpha channel of LA and RGBA images.
+        preset (str): The output preset, see ``stego.output``. By default it
+            is picked from the extension of the output path.
+
+    Returns:
+        list: The number of bits written for each recipient, in order.
+
+    Raises:
+        PayloadTooLargeError: If an encrypted message does not fit in its
+            slot, see ``capacity`` with ``slots``.
+        ValueError: If the depth, alpha or preset setting is not supported,
+            or there are too many recipients or repeated passwords.
+    """
+
+    if hasattr(recipients, 'items'):
+        recipients = recipients.items()
+    recipients = [(password, message.encode() if isinstance(message, str) else bytes(message))
+                  for password, message in recipients]
+    with operation('hide'):
+        count('bytes_in', sum(len(plaintext) for _, plaintext in recipients))
+        with span('open'):
+            img = Image.open(image_path)
+            room = _measure(img, depth, alpha, False, len(recipients))
+        for _, plaintext in recipients:
+            _check_fits(room, len(plaintext))
+        check_output(room.mode, output_image_path, preset)
+        with span('encrypt'):
+            entries = [(password, encrypt_bytes(plaintext, password), FLAG_RAW)
+                       for password, plaintext in recipients]
+        with span('convert'):
+            img = to_carrier(img)
+        written = embed_slots(img, entries, depth, alpha)
+        save_image(img, output_image_path, preset)
+        return written
+
+# Extract an encrypted file from an image
+def extract_file(image_path, password, tiled=False, cache=None, legacy=None):
+    """
+    Extract and decrypt a file hidden inside an image.
+
+    Args:
+        image_path (str): The path to the image to extract the file from.
+        password (str): The password used to hide the file.
+        tiled (bool): Only look for a tiled container, decoding just the bands
+            it lies in.
+        cache (stego.cache.DecodeCache): Take the decoded low bits of the image
+            from this cache, and keep them there for the next extraction.
+            The tiled mode reads only a few bands and does not use it.
+        legacy (bool): Scan for payloads written before containers had a
+            header, see ``extract_bytes``.
+
+    Returns:
+        tuple: The file name (str) and content (bytes). The name is the base
+        name the file was hidden under; sanitise it before writing to disk.
+
+    Raises:
+        NoHiddenTextError: If no payload is found for the password.
+        IncorrectPasswordError: If the payload does not decrypt.
+        PayloadTypeError: If the payload is not a file, see ``extract_bytes``.
+    """
+
+    flags, record = _recover(image_path, password, tiled, cache, legacy)
+    if not flags & FLAG_FILE:
+        raise PayloadTypeError("The image does not carry a file, use extract_bytes")
+    return split_file_record(record)
+
+# Hide a payload of any size, chunk by chunk
+def hide_stream(image_path, source, output_image_path, password, depth=1, alpha=False,
+                preset=None, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Encrypt a payload chunk by chunk and hide it inside an image as it is read.
+
+    Memory stays bounded by the chunk size on top of the image, whatever the
+    payload size; see ``stego.stream``. When the source's size can be known
+    upfront (bytes, regular files), the fit is checked before any pixel is
+    decoded; otherwise hiding stops when the image is full, and nothing is
+    written.
+
+    Args:
+        image_path (str): The path to a single-frame image to hide the data in.
+        source: The bytes to hide, as bytes, a binary file object read from
+            its current position, or an iterable of bytes.
+        output_image_path: The path, or writable binary file object, to save the
+            image with hidden data to.
+        password (str): The password used to encrypt the data.
+        depth (int): The number of low bits to use in each channel, 1 to 4.
+        alpha (bool): Also use the alpha channel of LA and RGBA images.
+        preset (str): The output preset, see ``stego.output``. By default it
+            is picked from the extension of the output path.
+        chunk_size (int): The plaintext bytes encrypted per chunk.
+
+    Returns:
+        int: The number of bits written into the image.
+
+    Raises:
+        PayloadTooLargeError: If the encrypted stream does not fit in the image.
+        ValueError: If the image has several frames, or the depth, alpha or
+            preset setting is not supported.
+    """
+
+    with operation('hide'):
+        with span('open'):
+            img = Image.open(image_path)
+            room = _measure(img, depth, alpha, False)
+        if frame_count(img) > 1:
+            raise ValueError("Streams are hidden in single-frame images")
+        size = source_size(source)
+        if size is not None:
+            _check_room(room, stream_size(size, chunk_size))
+        check_output(room.mode, output_image_path, preset)
+        with span('convert'):
+            img = to_carrier(img)
+
+        # Count the plaintext as it goes by, without holding on to it
+        def counted(chunks):
+            for chunk in chunks:
+                count('bytes_in', len(chunk))
+                yield chunk
+
+        tokens = encrypt_chunks(counted(read_chunks(source, chunk_size)), password)
+        try:
+            written = embed_stream(img, tokens, password, depth, alpha)
+        except OverflowError as error:
+            raise PayloadTooLargeError(
+                f"{error} ({room.width}x{room.height} {room.mode})"
+            ) from error
+        save_image(img, output_image_path, preset)
+        return written
+
+# Extract a payload of any size to a sink, chunk by chunk
+def extract_stream(image_path, password, sink, cache=None, legacy=None):
+    """
+    Extract and decrypt the data hidden inside an image into a sink.
+
+    A stream written by ``hide_stream`` is read, checked and written to the
+    sink one chunk at a time. Any other payload is extracted as by
+    ``extract_bytes`` and written in one piece.
+
+    Args:
+        image_path (str): The path to the image to extract data from.
+        password (str): The password used to hide the data.
+        sink: A file-like object the plaintext is written to, with ``write``.
+        cache (stego.cache.DecodeCache): Take the decoded low bits of the image
+            from this cache, and keep them there for the next extraction.
+        legacy (bool): Scan for payloads written before containers had a
+            header, see ``extract_bytes``.
+
+    Returns:
+        int: The number of plaintext bytes written to the sink.
+
+    Raises:
+        NoHiddenTextError: If no payload is found for the password.
+        IncorrectPasswordError: If the payload does not decrypt.
+        CorruptPayloadError: If a stream breaks off after some of it was
+            written to the sink.
+        PayloadTypeError: If the payload is a file, see ``extract_file``.
+    """
+
+    with operation('extract'):
+        pixels, mode, reload = decode_pixels(image_path, cache)
+        found = find_header(pixels, mode, password)
+        if found is None or not found[1].flags & FLAG_STREAM:
+            flags, plaintext = _first_decrypted(
+                image_path, password,
+                iter_pixel_payloads(pixels, mode, password, reload, legacy),
+            )
+            if flags & FLAG_FILE:
+                raise PayloadTypeError("The image carries a file, use extract_file")
+            sink.write(plaintext)
+            return len(plaintext)
+
+        positions, header = found
+        if reload is not None and header.bits_per_channel > 1:
+            pixels = reload(header.bits_per_channel)
+        count('bytes_in', header.length)
+        chunks = decrypt_chunks(read_stream(pixels, positions, mode, header), password)
+        written = read = 0
+        with span('stream'):
+            while True:
+                try:
+                    chunk = next(chunks, None)
+                except Exception as error:
+                    if not read:
+                        raise IncorrectPasswordError("Incorrect password! Cannot decrypt.")
+                    raise CorruptPayloadError(
+                        f"The hidden stream is damaged after {written} bytes"
+                    ) from error
+                if chunk is None:
+                    break
+                sink.write(chunk)
+                written += len(chunk)
+                read += 1
+        count('chunks', read)
+        count('bytes_out', written)
+        return written
@@ -0,0 +1,379 @@
+"""
+Password-based encryption of the hidden text.
+
+The text is encrypted with Fernet (AES-128-CBC with an HMAC-SHA256 tag),
+keyed by the SHA-256 digest of the password.
+
+Deriving the key and building the ``Fernet`` object is done once per
+password: the ciphers are kept in a bounded, thread-safe LRU cache. Each
+cached cipher holds its key, the unsalted SHA-256 of the password, which the
+image format fixes. Anyone who can read the process memory can check
+password guesses against it, for up to ``KEY_CACHE_SIZE`` recent passwords
+and until they are evicted or dropped with ``invalidate`` (Python does not
+wipe the freed memory). The cache is indexed by a keyed BLAKE2b digest of the
+password under a random per-process secret, so its keys add no further
+digest or plaintext password to that.
+
+Payloads too large to hold in memory are encrypted as a stream of chunks
+(``encrypt_chunks``), one token each. Every chunk starts with a record of
+``stream id (8 bytes) | chunk index (4 bytes) | last chunk (1 byte)`` inside
+the encryption, so chunks cannot be reordered, dropped, cut off at the end
+or mixed with the chunks of another stream without ``decrypt_chunks``
+noticing.
+
+``cryptography`` is imported on the first encryption or decryption, so
+importing this module, or sizing tokens with ``token_size``, stays cheap.
+"""
+
+import base64
+import hashlib
+import os
+import struct
+import threading
+from collections import OrderedDict
+
+
+KEY_CACHE_SIZE = 128
+
+# Fernet token layout: version (1) | timestamp (8) | IV (16) | ciphertext | HMAC (32)
+TOKEN_OVERHEAD = 1 + 8 + 16 + 32
+BLOCK_SIZE = 16
+TOKEN_VERSION = 0x80
+
+CHUNK_RECORD = struct.Struct('>8sIB')
+
+
+class KeyCache:
+    """
+    A bounded, thread-safe LRU cache of Fernet ciphers by password.
+
+    A cipher keeps its key, the SHA-256 digest of the password, in memory as
+    long as it is cached; see the module documentation. Call ``invalidate``
+    to drop the ciphers of passwords no longer in use.
+
+    Args:
+        maxsize (int): The number of passwords to keep ciphers for.
+    """
+
+    def __init__(self, maxsize=KEY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._ciphers = OrderedDict()
+        self._lock = threading.Lock()
+        self._secret = os.urandom(32)
+
+    def _cache_key(self, password):
+        return hashlib.blake2b(password.encode(), key=self._secret).digest()
+
+    def get(self, password):
+        """
+        Return the cipher for a password, deriving it on a cache miss.
+
+        Args:
+            password (str): The password.
+
+        Returns:
+            cryptography.fernet.Fernet: The cipher.
+        """
+
+        cache_key = self._cache_key(password)
+        with self._lock:
+            cipher = self._ciphers.get(cache_key)
+            if cipher is not None:
+                self._ciphers.move_to_end(cache_key)
+                self.hits += 1
+                return cipher
+            self.misses += 1
+
+        # Derive outside the lock so a slow derivation does not block hits
+        from cryptography.fernet import Fernet
+        cipher = Fernet(generate_key(password))
+        with self._lock:
+            self._ciphers[cache_key] = cipher
+            self._ciphers.move_to_end(cache_key)
+            while len(self._ciphers) > self.maxsize:
+                self._ciphers.popitem(last=False)
+        return cipher
+
+    def invalidate(self, password=None):
+        """
+        Drop the cipher of one password, or of every password.
+
+        Args:
+            password (str): The password to forget, or None to clear the cache.
+        """
+
+        with self._lock:
+            if password is None:
+                self._ciphers.clear()
+            else:
+                self._ciphers.pop(self._cache_key(password), None)
+
+    def stats(self):
+        """
+        Report the cache counters.
+
+        Returns:
+            dict: ``hits``, ``misses``, current ``size`` and ``maxsize``.
+        """
+
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._ciphers),
+                'maxsize': self.maxsize,
+            }
+
+
+key_cache = KeyCache()
+
+
+# Generate encryption key from password
+def generate_key(password):
+    """
+    Generate a key from a password.
+
+    This function takes a string password, hashes it with SHA-256, and then
+    encodes the hash with url-safe base64 encoding to produce a key that can be
+    used with the Fernet symmetric encryption algorithm.
+
+    Args:
+        password (str): The password to generate the key from.
+
+    Returns:
+        bytes: The generated key, as a url-safe base64 encoded string.
+    """
+
+    key = hashlib.sha256(password.encode()).digest()
+    return base64.urlsafe_b64encode(key)
+
+# Encrypt text using AES
+def encrypt_text(text, password):
+    """
+    Encrypt a given text using a password.
+
+    This function takes a plaintext string and a password, looks up the cipher
+    for the password in ``key_cache`` (deriving it on first use), and uses it
+    to encrypt the text with the Fernet symmetric encryption algorithm. The
+    encrypted text is returned as a base64-encoded string.
+
+    Args:
+        text (str): The plaintext string to encrypt.
+        password (str): The password used to generate the encryption key.
+
+    Returns:
+        str: The encrypted text as a base64-encoded string.
+    """
+    cipher = key_cache.get(password)
+    return cipher.encrypt(text.encode()).decode()
+
+# Decrypt text using AES
+def decrypt_text(encrypted_text, password):
+    """
+    Decrypt an encrypted text using a password.
+
+    This function takes an encrypted text string and a password, looks up the
+    cipher for the password in ``key_cache`` (deriving it on first use), and
+    uses it to decrypt the text with the Fernet symmetric encryption algorithm.
+    The decrypted text is returned as a plaintext string.
+
+    Args:
+        encrypted_text (str): The encrypted text to decrypt.
+        password (str): The password used to generate the decryption key.
+
+    Returns:
+        str: The decrypted plaintext string.
+    """
+
+    cipher = key_cache.get(password)
+    return cipher.decrypt(encrypted_text.encode()).decode()
+
+# Encrypt bytes to a raw Fernet token
+def encrypt_bytes(data, password):
+    """
+    Encrypt bytes using a password, returning the raw binary token.
+
+    The Fernet token is normally handled as url-safe base64 text. Hidden
+    payloads carry the decoded binary token instead, which is 25% smaller.
+
+    Args:
+        data (bytes): The plaintext bytes to encrypt.
+        password (str): The password used to generate the encryption key.
+
+    Returns:
+        bytes: The binary Fernet token.
+    """
+
+    cipher = key_cache.get(password)
+    return base64.urlsafe_b64decode(cipher.encrypt(data))
+
+# Decrypt a raw Fernet token to bytes
+def decrypt_bytes(token, password):
+    """
+    Decrypt a raw binary token produced by ``encrypt_bytes``.
+
+    Args:
+        token (bytes): The binary Fernet token.
+        password (str): The password used to generate the decryption key.
+
+    Returns:
+        bytes: The decrypted plaintext bytes.
+
+    Raises:
+        cryptography.fernet.InvalidToken: If the token does not decrypt with
+            the password.
+    """
+
+    cipher = key_cache.get(password)
+    return cipher.decrypt(base64.urlsafe_b64encode(token))
+
+# Compute the size of a raw Fernet token
+def token_size(length):
+    """
+    Compute the exact size of the raw token ``encrypt_bytes`` produces.
+
+    The ciphertext is the plaintext padded with PKCS7 to a whole number of
+    AES blocks, so there is always at least one byte of padding.
+
+    Args:
+        length (int): The plaintext length in bytes.
+
+    Returns:
+        int: The token length in bytes.
+    """
+
+    return TOKEN_OVERHEAD + BLOCK_SIZE * (length // BLOCK_SIZE + 1)
+
+# Compute the longest plaintext whose token fits in a number of bytes
+def max_plaintext_size(token_bytes):
+    """
+    Compute the longest plaintext whose raw token fits in ``token_bytes``.
+
+    Args:
+        token_bytes (int): The space available for the token, in bytes.
+
+    Returns:
+        int: The plaintext length in bytes, or None if not even an empty
+        plaintext fits.
+    """
+
+    blocks = (token_bytes - TOKEN_OVERHEAD) // BLOCK_SIZE
+    if blocks < 1:
+        return None
+    return blocks * BLOCK_SIZE - 1
+
+# Check that bytes are shaped like a Fernet token, without the key
+def looks_like_token(token, raw=True):
+    """
+    Check that bytes are shaped like a Fernet token, before decrypting.
+
+    Only the version byte and the length are checked: no key is derived and
+    no HMAC is computed. Random bits pass with a chance of about 1 in 2**12
+    (raw) or far less (text), so this rejects most payloads a wrong password
+    reads, at no cost.
+
+    Args:
+        token (bytes): A raw token, or the url-safe base64 text of one.
+        raw (bool): Whether the token is raw bytes rather than base64 text.
+
+    Returns:
+        bool: False if the bytes cannot be a token, True if they may be.
+    """
+
+    if not raw:
+        if len(token) % 4 or not token.startswith(b'g'):
+            return False
+        try:
+            token = base64.urlsafe_b64decode(token)
+        except ValueError:
+            return False
+    size = len(token) - TOKEN_OVERHEAD
+    return token[:1] == bytes([TOKEN_VERSION]) and size >= BLOCK_SIZE and size % BLOCK_SIZE == 0
+
+# Encrypt a stream of chunks, one raw token each
+def encrypt_chunks(chunks, password):
+    """
+    Encrypt an iterable of plaintext chunks into a stream of raw tokens.
+
+    Each chunk is encrypted on its own, behind a record binding it to a
+    random stream id and its position, so the memory used does not depend
+    on the length of the stream. Empty chunks are skipped; an empty stream
+    still produces one token, marked last.
+
+    Args:
+        chunks: An iterable of plaintext bytes.
+        password (str): The password used to generate the encryption key.
+
+    Yields:
+        bytes: The binary Fernet token of each chunk, in order.
+    """
+
+    cipher = key_cache.get(password)
+    stream_id = os.urandom(CHUNK_RECORD.size - 5)
+    chunks = (bytes(chunk) for chunk in chunks if chunk)
+    index = 0
+    pending = next(chunks, b'')
+    # Hold one chunk back: whether it is the last is known once the next arrives
+    for chunk in chunks:
+        record = CHUNK_RECORD.pack(stream_id, index, 0)
+        yield base64.urlsafe_b64decode(cipher.encrypt(record + pending))
+        index += 1
+        pending = chunk
+    record = CHUNK_RECORD.pack(stream_id, index, 1)
+    yield base64.urlsafe_b64decode(cipher.encrypt(record + pending))
+
+# Decrypt a stream of raw tokens produced by encrypt_chunks
+def decrypt_chunks(tokens, password):
+    """
+    Decrypt a stream of raw tokens produced by ``encrypt_chunks``.
+
+    Chunks are yielded as soon as they are checked, so a consumer may have
+    written part of the plaintext before a later chunk turns out to be bad.
+
+    Args:
+        tokens: An iterable of binary Fernet tokens.
+        password (str): The password used to generate the decryption key.
+
+    Yields:
+        bytes: The plaintext of each chunk, in order.
+
+    Raises:
+        cryptography.fernet.InvalidToken: If a token does not decrypt with
+            the password, is out of place or from another stream, or the
+            stream ends before its last chunk.
+    """
+
+    from cryptography.fernet import InvalidToken
+
+    cipher = key_cache.get(password)
+    stream_id = None
+    index = 0
+    for token in tokens:
+        plaintext = cipher.decrypt(base64.urlsafe_b64encode(token))
+        if len(plaintext) < CHUNK_RECORD.size:
+            raise InvalidToken
+        chunk_stream, chunk_index, last = CHUNK_RECORD.unpack_from(plaintext)
+        if chunk_index != index or (stream_id is not None and chunk_stream != stream_id):
+            raise InvalidToken
+        stream_id = chunk_stream
+        yield plaintext[CHUNK_RECORD.size:]
+        if last:
+            return
+        index += 1
+    raise InvalidToken
+
+# Compute the size of the token of one chunk
+def chunk_token_size(length):
+    """
+    Compute the exact size of the raw token of a chunk of ``encrypt_chunks``.
+
+    Args:
+        length (int): The chunk plaintext length in bytes.
+
+    Returns:
+        int: The token length in bytes.
+    """
+
+    return token_size(CHUNK_RECORD.size + length)
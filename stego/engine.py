@@ -0,0 +1,270 @@
+"""
+Vectorized LSB embedding and extraction engine.
+
+The image is handled as a flat ``uint8`` array of channel values and the
+payload as a ``uint8`` array of bits, so embedding and extraction are bulk
+masking and fancy-indexing operations instead of a per-pixel Python loop.
+
+Bit ``k`` of a stream goes into channel ``k % 3`` of the ``k // 3``-th pixel
+of a pixel order (see ``stego.permutation``); with several bits per channel
+or a different set of channels, each channel slot takes the next group of
+bits. How the stream is framed is up to ``stego.container``.
+"""
+
+import numpy as np
+
+from stego.parallel import CHUNK_SIZE, map_chunks
+
+
+END_MARKER = '1111111111111110'
+END_MARKER_BYTES = b'\xff\xfe'
+CHANNELS = 3
+
+# Pixels read by the first extraction chunk, and the cap chunks double up to
+FIRST_CHUNK_PIXELS = 1024
+MAX_CHUNK_PIXELS = 1 << 20
+
+
+# Convert bytes to an array of bits
+def bytes_to_bits(data):
+    """
+    Convert bytes to an array of bits, most significant bit first.
+
+    Args:
+        data (bytes): The bytes to convert.
+
+    Returns:
+        numpy.ndarray: A ``uint8`` array holding one bit per element.
+    """
+
+    return np.unpackbits(np.frombuffer(data, dtype=np.uint8))
+
+# Convert an array of bits to bytes
+def bits_to_bytes(bits):
+    """
+    Convert an array of bits back to bytes.
+
+    Whole groups of 8 bits become one byte each. A trailing partial group is
+    read as a plain binary number, the same way ``bin_to_text`` treats it.
+
+    Args:
+        bits (numpy.ndarray): A ``uint8`` array holding one bit per element.
+
+    Returns:
+        bytes: The decoded bytes.
+    """
+
+    whole = len(bits) - len(bits) % 8
+    data = np.packbits(bits[:whole]).tobytes()
+    if whole < len(bits):
+        data += bytes([int(''.join(str(bit) for bit in bits[whole:]), 2)])
+    return data
+
+# Map a run of channel slots to flat channel indices
+def channel_indices(positions, count, channels=CHANNELS, used=None):
+    """
+    Compute the flat channel index of each of the first ``count`` channel slots.
+
+    With ``u`` used channels, slot ``k`` is channel ``used[k % u]`` of pixel
+    ``positions[k // u]``. With the defaults, bit ``k`` goes into channel
+    ``k % 3`` of pixel ``positions[k // 3]``.
+
+    Args:
+        positions: Flat pixel indices in embedding order, as an array or a
+            ``stego.permutation`` order.
+        count (int): The number of slots to place.
+        channels (int): The number of channels per pixel in the array.
+        used (tuple): The channels that carry data, by default all of them.
+
+    Returns:
+        numpy.ndarray: Indices into the flattened pixel array.
+    """
+
+    used = np.arange(channels) if used is None else np.asarray(used)
+    pixels_needed = -(-count // len(used))
+    indices = np.asarray(positions[:pixels_needed])[:, None] * channels + used
+    return indices.reshape(-1)[:count]
+
+# Channel count of a pixel array and the channels that carry data
+def _layout(pixels, used):
+    channels = pixels.shape[2] if pixels.ndim == 3 else 1
+    return channels, tuple(range(channels)) if used is None else tuple(used)
+
+# Group bits into values of depth bits each
+def bits_to_values(bits, depth):
+    """
+    Group bits into ``depth``-bit values, most significant bit first.
+
+    The last group is padded with zero bits.
+
+    Args:
+        bits (numpy.ndarray): A ``uint8`` array holding one bit per element.
+        depth (int): The number of bits per value.
+
+    Returns:
+        numpy.ndarray: One ``uint8`` value per group.
+    """
+
+    if depth == 1:
+        return bits
+    groups = np.zeros((-(-len(bits) // depth), depth), dtype=np.uint8)
+    groups.reshape(-1)[:len(bits)] = bits
+    return (groups << np.arange(depth - 1, -1, -1, dtype=np.uint8)).sum(axis=1, dtype=np.uint8)
+
+# Split values of depth bits each into bits
+def values_to_bits(values, depth):
+    """
+    Split ``depth``-bit values into bits, most significant bit first.
+
+    Args:
+        values (numpy.ndarray): ``uint8`` values.
+        depth (int): The number of bits per value.
+
+    Returns:
+        numpy.ndarray: A ``uint8`` array holding one bit per element.
+    """
+
+    if depth == 1:
+        return values
+    shifts = np.arange(depth - 1, -1, -1, dtype=np.uint8)
+    return ((values[:, None] >> shifts) & 1).reshape(-1)
+
+# Write bits into the least significant bits of the pixels
+def embed_bits(pixels, bits, positions, depth=1, used=None):
+    """
+    Write bits into the least significant bits of a pixel array.
+
+    Each used channel of each position takes the next ``depth`` bits. Bits
+    that do not fit in the available positions are dropped, as the original
+    per-pixel loop did.
+
+    Args:
+        pixels (numpy.ndarray): A writable, C-contiguous ``(height, width,
+            channels)`` or ``(height, width)`` ``uint8`` array. It is modified
+            in place.
+        bits (numpy.ndarray): The bits to write.
+        positions: Flat pixel indices in embedding order.
+        depth (int): The number of low bits used in each channel.
+        used (tuple): The channels that carry data, by default all of them.
+
+    Returns:
+        int: The number of bits written.
+    """
+
+    channels, used = _layout(pixels, used)
+    flat = pixels.reshape(-1)
+    slots = min(-(-len(bits) // depth), len(positions) * len(used))
+    values = bits_to_values(bits[:slots * depth], depth)
+    keep = 0xFF ^ ((1 << depth) - 1)
+
+    # Write the values of one chunk of pixels; chunks touch disjoint pixels
+    def embed_chunk(start, stop):
+        first = start * len(used)
+        count = min(stop * len(used), slots) - first
+        indices = channel_indices(positions[start:stop], count, channels, used)
+        flat[indices] = (flat[indices] & keep) | values[first:first + count]
+
+    map_chunks(embed_chunk, -(-slots // len(used)), CHUNK_SIZE)
+    return min(len(bits), slots * depth)
+
+# Read the least significant bits of the pixels
+def extract_bits(pixels, positions, depth=1, used=None):
+    """
+    Read the least significant bits of a pixel array.
+
+    Args:
+        pixels (numpy.ndarray): A ``(height, width, channels)`` or
+            ``(height, width)`` ``uint8`` array.
+        positions: Flat pixel indices in embedding order.
+        depth (int): The number of low bits used in each channel.
+        used (tuple): The channels that carry data, by default all of them.
+
+    Returns:
+        numpy.ndarray: ``depth`` bits per used channel per position, in
+        channel order.
+    """
+
+    channels, used = _layout(pixels, used)
+    flat = pixels.reshape(-1)
+    per_pixel = len(used) * depth
+    bits = np.empty(len(positions) * per_pixel, dtype=np.uint8)
+
+    # Read the bits of one chunk of pixels
+    def extract_chunk(start, stop):
+        indices = channel_indices(positions[start:stop], (stop - start) * len(used), channels, used)
+        bits[start * per_pixel:stop * per_pixel] = values_to_bits(
+            flat[indices] & ((1 << depth) - 1), depth
+        )
+
+    map_chunks(extract_chunk, len(positions), CHUNK_SIZE)
+    return bits
+
+# Locate the end marker in a bit array
+def find_end_marker(bits):
+    """
+    Find the first occurrence of the end marker in a bit array.
+
+    The marker may start at any bit offset, so the bits are packed once for
+    each of the 8 possible alignments and searched with ``bytes.find``.
+
+    Args:
+        bits (numpy.ndarray): The bits to search.
+
+    Returns:
+        int: The bit index of the marker, or -1 if it is not present.
+    """
+
+    found = -1
+    for shift in range(8):
+        packed = np.packbits(bits[shift:]).tobytes()
+        index = packed.find(END_MARKER_BYTES)
+        if index == -1:
+            continue
+        bit_index = index * 8 + shift
+        # packbits pads the last byte with zeros, which can fake a match
+        if bit_index + len(END_MARKER) > len(bits):
+            continue
+        if found == -1 or bit_index < found:
+            found = bit_index
+    return found
+
+# Read bits chunk by chunk until the end marker shows up
+def read_until_marker(pixels, positions, used=None):
+    """
+    Read payload bits until the end marker, stopping as soon as it is found.
+
+    Positions are read in chunks that start at ``FIRST_CHUNK_PIXELS`` and
+    double up to ``MAX_CHUNK_PIXELS``, so a short payload only touches a few
+    thousand pixels while a long one still goes through in large batches.
+    Each chunk is searched together with the last ``len(END_MARKER) - 1`` bits
+    of the previous one, so a marker straddling two chunks is not missed.
+
+    Args:
+        pixels (numpy.ndarray): A ``(height, width, channels)`` or
+            ``(height, width)`` ``uint8`` array.
+        positions: Flat pixel indices in embedding order.
+        used (tuple): The channels that carry data, by default all of them.
+
+    Returns:
+        numpy.ndarray: The bits before the marker, or None if there is no marker.
+    """
+
+    chunks = []
+    total = 0
+    carry = np.zeros(0, dtype=np.uint8)
+    start = 0
+    size = FIRST_CHUNK_PIXELS
+    while start < len(positions):
+        chunk = extract_bits(pixels, positions[start:start + size], used=used)
+        window = np.concatenate([carry, chunk])
+        index = find_end_marker(window)
+        if index != -1:
+            end_index = total - len(carry) + index
+            chunks.append(chunk)
+            return np.concatenate(chunks)[:end_index]
+        chunks.append(chunk)
+        total += len(chunk)
+        carry = window[-(len(END_MARKER) - 1):]
+        start += size
+        size = min(size * 2, MAX_CHUNK_PIXELS)
+    return None
@@ -0,0 +1,209 @@
+"""
+Payloads spread over the frames of multi-frame images.
+
+A multi-page TIFF or an animated PNG or WebP carries one version 1 container
+per frame, each holding a consecutive piece of the encrypted payload:
+
+- frame ``i`` is written in the keyed order of ``frame_password(password, i)``;
+  frame 0 uses the password itself, so its header is found like that of any
+  single-frame image;
+- every piece but the last sets ``FLAG_CONTINUED``, and a reader follows the
+  pieces frame by frame until one does not;
+- pieces are sized in proportion to what each frame can carry, so a payload
+  changes every frame about as little as the others.
+
+An animated GIF is read like the others, but the result has to be written
+as APNG, WebP or TIFF: GIF palettes would destroy the payload, and
+``stego.output`` rejects the output before any work is done.
+
+Frames are decoded and embedded one after the other, since Pillow decodes
+them in sequence; the work inside a frame is spread over the cores by
+``stego.parallel``. Images with a single frame are handled by
+``stego.container`` as before.
+"""
+
+import numpy as np
+from PIL import Image
+
+from stego.container import (
+    FLAG_CONTINUED, capacity_bits, carrier_mode, embed_payload, read_container, to_carrier,
+)
+from stego.metrics import span
+from stego.permutation import KEYED, make_permutation
+
+
+# Count the frames of an opened image
+def frame_count(img):
+    """
+    Count the frames of an image.
+
+    Args:
+        img (PIL.Image.Image): The image, as opened.
+
+    Returns:
+        int: The number of frames, 1 for still images.
+    """
+
+    return getattr(img, 'n_frames', 1)
+
+# Work out what each frame of an opened image can carry
+def frame_rooms(img, depth=1, alpha=False):
+    """
+    Compute the bytes each frame of an image can carry, from its headers alone.
+
+    The pages of a TIFF can each have their own size, read by seeking through
+    their directories. The frames of an animated PNG, WebP or GIF are all
+    decoded to the size of the canvas. No pixel is decoded either way.
+
+    Args:
+        img (PIL.Image.Image): The image, as opened. It is left on frame 0.
+        depth (int): The number of low bits to use in each channel, 1 to 4.
+        alpha (bool): Also use the alpha channel of LA and RGBA images.
+
+    Returns:
+        list: The whole bytes of payload each frame can carry.
+    """
+
+    mode = carrier_mode(img)
+    if img.format != 'TIFF':
+        sizes = [img.size] * frame_count(img)
+    else:
+        sizes = []
+        for index in range(frame_count(img)):
+            img.seek(index)
+            sizes.append(img.size)
+        img.seek(0)
+    return [capacity_bits(width * height, mode, depth, alpha) // 8 for width, height in sizes]
+
+# Password keying the pixel order of a frame
+def frame_password(password, index):
+    """
+    Derive the password keying the pixel order of a frame.
+
+    Args:
+        password (str): The password of the payload.
+        index (int): The frame index.
+
+    Returns:
+        str: The password itself for frame 0, a derived one for later frames.
+    """
+
+    return password if index == 0 else f"{password}\x00frame{index}"
+
+# Cut a payload into pieces in proportion to the room of each frame
+def split_payload(payload, rooms):
+    """
+    Cut a payload into consecutive pieces in proportion to the frames' room.
+
+    Args:
+        payload (bytes): The payload, no longer than ``sum(rooms)``.
+        rooms (list): The bytes each frame can carry.
+
+    Returns:
+        list: One piece per frame; each fits in its frame.
+    """
+
+    total = sum(rooms)
+    pieces = []
+    start = room_before = 0
+    for room in rooms:
+        room_before += room
+        stop = len(payload) * room_before // total if total else 0
+        pieces.append(payload[start:stop])
+        start = stop
+    return pieces
+
+# Decode every frame of an image in its carrier mode
+def carrier_frames(img):
+    """
+    Decode every frame of an image, converted to the carrier mode of the first.
+
+    Args:
+        img (PIL.Image.Image): The image, as opened.
+
+    Returns:
+        list: One image per frame, each a copy that can be written to.
+    """
+
+    mode = carrier_mode(img)
+    frames = []
+    for index in range(frame_count(img)):
+        img.seek(index)
+        # convert copies even when the mode does not change
+        frame = img.convert(mode)
+        frame.info = dict(img.info)
+        frames.append(frame)
+    return frames
+
+# Hide a payload across the frames of an image
+def embed_frames(frames, payload, password, flags=0, depth=1, alpha=False):
+    """
+    Hide a payload across frames, one version 1 container per frame.
+
+    Args:
+        frames (list): The frames, images in one of the carrier modes of
+            ``stego.container``. Their pixels are replaced in place.
+        payload (bytes): The bytes to hide.
+        password (str): The password that keys the pixel orders.
+        flags (int): ``FLAG_*`` values describing the payload.
+        depth (int): The number of low bits to use in each channel, 1 to 4.
+        alpha (bool): Also use the alpha channel of LA and RGBA images.
+
+    Returns:
+        int: The number of bits written, headers included.
+
+    Raises:
+        ValueError: If the payload does not fit in the frames, or the mode,
+            depth or alpha setting is not supported.
+    """
+
+    rooms = [capacity_bits(frame.width * frame.height, frame.mode, depth, alpha) // 8
+             for frame in frames]
+    if len(payload) > sum(rooms):
+        raise ValueError(f"Payload needs {len(payload)} bytes but the frames only hold {sum(rooms)}")
+    written = 0
+    last = len(frames) - 1
+    for index, (frame, piece) in enumerate(zip(frames, split_payload(payload, rooms))):
+        more = FLAG_CONTINUED if index < last else 0
+        written += embed_payload(
+            frame, piece, frame_password(password, index), flags | more, depth, alpha
+        )
+    return written
+
+# Collect the rest of a payload from the frames after the first
+def read_frames(image_path, password, flags, payload):
+    """
+    Follow a payload found in the first frame through the next frames.
+
+    Args:
+        image_path: The path to the image, or a seekable binary file object.
+        password (str): The password of the payload.
+        flags (int): The header flags of the first frame's container.
+        payload (bytes): The payload piece of the first frame.
+
+    Returns:
+        tuple: The flags without ``FLAG_CONTINUED`` and the whole payload, or
+        None if a frame the pieces lead to is missing or has no container.
+    """
+
+    pieces = [payload]
+    if hasattr(image_path, 'seek'):
+        image_path.seek(0)
+    with Image.open(image_path) as img:
+        index = 0
+        while flags & FLAG_CONTINUED:
+            index += 1
+            if index >= frame_count(img):
+                return None
+            with span('decode'):
+                img.seek(index)
+                frame = to_carrier(img)
+                pixels = np.asarray(frame, dtype=np.uint8)
+            height, width = pixels.shape[:2]
+            positions = make_permutation(frame_password(password, index), width * height, KEYED)
+            found = read_container(pixels, positions, frame.mode)
+            if found is None:
+                return None
+            flags, piece = found
+            pieces.append(piece)
+    return flags & ~FLAG_CONTINUED, b''.join(pieces)
@@ -0,0 +1,365 @@
+"""
+Timing and counters for the hide and extract pipelines.
+
+Every hide and extract of ``stego.core`` runs as an *operation*. While it
+runs, the pipeline opens a ``span`` around each stage and adds to counters
+with ``count``:
+
+- hide stages: ``open``, ``encrypt``, ``convert``, ``permutation``,
+  ``decode``, ``embed``, ``encode`` (tiled: ``encrypt``, ``permutation``,
+  ``bands``);
+- extract stages: ``open``, ``convert``, ``decode``, ``permutation``,
+  ``extract``, ``decrypt``;
+- ``extract_candidates`` (see ``stego.candidates``) adds the ``headers`` and
+  ``scan`` stages and the ``candidates`` and ``header_matches`` counters;
+- ``hide_stream`` and ``extract_stream`` (see ``stego.stream``) time their
+  chunk loop, reading, encrypting or decrypting and moving bits, as one
+  ``stream`` stage, and count ``chunks``;
+- counters: ``bits_written``, ``bits_read``, ``pixels_touched``, ``bytes_in``
+  (plaintext hidden, or payload read from the pixels) and ``bytes_out``
+  (encoded image written, or plaintext recovered).
+
+When an operation ends, its ``Record`` is added to the totals of the process
+and passed to every hook registered with ``add_hook``. ``prometheus_text``
+and ``snapshot`` export the totals, and ``json_log_hook`` writes each record
+as a JSON line.
+
+Two environment variables switch on more, without touching the code:
+
+- ``STEGO_METRICS_LOG``: a path to append JSON records to, or ``-`` for
+  standard error;
+- ``STEGO_PROFILE``: a directory to write the cProfile stats of every
+  operation to, one ``<operation>-<pid>-<n>.prof`` file each.
+
+The bookkeeping is a couple of clock reads and dict updates per stage, for
+stages that take milliseconds, so it is always on. Spans and counts outside
+an operation, as in direct calls into ``stego.container``, are ignored.
+"""
+
+import contextvars
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import namedtuple
+
+
+PROFILE_VARIABLE = 'STEGO_PROFILE'
+LOG_VARIABLE = 'STEGO_METRICS_LOG'
+
+Record = namedtuple('Record', ['operation', 'outcome', 'seconds', 'spans', 'counters'])
+
+# Spans and counters of the operation running in this context
+_current = contextvars.ContextVar('stego_operation', default=None)
+_profile_numbers = itertools.count(1)
+_lock = threading.Lock()
+_hooks = []
+_operations = {}
+_stages = {}
+_counters = {}
+
+
+class operation:
+    """
+    Run a hide or extract as one recorded operation, in a ``with`` block.
+
+    An operation inside another one is part of it and is not recorded apart.
+
+    Args:
+        name (str): The operation, ``'hide'`` or ``'extract'``.
+    """
+
+    __slots__ = ('name', 'state', 'token', 'profile_dir', 'profiler', 'started')
+
+    def __init__(self, name):
+        self.name = name
+        self.token = None
+
+    def __enter__(self):
+        if _current.get() is not None:
+            return self
+        self.state = ([], {})
+        self.token = _current.set(self.state)
+        self.profile_dir = os.environ.get(PROFILE_VARIABLE)
+        self.profiler = _start_profiler() if self.profile_dir else None
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if self.token is None:
+            return
+        seconds = time.perf_counter() - self.started
+        if self.profiler is not None:
+            self.profiler.disable()
+            os.makedirs(self.profile_dir, exist_ok=True)
+            self.profiler.dump_stats(os.path.join(
+                self.profile_dir, f"{self.name}-{os.getpid()}-{next(_profile_numbers)}.prof"
+            ))
+        _current.reset(self.token)
+        spans, counters = self.state
+        outcome = 'ok' if exc_type is None else exc_type.__name__
+        record(Record(self.name, outcome, seconds, tuple(spans), counters))
+
+
+class span:
+    """
+    Time one stage of the running operation, in a ``with`` block.
+
+    Args:
+        stage (str): The stage name.
+    """
+
+    __slots__ = ('stage', 'spans', 'started')
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        state = _current.get()
+        self.spans = None if state is None else state[0]
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if self.spans is not None:
+            self.spans.append((self.stage, time.perf_counter() - self.started))
+
+
+# Add to a counter of the running operation
+def count(name, value):
+    """
+    Add to a counter of the running operation.
+
+    Args:
+        name (str): The counter name.
+        value (int): The amount to add.
+    """
+
+    state = _current.get()
+    if state is not None:
+        counters = state[1]
+        counters[name] = counters.get(name, 0) + value
+
+# Start profiling the current thread
+def _start_profiler():
+    import cProfile
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler is already running
+        return None
+    return profiler
+
+# Add a finished operation to the totals and pass it to the hooks
+def record(entry):
+    """
+    Add a finished operation to the totals and pass it to the hooks.
+
+    ``operation`` calls this; it is public so that records made in another
+    process (see ``stego.service``) can be added to this one.
+
+    Args:
+        entry (Record): The operation.
+    """
+
+    with _lock:
+        totals = _operations.setdefault((entry.operation, entry.outcome), [0, 0.0])
+        totals[0] += 1
+        totals[1] += entry.seconds
+        for stage, seconds in entry.spans:
+            totals = _stages.setdefault((entry.operation, stage), [0, 0.0])
+            totals[0] += 1
+            totals[1] += seconds
+        for name, value in entry.counters.items():
+            key = (entry.operation, name)
+            _counters[key] = _counters.get(key, 0) + value
+        hooks = list(_hooks)
+    for hook in hooks:
+        try:
+            hook(entry)
+        except Exception as e:
+            import warnings
+
+            # Reporting must not fail the operation it reports on
+            warnings.warn(f"Metrics hook {hook!r} failed: {e}", RuntimeWarning)
+
+# Register a callback for finished operations
+def add_hook(hook):
+    """
+    Call a function with the ``Record`` of every finished operation.
+
+    Hooks run in the thread that ran the operation, so they should be quick.
+
+    Args:
+        hook (callable): The function, taking a ``Record``.
+    """
+
+    with _lock:
+        _hooks.append(hook)
+
+# Unregister a callback
+def remove_hook(hook):
+    """
+    Stop calling a function added with ``add_hook``.
+
+    Args:
+        hook (callable): The function.
+    """
+
+    with _lock:
+        _hooks.remove(hook)
+
+
+class collect:
+    """
+    Collect the records of the operations finished in a ``with`` block.
+
+    The ``with`` statement gives the list of records, filled in as
+    operations finish.
+    """
+
+    def __enter__(self):
+        self.records = []
+        add_hook(self.records.append)
+        return self.records
+
+    def __exit__(self, exc_type, exc, traceback):
+        remove_hook(self.records.append)
+
+
+# Sum the time spent in each stage of a record
+def stage_seconds(entry):
+    """
+    Sum the time a record spent in each stage.
+
+    Args:
+        entry (Record): The operation.
+
+    Returns:
+        dict: The seconds spent in each stage, in the order stages started.
+    """
+
+    seconds = {}
+    for stage, elapsed in entry.spans:
+        seconds[stage] = seconds.get(stage, 0.0) + elapsed
+    return seconds
+
+# Build a hook writing every record as a JSON line
+def json_log_hook(stream=None):
+    """
+    Build a hook that writes every record as one JSON line.
+
+    Args:
+        stream: A text file object, standard error by default.
+
+    Returns:
+        callable: The hook, for ``add_hook``.
+    """
+
+    import json
+
+    # Write one record
+    def hook(entry):
+        line = json.dumps({
+            'time': round(time.time(), 3),
+            'operation': entry.operation,
+            'outcome': entry.outcome,
+            'seconds': round(entry.seconds, 6),
+            'stages': {stage: round(seconds, 6) for stage, seconds in stage_seconds(entry).items()},
+            'counters': entry.counters,
+        })
+        out = sys.stderr if stream is None else stream
+        out.write(line + '\n')
+        out.flush()
+    return hook
+
+# Copy the totals as plain data
+def snapshot():
+    """
+    Copy the totals recorded so far.
+
+    Returns:
+        dict: ``operations`` (count and seconds by operation and outcome),
+        ``stages`` (count and seconds by operation and stage) and
+        ``counters`` (by operation), as JSON-ready nested dicts.
+    """
+
+    result = {'operations': {}, 'stages': {}, 'counters': {}}
+    with _lock:
+        for (name, outcome), (calls, seconds) in _operations.items():
+            result['operations'].setdefault(name, {})[outcome] = {'count': calls, 'seconds': seconds}
+        for (name, stage), (calls, seconds) in _stages.items():
+            result['stages'].setdefault(name, {})[stage] = {'count': calls, 'seconds': seconds}
+        for (name, counter), value in _counters.items():
+            result['counters'].setdefault(name, {})[counter] = value
+    return result
+
+# Export the totals in the Prometheus text format
+def prometheus_text():
+    """
+    Export the totals in the Prometheus text exposition format.
+
+    Returns:
+        str: ``stego_operations_total``, the ``stego_operation_seconds`` and
+        ``stego_stage_seconds`` summaries, and a ``stego_<counter>_total``
+        counter for each counter.
+    """
+
+    with _lock:
+        operations = sorted(_operations.items())
+        stages = sorted(_stages.items())
+        counters = sorted(_counters.items())
+
+    lines = [
+        "# HELP stego_operations_total Hide and extract operations, by outcome.",
+        "# TYPE stego_operations_total counter",
+    ]
+    lines += [f'stego_operations_total{{operation="{name}",outcome="{outcome}"}} {calls}'
+              for (name, outcome), (calls, _) in operations]
+
+    durations = {}
+    for (name, _), (calls, seconds) in operations:
+        totals = durations.setdefault(name, [0, 0.0])
+        totals[0] += calls
+        totals[1] += seconds
+    lines += [
+        "# HELP stego_operation_seconds Time spent in hide and extract operations.",
+        "# TYPE stego_operation_seconds summary",
+    ]
+    for name, (calls, seconds) in sorted(durations.items()):
+        lines.append(f'stego_operation_seconds_sum{{operation="{name}"}} {seconds:.6f}')
+        lines.append(f'stego_operation_seconds_count{{operation="{name}"}} {calls}')
+
+    lines += [
+        "# HELP stego_stage_seconds Time spent in each pipeline stage.",
+        "# TYPE stego_stage_seconds summary",
+    ]
+    for (name, stage), (calls, seconds) in stages:
+        labels = f'operation="{name}",stage="{stage}"'
+        lines.append(f'stego_stage_seconds_sum{{{labels}}} {seconds:.6f}')
+        lines.append(f'stego_stage_seconds_count{{{labels}}} {calls}')
+
+    for counter in sorted({counter for (_, counter), _ in counters}):
+        lines += [f"# TYPE stego_{counter}_total counter"]
+        lines += [f'stego_{counter}_total{{operation="{name}"}} {value}'
+                  for (name, other), value in counters if other == counter]
+    return '\n'.join(lines) + '\n'
+
+# Forget the totals
+def reset():
+    """
+    Forget the totals recorded so far. Hooks stay registered.
+    """
+
+    with _lock:
+        _operations.clear()
+        _stages.clear()
+        _counters.clear()
+
+
+if os.environ.get(LOG_VARIABLE):
+    _log = os.environ[LOG_VARIABLE]
+    add_hook(json_log_hook(None if _log == '-' else open(_log, 'a', encoding='utf-8')))
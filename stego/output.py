@@ -0,0 +1,184 @@
+"""
+Encoding of the output image.
+
+The hidden payload lives in the low bits of the pixels, so the output must be
+lossless. Encoding goes through a named preset that trades time for size:
+
+- ``fast``: PNG, zlib level 1 with the run-length strategy
+- ``default``: PNG, zlib level 6 (what ``Image.save`` does by default)
+- ``small``: PNG, zlib level 9
+- ``webp``: lossless WebP, usually the smallest but slow to encode
+- ``webp-fast``: lossless WebP at the fastest effort
+- ``tiff``: Deflate-compressed TIFF
+- ``bmp``: uncompressed BMP, for grayscale and RGB images only
+
+An output path must have the extension of one of them (``.png``,
+``.apng``, ``.webp``, ``.tif``, ``.tiff`` or ``.bmp``). Anything else,
+such as JPEG or GIF, would destroy the payload and is rejected before any
+work is done. All of them but BMP store several frames too, for images
+whose payload is spread over frames (see ``stego.frames``).
+
+The output can be a path, a writable binary file object, or an in-memory
+``bytes`` result (``encode_image``), so a service can hand out the encoded
+image without touching the disk. ``bench/output_presets.py`` measures the
+time and size of each preset. Pillow is only imported to check an output
+extension, so the presets can be listed without loading it.
+"""
+
+import io
+import os
+import zlib
+
+from stego.metrics import count, span
+
+
+DEFAULT_PRESET = 'default'
+
+# Pillow format and save options of each preset
+PRESETS = {
+    'fast': ('PNG', {'compress_level': 1, 'compress_type': zlib.Z_RLE}),
+    'default': ('PNG', {'compress_level': 6}),
+    'small': ('PNG', {'compress_level': 9}),
+    'webp': ('WEBP', {'lossless': True, 'quality': 100, 'method': 4, 'exact': True}),
+    'webp-fast': ('WEBP', {'lossless': True, 'quality': 0, 'method': 0, 'exact': True}),
+    'tiff': ('TIFF', {'compression': 'tiff_adobe_deflate'}),
+    'bmp': ('BMP', {}),
+}
+
+# Preset picked for an output path when none is given
+EXTENSION_PRESETS = {
+    '.png': 'default',
+    '.apng': 'default',
+    '.webp': 'webp',
+    '.tif': 'tiff',
+    '.tiff': 'tiff',
+    '.bmp': 'bmp',
+}
+
+# Modes a format stores losslessly, where it does not store them all: WebP
+# would move the bits of L and LA images, and BMP drops the alpha channel
+FORMAT_MODES = {
+    'WEBP': ('RGB', 'RGBA'),
+    'BMP': ('L', 'RGB'),
+}
+# Formats that store several frames
+MULTI_FRAME_FORMATS = ('PNG', 'WEBP', 'TIFF')
+
+
+# Look up the format and options of a preset
+def resolve_preset(preset, output=None):
+    """
+    Look up the Pillow format and save options of a preset.
+
+    Args:
+        preset (str): One of the ``PRESETS``, or None to pick one from the
+            extension of ``output``.
+        output: The output path or file object, used to check or pick the
+            preset.
+
+    Returns:
+        tuple: The format name and a dict of save options.
+
+    Raises:
+        ValueError: If the preset is unknown, or the output path has no
+            lossless extension or one the preset does not write.
+    """
+
+    extension = None
+    if isinstance(output, (str, os.PathLike)):
+        extension = os.path.splitext(os.fspath(output))[1].lower()
+    if preset is None:
+        if extension is None:
+            preset = DEFAULT_PRESET
+        elif extension in EXTENSION_PRESETS:
+            preset = EXTENSION_PRESETS[extension]
+        else:
+            raise ValueError(
+                f"Output {os.fspath(output)!r} is not a lossless image file, "
+                f"use one of {', '.join(EXTENSION_PRESETS)}"
+            )
+    if preset not in PRESETS:
+        raise ValueError(f"Unknown output preset {preset!r}, expected one of {', '.join(PRESETS)}")
+
+    format_name, options = PRESETS[preset]
+    from PIL import Image
+    if extension is not None and Image.registered_extensions().get(extension) != format_name:
+        raise ValueError(f"Preset {preset!r} writes {format_name}, not a {extension} file")
+    return format_name, dict(options)
+
+# Check that an output preset can store an image
+def check_output(mode, output, preset=None, frames=False):
+    """
+    Check, before any work is done, that an image can be written losslessly.
+
+    Args:
+        mode (str): The mode of the image that will be written.
+        output: A path, or a writable binary file object.
+        preset (str): One of the ``PRESETS``, or None to pick one.
+        frames (bool): Whether the image has several frames.
+
+    Returns:
+        tuple: The format name and save options, see ``resolve_preset``.
+
+    Raises:
+        ValueError: If the preset is unknown, does not match the output path,
+            or cannot store the image mode or its frames.
+    """
+
+    format_name, options = resolve_preset(preset, output)
+    if mode not in FORMAT_MODES.get(format_name, (mode,)):
+        raise ValueError(f"{format_name} output cannot store {mode} images losslessly")
+    if frames and format_name not in MULTI_FRAME_FORMATS:
+        raise ValueError(f"{format_name} output cannot store several frames")
+    return format_name, options
+
+# Write an image with an output preset
+def save_image(img, output, preset=None, frames=None):
+    """
+    Write an image losslessly to a path or a file object.
+
+    Args:
+        img (PIL.Image.Image): The image.
+        output: A path, or a writable binary file object.
+        preset (str): One of the ``PRESETS``. By default it is picked from the
+            extension of the path, and is ``'default'`` for file objects.
+        frames (list): Further frames of the same mode, written after ``img``
+            in one multi-frame file, with their ``duration`` if they have one.
+
+    Raises:
+        ValueError: If the preset is unknown, does not match the output path,
+            or cannot store the image mode or its frames.
+    """
+
+    format_name, options = check_output(img.mode, output, preset, bool(frames))
+    to_path = isinstance(output, (str, os.PathLike))
+    start = None if to_path or not output.seekable() else output.tell()
+    if frames:
+        options.update(save_all=True, append_images=list(frames))
+        if 'duration' in img.info:
+            options['duration'] = [frame.info.get('duration', 0) for frame in [img, *frames]]
+        if 'loop' in img.info:
+            options['loop'] = img.info['loop']
+    with span('encode'):
+        img.save(output, format_name, **options)
+    if to_path:
+        count('bytes_out', os.path.getsize(output))
+    elif start is not None:
+        count('bytes_out', output.tell() - start)
+
+# Encode an image to bytes with an output preset
+def encode_image(img, preset=DEFAULT_PRESET):
+    """
+    Encode an image losslessly in memory.
+
+    Args:
+        img (PIL.Image.Image): The image.
+        preset (str): One of the ``PRESETS``.
+
+    Returns:
+        bytes: The encoded image.
+    """
+
+    buffer = io.BytesIO()
+    save_image(img, buffer, preset)
+    return buffer.getvalue()
@@ -0,0 +1,200 @@
+"""
+Parallelism inside one image.
+
+Hiding or extracting a large payload spends its time evaluating the keyed
+pixel order and moving bits, in NumPy operations over millions of positions.
+``map_chunks`` cuts such work into chunks of ``CHUNK_SIZE`` positions and
+runs them on a thread pool shared by the process. NumPy releases the GIL in
+the arithmetic, so the chunks run on several cores, and a chunk's temporaries
+stay in the CPU cache, which about halves the time even on one core.
+
+Chunks write to disjoint parts of their output, so no locking is needed. The
+thread count defaults to the number of cores and can be set with the
+``STEGO_THREADS`` environment variable or ``set_threads``.
+
+Work over many images runs in process pools (``stego.batch``, ``stego.scan``,
+``stego.service``) started by ``worker_pool``, which gives each worker its
+share of the cores so the two levels do not oversubscribe the machine.
+``imap_bounded`` feeds such a pool from an iterable of any length, with a
+bounded number of jobs in flight.
+"""
+
+import os
+import threading
+
+
+THREADS_VARIABLE = 'STEGO_THREADS'
+CHUNK_SIZE = 1 << 16
+# Jobs submitted per worker process before waiting for results
+IN_FLIGHT_PER_WORKER = 4
+
+_lock = threading.Lock()
+_local = threading.local()
+_threads = None
+_pool = None
+
+
+# Number of threads work is spread over
+def thread_count():
+    """
+    Get the number of threads ``map_chunks`` spreads work over.
+
+    Returns:
+        int: ``set_threads``'s value, else ``STEGO_THREADS``, else the number
+        of cores.
+    """
+
+    if _threads is not None:
+        return _threads
+    value = os.environ.get(THREADS_VARIABLE)
+    return max(1, int(value)) if value else os.cpu_count() or 1
+
+# Change the number of threads
+def set_threads(threads):
+    """
+    Set the number of threads ``map_chunks`` spreads work over.
+
+    Args:
+        threads (int): The thread count, 1 to run everything in the calling
+            thread, or None to go back to the default.
+    """
+
+    global _threads, _pool
+
+    with _lock:
+        _threads = None if threads is None else max(1, int(threads))
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False)
+
+# Split the cores between the worker processes of a pool
+def share_cores(workers):
+    """
+    Compute the threads each of ``workers`` processes should use.
+
+    Args:
+        workers (int): The number of worker processes.
+
+    Returns:
+        int: The thread count for ``set_threads`` in each worker.
+    """
+
+    return max(1, thread_count() // max(1, workers))
+
+# Set up a worker process of a pool
+def _init_worker(threads, initializer, initargs):
+    set_threads(threads)
+    if initializer is not None:
+        initializer(*initargs)
+
+# Start a process pool whose workers share the cores
+def worker_pool(workers, initializer=None, initargs=()):
+    """
+    Start a process pool whose workers each use their share of the cores for
+    the work inside an image.
+
+    Args:
+        workers (int): The number of worker processes.
+        initializer (callable): Also called in each worker, with ``initargs``.
+        initargs (tuple): The arguments of ``initializer``.
+
+    Returns:
+        concurrent.futures.ProcessPoolExecutor: The pool.
+    """
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    return ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker,
+        initargs=(share_cores(workers), initializer, initargs),
+    )
+
+# Run jobs through a pool, a bounded number at a time
+def imap_bounded(pool, jobs, workers):
+    """
+    Run jobs on a pool and yield their results as they complete.
+
+    Jobs are taken from the iterable only as earlier ones finish, at most
+    ``IN_FLIGHT_PER_WORKER`` per worker ahead, so an iterable of any length
+    streams through in constant memory.
+
+    Args:
+        pool (concurrent.futures.Executor): The pool.
+        jobs: An iterable of ``(key, func, args)`` tuples.
+        workers (int): The number of workers of the pool.
+
+    Yields:
+        tuple: The key of a job and its return value, in completion order.
+    """
+
+    from concurrent.futures import FIRST_COMPLETED, wait
+
+    pending = {}
+    for key, func, args in jobs:
+        pending[pool.submit(func, *args)] = key
+        if len(pending) < workers * IN_FLIGHT_PER_WORKER:
+            continue
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield pending.pop(future), future.result()
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield pending.pop(future), future.result()
+
+# Get the thread pool, creating it on first use
+def _executor():
+    global _pool
+
+    with _lock:
+        if _pool is None:
+            from concurrent.futures import ThreadPoolExecutor
+
+            _pool = ThreadPoolExecutor(thread_count(), thread_name_prefix='stego')
+        return _pool
+
+# Forget the pool in a forked child, whose copy has no threads behind it
+def _after_fork():
+    global _lock, _pool
+
+    _lock = threading.Lock()
+    _pool = None
+
+# Run a function over consecutive chunks of a range, in parallel
+def map_chunks(func, size, chunk=CHUNK_SIZE):
+    """
+    Call ``func(start, stop)`` for consecutive chunks of ``range(size)``.
+
+    Chunks run on the thread pool when there are several and more than one
+    thread; otherwise, and when called from a pool thread, they run in the
+    calling thread.
+
+    Args:
+        func (callable): The work for one chunk. Chunks must not write to the
+            same memory.
+        size (int): The length of the range.
+        chunk (int): The chunk length.
+
+    Returns:
+        list: The return values of ``func``, in chunk order.
+    """
+
+    bounds = [(start, min(start + chunk, size)) for start in range(0, size, chunk)]
+    if len(bounds) < 2 or thread_count() < 2 or getattr(_local, 'worker', False):
+        return [func(start, stop) for start, stop in bounds]
+
+    # Run one chunk, marking the thread so nested calls do not wait on the pool
+    def run(start, stop):
+        _local.worker = True
+        try:
+            return func(start, stop)
+        finally:
+            _local.worker = False
+
+    pool = _executor()
+    futures = [pool.submit(run, start, stop) for start, stop in bounds]
+    return [future.result() for future in futures]
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
@@ -0,0 +1,298 @@
+"""
+Keyed pseudo-random pixel orders.
+
+The orders share a sequence-like interface (``len(order)`` and
+``order[start:stop]``):
+
+- ``KeyedPermutation`` evaluates a password-keyed Feistel network over the
+  pixel index space on demand, so the first N positions cost O(N) time and
+  memory whatever the image size. New images are written in this order.
+- ``TiledPermutation`` visits horizontal bands of the image in keyed order
+  and the pixels of each band in keyed order, so the bands holding the first
+  N positions are known before any pixel is decoded (see ``stego.tiled``).
+- ``SlotPermutation`` orders one of several disjoint slots of the pixel
+  index space, so payloads for different passwords share an image without
+  touching each other's pixels.
+- ``LegacyPermutation`` reproduces the ``random.seed(password)`` +
+  ``random.shuffle`` order of the original scripts, so images written before
+  the keyed order existed stay readable. It has to run the whole shuffle.
+"""
+
+import hashlib
+import random
+
+import numpy as np
+
+from stego.parallel import map_chunks
+
+
+KEYED = 'keyed'
+LEGACY = 'legacy'
+ORDERS = (KEYED, LEGACY)
+
+FEISTEL_ROUNDS = 8
+
+# Rows per band of the tiled order; part of the format, so never change it
+BAND_ROWS = 256
+
+# Leading positions a keyed order keeps once computed, enough for any header
+PREFIX_SIZE = 64
+
+
+# Mix 64-bit words (splitmix64 finalizer)
+def _mix64(values):
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xBF58476D1CE4E5B9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+class KeyedPermutation:
+    """
+    A password-keyed permutation of ``range(size)``, evaluated lazily.
+
+    The index space is embedded in the smallest domain of ``4 ** k`` values
+    that holds it, a balanced Feistel network permutes that domain, and values
+    that land outside ``range(size)`` are fed through the network again
+    (cycle walking). The domain is less than four times the size, so each
+    index needs fewer than four passes on average. The first ``PREFIX_SIZE``
+    positions, which every header read asks for, are kept once computed.
+
+    Args:
+        password (str): The password the round keys are derived from.
+        size (int): The number of pixels to permute.
+    """
+
+    def __init__(self, password, size):
+        self.size = size
+        half_bits = max(1, (max(size - 1, 1).bit_length() + 1) // 2)
+        self._half_bits = np.uint64(half_bits)
+        self._half_mask = np.uint64((1 << half_bits) - 1)
+        digest = hashlib.blake2b(
+            password.encode(), digest_size=8 * FEISTEL_ROUNDS, person=b'stego-perm'
+        ).digest()
+        self._round_keys = np.frombuffer(digest, dtype='<u8').astype(np.uint64)
+        self._prefix = None
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.size)
+            if start == 0 and step == 1 and stop <= PREFIX_SIZE:
+                if self._prefix is None:
+                    self._prefix = self.permute(np.arange(min(PREFIX_SIZE, self.size)))
+                    self._prefix.flags.writeable = False
+                return self._prefix[:stop]
+            return self.permute(np.arange(start, stop, step, dtype=np.uint64))
+        if not -self.size <= index < self.size:
+            raise IndexError("permutation index out of range")
+        return int(self.permute(np.array([index % self.size]))[0])
+
+    # Run the Feistel network once over the whole domain
+    def _encrypt(self, values):
+        left = values >> self._half_bits
+        right = values & self._half_mask
+        for key in self._round_keys:
+            left, right = right, left ^ (_mix64(right ^ key) & self._half_mask)
+        return (left << self._half_bits) | right
+
+    def permute(self, indices):
+        """
+        Map indices of the embedding order to flat pixel indices.
+
+        Long inputs are split into chunks run in parallel, see
+        ``stego.parallel``.
+
+        Args:
+            indices (numpy.ndarray): Indices in ``range(size)``.
+
+        Returns:
+            numpy.ndarray: The flat pixel index for each input index.
+        """
+
+        indices = np.asarray(indices, dtype=np.uint64)
+        result = np.empty(len(indices), dtype=np.intp)
+
+        # Permute one chunk of the indices
+        def permute_chunk(start, stop):
+            values = self._encrypt(indices[start:stop])
+            outside = np.flatnonzero(values >= self.size)
+            while len(outside):
+                values[outside] = self._encrypt(values[outside])
+                outside = outside[values[outside] >= self.size]
+            result[start:stop] = values
+
+        map_chunks(permute_chunk, len(indices))
+        return result
+
+
+class TiledPermutation:
+    """
+    A password-keyed pixel order that stays inside as few bands as possible.
+
+    The image is cut into bands of ``BAND_ROWS`` rows (the last one may be
+    shorter). The bands are visited in keyed order, and the pixels of each band
+    in a keyed order of their own, so the first N positions fall in the first
+    ``ceil(N / band pixels)`` bands of the band order.
+
+    Args:
+        password (str): The password the orders are keyed with.
+        width (int): The image width in pixels.
+        height (int): The image height in pixels.
+    """
+
+    def __init__(self, password, width, height):
+        self.size = width * height
+        self.width = width
+        self.band_pixels = width * BAND_ROWS
+        self._password = password
+        self.band_order = KeyedPermutation(password + '\x00bands', -(-height // BAND_ROWS))[:]
+        band_sizes = np.minimum(BAND_ROWS, height - self.band_order * BAND_ROWS) * width
+        self._ends = np.cumsum(band_sizes)
+        self._starts = self._ends - band_sizes
+        self._inner = {}
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            if not -self.size <= index < self.size:
+                raise IndexError("permutation index out of range")
+            return int(self[index % self.size:index % self.size + 1][0])
+        start, stop, step = index.indices(self.size)
+        indices = np.arange(start, stop, step, dtype=np.intp)
+        slots = np.searchsorted(self._ends, indices, side='right')
+        positions = np.empty(len(indices), dtype=np.intp)
+        for slot in np.unique(slots):
+            selected = slots == slot
+            band = int(self.band_order[slot])
+            inner = self._band_permutation(slot)
+            offsets = inner.permute(indices[selected] - self._starts[slot])
+            positions[selected] = band * self.band_pixels + offsets
+        return positions
+
+    # Keyed order of the pixels inside one band
+    def _band_permutation(self, slot):
+        inner = self._inner.get(slot)
+        if inner is None:
+            band = int(self.band_order[slot])
+            band_size = int(self._ends[slot] - self._starts[slot])
+            inner = KeyedPermutation(f"{self._password}\x00band{band}", band_size)
+            self._inner[slot] = inner
+        return inner
+
+
+class SlotPermutation:
+    """
+    A password-keyed order of one slot of an image shared by several payloads.
+
+    The flat pixel indices are dealt round-robin into ``slots`` slots of
+    ``size // slots`` pixels: slot ``k`` holds ``k, k + slots, k + 2 * slots,
+    ...`` (the last ``size % slots`` pixels are in none). A ``KeyedPermutation``
+    of the slot size orders the pixels of the slot, so a payload is still
+    spread over the whole image, and payloads in different slots never share a
+    pixel whatever their passwords.
+
+    The order inside a slot does not depend on the slot, so the slots of one
+    layout can share it: a reader looking for a header in every slot then
+    runs the Feistel network once per layout.
+
+    Args:
+        password (str): The password the order is keyed with.
+        size (int): The number of pixels in the image.
+        slots (int): The number of slots the image is divided into.
+        slot (int): The slot, in ``range(slots)``.
+        order (KeyedPermutation): The order inside the slot, if another slot
+            of the same password and layout already built it.
+    """
+
+    def __init__(self, password, size, slots, slot, order=None):
+        if not 0 <= slot < slots:
+            raise ValueError(f"Slot {slot} is not one of {slots} slots")
+        self.slots = slots
+        self.slot = slot
+        self.size = size // slots
+        self.order = KeyedPermutation(password, self.size) if order is None else order
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        return self.order[index] * self.slots + self.slot
+
+
+class LegacyPermutation:
+    """
+    The pixel order of the original scripts, for reading existing images.
+
+    The scripts shuffled the list of ``(x, y)`` tuples with
+    ``random.seed(password)``. ``random.shuffle`` only depends on the length
+    of the list and the generator state, so shuffling the flat pixel indices
+    ``y * width + x`` with an identically seeded generator gives the same
+    order. The shuffle is run on first access and kept.
+
+    Args:
+        password (str): The password the order is seeded with.
+        size (int): The number of pixels to permute.
+    """
+
+    def __init__(self, password, size):
+        self.size = size
+        self._password = password
+        self._order = None
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        if self._order is None:
+            order = list(range(self.size))
+            random.Random(self._password).shuffle(order)
+            self._order = np.array(order, dtype=np.intp)
+        return self._order[index]
+
+
+# Build the pixel order for an image
+def make_permutation(password, size, order=KEYED):
+    """
+    Build the pixel order for an image.
+
+    Args:
+        password (str): The password that keys the order.
+        size (int): The number of pixels in the image.
+        order (str): ``'keyed'`` for the lazy Feistel order, ``'legacy'`` for
+            the order of the original scripts.
+
+    Returns:
+        KeyedPermutation or LegacyPermutation: The pixel order.
+    """
+
+    if order == KEYED:
+        return KeyedPermutation(password, size)
+    if order == LEGACY:
+        return LegacyPermutation(password, size)
+    raise ValueError(f"Unknown pixel order: {order!r}")
+
+# Build the pixel order of one slot of an image
+def slot_permutation(password, size, slots=1, slot=0):
+    """
+    Build the keyed pixel order of one slot of an image.
+
+    Args:
+        password (str): The password that keys the order.
+        size (int): The number of pixels in the image.
+        slots (int): The number of slots the image is divided into.
+        slot (int): The slot, in ``range(slots)``.
+
+    Returns:
+        KeyedPermutation or SlotPermutation: The plain keyed order of the whole
+        image for a single slot, the order of the slot otherwise.
+    """
+
+    if slots == 1 and slot == 0:
+        return KeyedPermutation(password, size)
+    return SlotPermutation(password, size, slots, slot)
@@ -0,0 +1,412 @@
+"""
+Audit stores of images for hidden payloads, with or without their keys.
+
+Each image gets one verdict:
+
+- ``intact``: a key of the key file finds a container header, and the
+  payload it announces passes its HMAC check (``damaged`` if it does not, or
+  if frames it continues into are missing). Without ``verify`` the payload
+  is not read and the verdict is ``found``.
+- ``suspect`` or ``clean``: no key finds a header, or no keys were given, and
+  the statistics of the low bits say whether they look like a payload: an
+  image is ``suspect`` when either of the tests below fires.
+- ``lossy``: the format (JPEG) cannot carry low-bit payloads, read from the
+  file header alone.
+- ``error``: the file cannot be read as an image.
+
+The statistics run over the whole lowest bit plane, vectorized with NumPy:
+
+- ``payload_rate``: the sample pairs analysis of Dumitrescu, Wu and Wang,
+  which estimates the share of the channels whose lowest bit was replaced,
+  from how the pairs of neighbouring values shift. It reads within about
+  0.01 of the truth in natural images holding 1 bit per channel, and lower
+  at 2 bits (0.18 for a 2-bit payload filling 30% of the carrier). Images
+  scoring at least ``SUSPECT_RATE`` are ``suspect``.
+- ``chi_square_p``: the chi-square test of Westfeld and Pfitzmann. Writing
+  random bits into the lowest bit evens out the counts of each pair of values
+  ``2k`` and ``2k + 1``; this is the probability that the counts are this
+  even by chance. Payloads are spread over the image in keyed order, so it
+  only nears 1 once the carrier is close to full: it catches a full image
+  even where the other test reads low. Images scoring at least
+  ``SUSPECT_P`` are ``suspect``.
+- ``lsb_ones``: the share of lowest bits that are 1, about 0.5 either way.
+- ``lsb_agreement``: the share of horizontal neighbours with the same lowest
+  bit, above 0.5 in smooth natural images and 0.5 for random bits.
+
+A payload filling less than about a tenth of the carrier stays below
+``SUSPECT_RATE``; only its key finds it. Carriers whose lowest bits are
+noise already, such as synthetic noise or some high-ISO photos, read as
+suspect without any payload. Images in the end-marker format have no header
+and are only covered by the statistics.
+
+Images are scanned in a process pool, a bounded number at a time, and each
+verdict is written to a JSONL report as soon as it is ready. Every line
+carries the ``index`` of its image in the scan order (sorted directory walks),
+and a checkpoint file next to the report records the index up to which every
+image is reported. A scan started again with ``resume`` skips those images,
+and the ones reported past the checkpoint, and appends to the report; so a
+crashed scan of millions of images loses at most the images in flight.
+
+Like ``stego.batch``, this module imports the imaging modules and the
+process pool only when a scan runs.
+"""
+
+import json
+import math
+import os
+import time
+
+
+INTACT = 'intact'
+FOUND = 'found'
+DAMAGED = 'damaged'
+SUSPECT = 'suspect'
+CLEAN = 'clean'
+LOSSY = 'lossy'
+ERROR = 'error'
+
+SUSPECT_P = 0.95
+# Estimated share of replaced low bits from which an image is suspect
+SUSPECT_RATE = 0.1
+# Pairs of values with fewer pixels than this are left out of the chi-square
+MIN_PAIR_COUNT = 10
+LOSSY_FORMATS = ('JPEG', 'MPO')
+IMAGE_EXTENSIONS = ('.png', '.bmp', '.tif', '.tiff', '.webp', '.gif', '.jpg', '.jpeg')
+CHECKPOINT_SUFFIX = '.checkpoint'
+# Seconds between checkpoint writes
+CHECKPOINT_INTERVAL = 1.0
+
+# Key id to password mapping of this worker process
+_keys = {}
+
+
+# List the images under the given paths, in scan order
+def iter_images(paths):
+    """
+    List the images to scan, in a stable order.
+
+    Files are taken as given. Directories are walked in sorted order, taking
+    the files with one of the ``IMAGE_EXTENSIONS``.
+
+    Args:
+        paths (list): File and directory paths.
+
+    Yields:
+        str: The image paths.
+    """
+
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for root, directories, files in os.walk(path):
+            directories.sort()
+            for name in sorted(files):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield os.path.join(root, name)
+
+# Probability that a chi-square statistic is at most a value
+def _chi_square_cdf(statistic, dof):
+    # Wilson-Hilferty: the cube root of chi-square / dof is close to normal
+    if statistic <= 0:
+        return 0.0
+    scale = 2 / (9 * dof)
+    z = ((statistic / dof) ** (1 / 3) - (1 - scale)) / math.sqrt(scale)
+    return 0.5 * math.erfc(-z / math.sqrt(2))
+
+# Estimate the share of low bits a payload replaced
+def _sample_pairs_rate(planes):
+    import numpy as np
+
+    # Over the horizontal and vertical pairs (u, v) of neighbours, count
+    # x: v even and u < v, or v odd and u > v; y: the reverse; z: u == v;
+    # w: u and v differ in the lowest bit only. Natural images have x == y,
+    # and replacing a share p of the lowest bits moves them so that
+    # (w + z) / 2 * p**2 + (2x - pairs) * p + y - x == 0.
+    x = y = z = w = pairs = 0
+    for u, v in ((planes[:, :-1], planes[:, 1:]), (planes[:-1], planes[1:])):
+        even = (v & 1) == 0
+        x += int(np.count_nonzero(np.where(even, u < v, u > v)))
+        y += int(np.count_nonzero(np.where(even, u > v, u < v)))
+        z += int(np.count_nonzero(u == v))
+        w += int(np.count_nonzero(((u >> 1) == (v >> 1)) & (u != v)))
+        pairs += u.size
+    a, b, c = (w + z) / 2, 2 * x - pairs, y - x
+    if a == 0:
+        return 0.0
+    discriminant = b * b - 4 * a * c
+    if discriminant < 0:
+        return 1.0
+    # The smaller root; the other lies past 1
+    rate = (-b - math.sqrt(discriminant)) / (2 * a)
+    return min(max(rate, 0.0), 1.0)
+
+# Compute the statistics of the lowest bit plane
+def lsb_statistics(pixels, channels):
+    """
+    Compute the low-bit statistics of a pixel array.
+
+    Args:
+        pixels (numpy.ndarray): A ``(height, width, channels)`` or
+            ``(height, width)`` ``uint8`` array.
+        channels (tuple): The channels to test, for instance the color
+            channels of ``stego.container.channel_layout``.
+
+    Returns:
+        dict: ``payload_rate``, ``chi_square_p``, ``lsb_ones`` and
+        ``lsb_agreement``, see the module documentation.
+    """
+
+    import numpy as np
+
+    if pixels.ndim == 2:
+        pixels = pixels[:, :, None]
+    planes = pixels[:, :, list(channels)]
+
+    # Counts of each value per channel, as 128 pairs of (2k, 2k + 1)
+    pairs = np.stack([
+        np.bincount(planes[:, :, channel].reshape(-1), minlength=256)
+        for channel in range(planes.shape[2])
+    ]).reshape(-1, 128, 2).astype(np.float64)
+    totals = pairs.sum(axis=2)
+    kept = totals >= MIN_PAIR_COUNT
+    expected = totals[kept] / 2
+    statistic = float((((pairs[:, :, 0][kept] - expected) ** 2) / expected).sum())
+    dof = int(kept.sum()) - 1
+    chi_square_p = 1 - _chi_square_cdf(statistic, dof) if dof > 0 else 0.0
+
+    lsb = planes & 1
+    agreement = (lsb[:, 1:] == lsb[:, :-1]).mean() if lsb.shape[1] > 1 else 0.5
+    return {
+        'payload_rate': round(_sample_pairs_rate(planes), 4),
+        'chi_square_p': round(chi_square_p, 4),
+        'lsb_ones': round(float(lsb.mean()), 4),
+        'lsb_agreement': round(float(agreement), 4),
+    }
+
+# Look for a container of one of the keys and check its payload
+def _probe_keys(image_path, pixels, mode, keys, verify):
+    from stego.candidates import probe_headers, read_match
+    from stego.core import decrypt_payload
+
+    headers = probe_headers(pixels, mode, list(keys.items()))
+    if not headers:
+        return None
+    key_id, password, found = headers[0]
+    header = found[1]
+    result = {'key_id': key_id, 'payload_bytes': header.length, 'flags': header.flags}
+    if not verify:
+        return dict(result, verdict=FOUND)
+    read = read_match(image_path, pixels, mode, password, found)
+    if read is None:
+        return dict(result, verdict=DAMAGED)
+    try:
+        decrypt_payload(*read, password)
+    except Exception:
+        return dict(result, verdict=DAMAGED)
+    return dict(result, verdict=INTACT)
+
+# Scan one image
+def scan_image(image_path, keys=None, verify=True, threshold=SUSPECT_P, rate=SUSPECT_RATE):
+    """
+    Give the verdict of one image, see the module documentation.
+
+    Every failure is caught and reported in the result, so one bad image never
+    stops a scan. The plaintext of a payload is never part of the result.
+
+    Args:
+        image_path (str): The path to the image.
+        keys (dict): Key ids to passwords to look for containers with, or None
+            for the statistics only.
+        verify (bool): Check the payload of a found container.
+        threshold (float): The ``chi_square_p`` from which an image is
+            ``suspect``.
+        rate (float): The ``payload_rate`` from which an image is
+            ``suspect``.
+
+    Returns:
+        dict: The report line for the image.
+    """
+
+    import numpy as np
+    from PIL import Image
+
+    from stego.container import channel_layout, to_carrier
+
+    result = {'input': image_path}
+    started = time.perf_counter()
+    try:
+        with Image.open(image_path) as img:
+            result.update(format=img.format, width=img.width, height=img.height)
+            if img.format in LOSSY_FORMATS:
+                result['verdict'] = LOSSY
+            else:
+                carrier = to_carrier(img)
+                pixels = np.asarray(carrier, dtype=np.uint8)
+                result['mode'] = carrier.mode
+                found = None
+                if keys:
+                    found = _probe_keys(image_path, pixels, carrier.mode, keys, verify)
+                result.update(lsb_statistics(pixels, channel_layout(carrier.mode)[0]))
+                if found is not None:
+                    result.update(found)
+                elif result['payload_rate'] >= rate or result['chi_square_p'] >= threshold:
+                    result['verdict'] = SUSPECT
+                else:
+                    result['verdict'] = CLEAN
+    except Exception as e:
+        result['verdict'] = ERROR
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['seconds'] = round(time.perf_counter() - started, 6)
+    return result
+
+# Set up a worker process of a scan
+def _init_worker(keys):
+    global _keys
+
+    _keys = keys
+
+# Scan one image in a worker process
+def _scan_job(image_path, verify, threshold, rate):
+    return scan_image(image_path, _keys, verify, threshold, rate)
+
+# Read the checkpoint of a scan
+def read_checkpoint(path):
+    """
+    Read the checkpoint of a scan.
+
+    Args:
+        path (str): The checkpoint path.
+
+    Returns:
+        dict: ``paths`` (what was scanned) and ``done`` (the index up to which
+        every image is reported), or None if there is no checkpoint.
+    """
+
+    try:
+        with open(path, encoding='utf-8') as checkpoint:
+            return json.load(checkpoint)
+    except FileNotFoundError:
+        return None
+
+# Write the checkpoint of a scan, atomically
+def write_checkpoint(path, paths, done):
+    """
+    Write the checkpoint of a scan, replacing the previous one atomically.
+
+    Args:
+        path (str): The checkpoint path.
+        paths (list): The paths given to the scan.
+        done (int): The index up to which every image is reported.
+    """
+
+    temporary = path + '.tmp'
+    with open(temporary, 'w', encoding='utf-8') as checkpoint:
+        json.dump({'paths': list(paths), 'done': done}, checkpoint)
+    os.replace(temporary, path)
+
+# Find the images reported past the checkpoint
+def _reported_after(report_path, done):
+    reported = set()
+    with open(report_path, encoding='utf-8') as report:
+        for line in report:
+            try:
+                index = json.loads(line)['index']
+            except (ValueError, KeyError, TypeError):
+                # The line a crash cut short
+                continue
+            if index > done:
+                reported.add(index)
+    return reported
+
+# Check whether a file ends in the middle of a line
+def _ends_mid_line(path):
+    with open(path, 'rb') as f:
+        if f.seek(0, os.SEEK_END) == 0:
+            return False
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) != b'\n'
+
+# Scan images through a process pool
+def run_scan(paths, report_path, keys=None, workers=None, verify=True, threshold=SUSPECT_P,
+             resume=False, rate=SUSPECT_RATE):
+    """
+    Scan the images under some paths through a process pool, see the module
+    documentation.
+
+    Report lines are written in completion order, each with the ``index`` of
+    its image in the scan order.
+
+    Args:
+        paths (list): File and directory paths, see ``iter_images``.
+        report_path (str): The JSONL report path; the checkpoint goes next to
+            it, with ``CHECKPOINT_SUFFIX`` added.
+        keys (dict): Key ids to passwords, see ``stego.batch.load_keys``.
+        workers (int): The number of worker processes, by default one per core.
+        verify (bool): Check the payload of found containers.
+        threshold (float): The ``chi_square_p`` from which an image is
+            ``suspect``.
+        resume (bool): Carry on the scan the checkpoint and report record,
+            appending to the report.
+        rate (float): The ``payload_rate`` from which an image is
+            ``suspect``.
+
+    Returns:
+        dict: The number of images newly reported per verdict.
+
+    Raises:
+        ValueError: If resuming a scan of other paths.
+    """
+
+    from stego.parallel import imap_bounded, worker_pool
+
+    paths = list(paths)
+    checkpoint_path = report_path + CHECKPOINT_SUFFIX
+    done, reported = 0, set()
+    if resume and os.path.exists(report_path):
+        checkpoint = read_checkpoint(checkpoint_path)
+        if checkpoint is not None:
+            if checkpoint['paths'] != paths:
+                raise ValueError("The checkpoint belongs to a scan of other paths")
+            done = checkpoint['done']
+        reported = _reported_after(report_path, done)
+        torn = _ends_mid_line(report_path)
+    else:
+        resume = torn = False
+    workers = workers or os.cpu_count() or 1
+    verdicts = {}
+    # Indices past ``done`` already reported, until ``done`` catches up with them
+    finished = set(reported)
+    while done + 1 in finished:
+        done += 1
+        finished.remove(done)
+    saved = time.monotonic()
+
+    with open(report_path, 'a' if resume else 'w', encoding='utf-8') as report:
+        if torn:
+            # Start on a fresh line after a line a crash cut short
+            report.write('\n')
+
+        def write(index, result):
+            nonlocal done, saved
+            report.write(json.dumps({'index': index, **result}) + '\n')
+            report.flush()
+            verdicts[result['verdict']] = verdicts.get(result['verdict'], 0) + 1
+            finished.add(index)
+            while done + 1 in finished:
+                done += 1
+                finished.remove(done)
+            if time.monotonic() - saved >= CHECKPOINT_INTERVAL:
+                write_checkpoint(checkpoint_path, paths, done)
+                saved = time.monotonic()
+
+        jobs = (
+            (index, _scan_job, (image_path, verify, threshold, rate))
+            for index, image_path in enumerate(iter_images(paths), start=1)
+            if index > done and index not in reported
+        )
+        with worker_pool(workers, _init_worker, (keys or {},)) as pool:
+            for index, result in imap_bounded(pool, jobs, workers):
+                write(index, result)
+    write_checkpoint(checkpoint_path, paths, done)
+    return verdicts
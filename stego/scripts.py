@@ -0,0 +1,129 @@
+"""
+The functions of the scripts in the repository root, shared by both.
+
+``main.py`` (the interactive menu) and ``hide_text_in_image.py`` (the
+example) import these instead of each keeping a copy. They print and return
+messages rather than raise, for people at a terminal; programs should call
+``stego.core`` directly.
+
+``extract_text_from_image`` reads the containers of ``stego.core`` and the
+end-marker format, and falls back to the format of the browser tool (see
+``stego.web``), so images made in the browser can be read from the scripts.
+"""
+
+NOT_FOUND = "No hidden text found."
+INCORRECT_PASSWORD = "Incorrect password! Cannot decrypt."
+
+
+# Convert text to binary
+def text_to_bin(text):
+
+    """
+    Convert text to a binary string representation.
+
+    This function takes a plaintext string and converts each character
+    into its binary representation using 8 bits per character. The resulting
+    binary strings are concatenated into a single binary string.
+
+    Args:
+        text (str): The plaintext string to convert to binary.
+
+    Returns:
+        str: A binary string representation of the input text.
+    """
+
+    return ''.join(format(ord(char), '08b') for char in text)
+
+# Convert binary to text
+def bin_to_text(binary_data):
+
+    """
+    Convert a binary string to a plaintext string.
+
+    This function takes a binary string and separates it into 8-bit
+    chunks. Each chunk is converted back to a character using the
+    chr() function, and the characters are concatenated into a single
+    string.
+
+    Args:
+        binary_data (str): The binary string to convert to text.
+
+    Returns:
+        str: The plaintext string representation of the input binary data.
+    """
+
+    chars = [binary_data[i:i+8] for i in range(0, len(binary_data), 8)]
+    return ''.join([chr(int(char, 2)) for char in chars])
+
+# Hide encrypted text inside an image
+def hide_text_in_image(image_path, text, output_image_path, password):
+
+    """
+    Hide encrypted text inside an image.
+
+    This function takes a path to an image, a plaintext string to hide, an output
+    image path to save the image to, and a password to encrypt the text with.
+    The function hides the encrypted text inside the image by modifying the
+    least significant bit of the color channels of the image's pixels. The
+    resulting image is saved to the output image path.
+
+    Args:
+        image_path (str): The path to the image to hide the text in.
+        text (str): The plaintext string to hide in the image.
+        output_image_path (str): The path to save the image with hidden text to.
+        password (str): The password used to encrypt the text.
+
+    Returns:
+        bool: Whether the text was hidden. The outcome is printed either way.
+    """
+    from stego.core import hide_text
+
+    # The library call times each stage (see stego.metrics) and raises on failure
+    try:
+        hide_text(image_path, text, output_image_path, password)
+    except Exception as e:
+        print(f"Error hiding text in image: {e}")
+        return False
+    print(f"Text successfully hidden in {output_image_path}")
+    return True
+
+# Extract encrypted text from an image
+def extract_text_from_image(image_path, password, cache=None):
+
+    """
+    Extract encrypted text from an image.
+
+    This function takes a path to an image and a password, and attempts to extract
+    the encrypted text that was previously hidden in the image using the same password.
+    The extracted text is decrypted with the password and returned as a plaintext string.
+    Images made by the browser tool are read too.
+
+    Args:
+        image_path (str): The path to the image to extract text from.
+        password (str): The password used to generate the encryption key.
+        cache (stego.cache.DecodeCache): Optional cache of decoded images, so
+            that extracting from the same image again skips decoding it.
+
+    Returns:
+        str: The decrypted plaintext string, or an error message if no text is
+        found or the password is incorrect.
+    """
+
+    from stego.core import IncorrectPasswordError, NoHiddenTextError, StegoError, extract_text
+    from stego.web import extract_web_text
+
+    # The scripts read images they wrote before containers had a header, of
+    # any size, so the end-marker format is always scanned
+    try:
+        return extract_text(image_path, password, cache=cache, legacy=True)
+    except (NoHiddenTextError, IncorrectPasswordError) as e:
+        error = e
+    except StegoError as e:
+        return str(e)
+    try:
+        return extract_web_text(image_path, password)
+    except NoHiddenTextError:
+        pass
+    except IncorrectPasswordError as e:
+        error = e
+    return NOT_FOUND if isinstance(error, NoHiddenTextError) else INCORRECT_PASSWORD
@@ -0,0 +1,271 @@
+"""
+A small local HTTP server in front of ``StegoService``, for load testing.
+
+Usage::
+
+    python -m stego.server [--host 127.0.0.1] [--port 8080] [--workers N]
+                           [--max-concurrency N] [--max-queue N] [--timeout SECONDS]
+
+It stands in for the real web endpoint: plain HTTP/1.1 with keep-alive on
+asyncio streams, no framework. Requests and responses are JSON, images are
+base64 in requests and raw bytes in the hide response:
+
+- ``POST /hide`` ``{"image", "message", "password", "depth", "alpha", "preset"}``
+  returns the encoded image;
+- ``POST /extract`` ``{"image", "password"}`` returns ``{"message"}``;
+- ``GET /stats`` returns the service counters;
+- ``GET /metrics`` returns the ``stego.metrics`` totals in the Prometheus
+  text format.
+
+Errors come back as ``{"error"}`` with 400 (bad request or image), 413 (message too
+large for the image), 422 (nothing to extract with the password), 503
+(queue full) or 504 (timed out). Once it listens, the server prints
+``listening on http://HOST:PORT``, which matters with ``--port 0``.
+"""
+
+import argparse
+import asyncio
+import base64
+import binascii
+import json
+import signal
+import sys
+from http import HTTPStatus
+
+from stego import metrics
+from stego.service import ServiceBusyError, StegoService
+
+
+MAX_BODY = 64 * 2**20
+CONTENT_TYPES = {
+    'PNG': 'image/png', 'WEBP': 'image/webp', 'TIFF': 'image/tiff', 'BMP': 'image/bmp',
+}
+
+
+class HTTPError(Exception):
+    """A request that gets an error response."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# Map an exception from the service to an HTTP status
+def error_status(error):
+    """
+    Pick the HTTP status of an error raised while serving a request.
+
+    Args:
+        error (Exception): The error.
+
+    Returns:
+        HTTPStatus: The status to answer with.
+    """
+
+    from PIL import UnidentifiedImageError
+
+    from stego.core import PayloadTooLargeError, StegoError
+
+    if isinstance(error, HTTPError):
+        return error.status
+    if isinstance(error, ServiceBusyError):
+        return HTTPStatus.SERVICE_UNAVAILABLE
+    if isinstance(error, TimeoutError):
+        return HTTPStatus.GATEWAY_TIMEOUT
+    if isinstance(error, PayloadTooLargeError):
+        return HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+    if isinstance(error, StegoError):
+        return HTTPStatus.UNPROCESSABLE_ENTITY
+    if isinstance(error, (KeyError, TypeError, ValueError, UnidentifiedImageError)):
+        return HTTPStatus.BAD_REQUEST
+    return HTTPStatus.INTERNAL_SERVER_ERROR
+
+# Read one request from a connection
+async def read_request(reader):
+    """
+    Read one HTTP/1.1 request.
+
+    Args:
+        reader (asyncio.StreamReader): The connection.
+
+    Returns:
+        tuple: The method, path, lower-cased headers and body, or None when
+        the client closed the connection.
+
+    Raises:
+        HTTPError: If the request is malformed or its body too large.
+    """
+
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, path, _ = line.decode('latin-1').split(' ', 2)
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed request line") from None
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    # A length is digits only: int() would also take signs, spaces and underscores
+    length = headers.get('content-length', '0')
+    if not (length.isascii() and length.isdigit()):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"Malformed Content-Length: {length!r}")
+    length = int(length)
+    if length > MAX_BODY:
+        raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large")
+    body = await reader.readexactly(length) if length else b''
+    return method, path.split('?', 1)[0], headers, body
+
+# Write one response to a connection
+async def write_response(writer, status, body, content_type='application/json', close=False):
+    head = (
+        f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n"
+    )
+    writer.write(head.encode('latin-1') + body)
+    await writer.drain()
+
+
+class StegoServer:
+    """
+    Route HTTP requests to a ``StegoService``.
+
+    Args:
+        service (StegoService): The service doing the work.
+    """
+
+    def __init__(self, service):
+        self.service = service
+
+    # Answer one parsed request
+    async def respond(self, method, path, body):
+        """
+        Answer one request.
+
+        Args:
+            method (str): The HTTP method.
+            path (str): The request path, without the query string.
+            body (bytes): The request body.
+
+        Returns:
+            tuple: The response body and its content type.
+
+        Raises:
+            HTTPError: If the route does not exist.
+            Exception: Whatever the service raised, see ``error_status``.
+        """
+
+        if path == '/stats' and method == 'GET':
+            return json.dumps(self.service.stats()).encode(), 'application/json'
+        if path == '/metrics' and method == 'GET':
+            return metrics.prometheus_text().encode(), 'text/plain; version=0.0.4'
+        if path not in ('/hide', '/extract'):
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"No route {path}")
+        if method != 'POST':
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, f"{path} takes POST")
+
+        try:
+            request = json.loads(body)
+            image = base64.b64decode(request['image'], validate=True)
+        except (json.JSONDecodeError, binascii.Error) as e:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"Malformed request body: {e}") from None
+        if path == '/extract':
+            message = await self.service.extract(image, request['password'])
+            return json.dumps({'message': message}).encode(), 'application/json'
+
+        from stego.output import DEFAULT_PRESET, PRESETS
+
+        preset = request.get('preset') or DEFAULT_PRESET
+        options = {key: request[key] for key in ('depth', 'alpha') if key in request}
+        encoded = await self.service.hide(
+            image, request['message'], request['password'], preset=preset, **options
+        )
+        return encoded, CONTENT_TYPES[PRESETS[preset][0]]
+
+    # Serve the requests of one connection
+    async def handle(self, reader, writer):
+        """
+        Serve requests on a connection until the client closes it.
+
+        Args:
+            reader (asyncio.StreamReader): The connection's reader.
+            writer (asyncio.StreamWriter): The connection's writer.
+        """
+
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except HTTPError as e:
+                    body = json.dumps({'error': str(e)}).encode()
+                    await write_response(writer, e.status, body, close=True)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                close = headers.get('connection', '').lower() == 'close'
+                try:
+                    body, content_type = await self.respond(method, path, body)
+                    status = HTTPStatus.OK
+                except Exception as e:
+                    status = error_status(e)
+                    body = json.dumps({'error': f"{type(e).__name__}: {e}"}).encode()
+                    content_type = 'application/json'
+                await write_response(writer, status, body, content_type, close)
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+# Serve until interrupted
+async def serve(host, port, service):
+    """
+    Listen for requests until the task is cancelled or SIGTERM arrives.
+
+    Args:
+        host (str): The address to bind.
+        port (int): The port to bind, 0 for any free port.
+        service (StegoService): The service doing the work.
+    """
+
+    loop = asyncio.get_running_loop()
+    try:
+        # Closing the service on the way out stops the worker processes too
+        loop.add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    except NotImplementedError:
+        pass
+    server = await asyncio.start_server(StegoServer(service).handle, host, port)
+    host, port = server.sockets[0].getsockname()[:2]
+    print(f"listening on http://{host}:{port}", flush=True)
+    async with server, service:
+        await server.serve_forever()
+
+# Run the server from the command line
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve hide and extract over HTTP.")
+    parser.add_argument('--host', default='127.0.0.1', help="address to bind (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=8080, help="port to bind, 0 for any (default: 8080)")
+    parser.add_argument('--workers', type=int, help="worker processes (default: one per core)")
+    parser.add_argument('--max-concurrency', type=int, help="jobs run at a time (default: workers)")
+    parser.add_argument('--max-queue', type=int, help="calls allowed to wait for a slot")
+    parser.add_argument('--timeout', type=float, help="seconds before a call gets 504")
+    args = parser.parse_args(argv)
+
+    service = StegoService(args.workers, args.max_concurrency, args.max_queue, args.timeout)
+    try:
+        asyncio.run(serve(args.host, args.port, service))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,259 @@
+"""
+Asyncio-facing hide and extract with bounded concurrency.
+
+Decoding, embedding and encoding an image are CPU-bound and block for as long
+as they run, so ``StegoService`` runs them in a process pool it manages and
+only awaits the results. Images and results travel as encoded ``bytes``; no
+file is written.
+
+Concurrency is bounded twice:
+
+- at most ``max_concurrency`` jobs are handed to the pool at a time (a
+  semaphore), so a burst of requests cannot pile up in the pool's own queue;
+- at most ``max_queue`` callers may wait for a slot. Past that, calls fail at
+  once with ``ServiceBusyError``, which a web endpoint maps to 503.
+
+A call can be cancelled, or given a ``timeout`` covering both the wait for a
+slot and the work itself. A job that has not started yet is dropped. A job
+already running in a worker cannot be interrupted: its result is discarded and
+its slot is only freed once the worker is done with it, so the bound on
+concurrent work holds even then.
+
+The ``stego.metrics`` records a worker makes are sent back with each result
+and added to the totals of the service's own process.
+"""
+
+import asyncio
+import io
+import os
+
+from stego import metrics
+
+
+# Callers allowed to wait for a slot, per slot
+QUEUE_PER_SLOT = 4
+
+
+class ServiceBusyError(Exception):
+    """Too many calls are already waiting for a slot."""
+
+
+# Run a job in a worker, sending back the metrics records it made
+def _recorded(job, *args):
+    with metrics.collect() as records:
+        try:
+            return job(*args), records
+        except Exception as e:
+            e.metrics_records = records
+            raise
+
+# Hide a message in an encoded image, in a worker
+def _hide_job(image, message, password, options):
+    from stego.core import hide_bytes, hide_text
+
+    output = io.BytesIO()
+    if isinstance(message, str):
+        hide_text(io.BytesIO(image), message, output, password, **options)
+    else:
+        hide_bytes(io.BytesIO(image), message, output, password, **options)
+    return output.getvalue()
+
+# Extract a message from an encoded image, in a worker
+def _extract_job(image, password, as_text, legacy):
+    from stego.core import extract_bytes, extract_text
+
+    if as_text:
+        return extract_text(io.BytesIO(image), password, legacy=legacy)
+    return extract_bytes(io.BytesIO(image), password, legacy=legacy)
+
+
+class StegoService:
+    """
+    Hide and extract without blocking the event loop.
+
+    Args:
+        workers (int): Worker processes, by default one per core.
+        max_concurrency (int): Jobs handed to the pool at a time, by default
+            ``workers``.
+        max_queue (int): Calls allowed to wait for a slot, by default
+            ``QUEUE_PER_SLOT`` per slot.
+        timeout (float): Default timeout of a call in seconds, None for none.
+
+    The service can be used as an async context manager, which closes it.
+    """
+
+    def __init__(self, workers=None, max_concurrency=None, max_queue=None, timeout=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_concurrency = max_concurrency or self.workers
+        self.max_queue = self.max_concurrency * QUEUE_PER_SLOT if max_queue is None else max_queue
+        self.timeout = timeout
+        self._pool = None
+        self._slots = None
+        self._waiting = 0
+        self._running = 0
+        self._counts = dict.fromkeys(
+            ('completed', 'failed', 'rejected', 'timed_out', 'cancelled'), 0
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    # Hand a job to the pool, replacing a pool a crashed worker broke
+    def _submit(self, job, args):
+        from concurrent.futures.process import BrokenProcessPool
+
+        from stego.parallel import worker_pool
+
+        if self._pool is None:
+            self._pool = worker_pool(self.workers)
+        try:
+            return self._pool.submit(job, *args)
+        except BrokenProcessPool:
+            self._pool = worker_pool(self.workers)
+            return self._pool.submit(job, *args)
+
+    # Free a slot once the pool is done with a job
+    def _free_slot(self):
+        self._running -= 1
+        self._slots.release()
+
+    # Run a job in the pool within the concurrency and queue bounds
+    async def _run(self, job, args, timeout):
+        loop = asyncio.get_running_loop()
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        timeout = self.timeout if timeout is None else timeout
+        deadline = None if timeout is None else loop.time() + timeout
+
+        if self._slots.locked() and self._waiting >= self.max_queue:
+            self._counts['rejected'] += 1
+            raise ServiceBusyError(f"{self._waiting} calls are already waiting")
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self._counts['timed_out'] += 1
+            raise
+        except asyncio.CancelledError:
+            self._counts['cancelled'] += 1
+            raise
+        finally:
+            self._waiting -= 1
+
+        try:
+            future = self._submit(_recorded, (job, *args))
+        except BaseException:
+            self._slots.release()
+            raise
+        self._running += 1
+        # The pool calls back from its own thread, and may outlive the loop
+        future.add_done_callback(
+            lambda _: loop.is_closed() or loop.call_soon_threadsafe(self._free_slot)
+        )
+
+        remaining = None if deadline is None else max(0, deadline - loop.time())
+        try:
+            result, records = await asyncio.wait_for(asyncio.wrap_future(future), remaining)
+        except asyncio.TimeoutError:
+            self._counts['timed_out'] += 1
+            raise
+        except asyncio.CancelledError:
+            self._counts['cancelled'] += 1
+            raise
+        except Exception as e:
+            self._counts['failed'] += 1
+            for record in getattr(e, 'metrics_records', ()):
+                metrics.record(record)
+            raise
+        self._counts['completed'] += 1
+        for record in records:
+            metrics.record(record)
+        return result
+
+    async def hide(self, image, message, password, timeout=None, **options):
+        """
+        Encrypt a message and hide it in an encoded image.
+
+        Args:
+            image (bytes): The encoded carrier image.
+            message (str | bytes): Text for ``extract(as_text=True)``, or bytes.
+            password (str): The password used to encrypt the message.
+            timeout (float): Seconds to wait for a slot and the work, by
+                default the service timeout.
+            **options: ``depth``, ``alpha`` and ``preset``, as for
+                ``stego.core.hide_bytes``. The tiled mode needs files and is
+                not available here.
+
+        Returns:
+            bytes: The encoded image with the hidden message.
+
+        Raises:
+            ServiceBusyError: If too many calls are waiting.
+            TimeoutError: If the call timed out.
+            PayloadTooLargeError: If the message does not fit.
+            ValueError: If an option is not supported.
+        """
+
+        if options.get('tiled'):
+            raise ValueError("The tiled mode works on files and is not available in the service")
+        return await self._run(_hide_job, (bytes(image), message, password, options), timeout)
+
+    async def extract(self, image, password, as_text=True, timeout=None, legacy=None):
+        """
+        Extract and decrypt the message hidden in an encoded image.
+
+        Args:
+            image (bytes): The encoded image.
+            password (str): The password used to hide the message.
+            as_text (bool): Return text rather than bytes.
+            timeout (float): Seconds to wait for a slot and the work, by
+                default the service timeout.
+            legacy (bool): Scan for payloads written before containers had
+                a header, see ``stego.core.extract_bytes``. Scanning large
+                images holds a worker for seconds per call.
+
+        Returns:
+            str | bytes: The message.
+
+        Raises:
+            ServiceBusyError: If too many calls are waiting.
+            TimeoutError: If the call timed out.
+            NoHiddenTextError: If no message is found for the password.
+            IncorrectPasswordError: If the message does not decrypt.
+        """
+
+        return await self._run(
+            _extract_job, (bytes(image), password, as_text, legacy), timeout
+        )
+
+    def stats(self):
+        """
+        Report the load and outcome counters of the service.
+
+        Returns:
+            dict: ``running`` and ``waiting`` calls, the bounds, and the
+            counts of ``completed``, ``failed``, ``rejected``, ``timed_out``
+            and ``cancelled`` calls.
+        """
+
+        return {
+            'running': self._running,
+            'waiting': self._waiting,
+            'max_concurrency': self.max_concurrency,
+            'max_queue': self.max_queue,
+            **self._counts,
+        }
+
+    async def close(self):
+        """
+        Shut the pool down, dropping jobs that have not started.
+        """
+
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            await asyncio.get_running_loop().run_in_executor(
+                None, lambda: pool.shutdown(wait=True, cancel_futures=True)
+            )
@@ -0,0 +1,359 @@
+"""
+Hide and extract payloads of any size in bounded memory.
+
+``hide_bytes`` encrypts the whole plaintext into one token and expands the
+token to one byte per bit before writing it, so a payload costs about ten
+times its size in memory on top of the image. Streaming instead reads the
+payload in chunks of ``STREAM_CHUNK_SIZE`` from a file object or an
+iterable, encrypts each chunk into its own token (see
+``stego.crypto.encrypt_chunks``) and writes the bits of each token into the
+pixels as soon as it is produced. Extraction reads, checks and hands over one
+chunk at a time. Besides the pixel array of the image, memory stays
+proportional to the chunk size, whatever the payload size.
+
+A stream is a version 1 container flagged ``FLAG_STREAM | FLAG_RAW``, in the
+keyed order of the whole image, whose payload is a sequence of records::
+
+    token length (4 bytes) | raw Fernet token of one chunk
+
+The header comes first in the pixel order, as always, but it is written
+last, once the payload length is known, so a source of unknown length needs
+no first pass. Readers that know nothing of streams still find the header;
+``stego.core`` joins the chunks of a stream for ``extract_bytes``.
+"""
+
+import struct
+
+import numpy as np
+from PIL import Image
+
+from stego.container import (
+    FLAG_ALPHA, FLAG_RAW, FLAG_STREAM, HEADER_BITS, MAX_DEPTH, channel_layout, header_pixels,
+    pack_header,
+)
+from stego.engine import bits_to_bytes, bytes_to_bits, embed_bits, extract_bits
+from stego.metrics import count, span
+from stego.permutation import slot_permutation
+
+
+STREAM_CHUNK_SIZE = 1 << 16
+RECORD_LENGTH = struct.Struct('>I')
+MAX_STREAM_BYTES = (1 << 32) - 1
+
+
+class BitWriter:
+    """
+    Write bytes into consecutive pixels of a pixel order, as they come.
+
+    Bits that do not fill a whole pixel are held back until the next write,
+    so a sequence of writes puts every bit where one write of all the bytes
+    would have.
+
+    Args:
+        pixels (numpy.ndarray): The pixel array, modified in place.
+        positions: The pixel order.
+        start (int): The index in ``positions`` of the first pixel to write.
+        depth (int): The number of low bits used in each channel.
+        used (tuple): The channels that carry data.
+    """
+
+    def __init__(self, pixels, positions, start, depth, used):
+        self.pixels = pixels
+        self.positions = positions
+        self.depth = depth
+        self.used = used
+        self.per_pixel = depth * len(used)
+        self.capacity = (len(positions) - start) * self.per_pixel
+        self.bits = 0
+        self.cursor = start
+        self._carry = np.empty(0, dtype=np.uint8)
+
+    def _embed(self, bits, pixel_count):
+        stop = self.cursor + pixel_count
+        embed_bits(self.pixels, bits, self.positions[self.cursor:stop], self.depth, self.used)
+        self.cursor = stop
+
+    def write(self, data):
+        """
+        Write bytes after the ones written so far.
+
+        Args:
+            data (bytes): The bytes to write.
+
+        Raises:
+            OverflowError: If the bytes do not fit in the remaining pixels.
+        """
+
+        if self.bits + len(data) * 8 > self.capacity:
+            raise OverflowError(
+                f"Payload needs more than the {self.capacity} bits the image holds"
+            )
+        bits = bytes_to_bits(data)
+        if len(self._carry):
+            bits = np.concatenate([self._carry, bits])
+        whole = len(bits) // self.per_pixel
+        if whole:
+            self._embed(bits[:whole * self.per_pixel], whole)
+        self._carry = bits[whole * self.per_pixel:].copy()
+        self.bits += len(data) * 8
+
+    def close(self):
+        """
+        Write the bits held back, filling part of one last pixel.
+
+        Returns:
+            int: The number of bits written.
+        """
+
+        if len(self._carry):
+            self._embed(self._carry, 1)
+            self._carry = self._carry[:0]
+        return self.bits
+
+
+class BitReader:
+    """
+    Read bytes from consecutive pixels of a pixel order, as they are needed.
+
+    Args:
+        pixels (numpy.ndarray): The pixel array.
+        positions: The pixel order.
+        start (int): The index in ``positions`` of the first pixel to read.
+        depth (int): The number of low bits used in each channel.
+        used (tuple): The channels that carry data.
+    """
+
+    def __init__(self, pixels, positions, start, depth, used):
+        self.pixels = pixels
+        self.positions = positions
+        self.depth = depth
+        self.used = used
+        self.per_pixel = depth * len(used)
+        self.cursor = start
+        self._carry = np.empty(0, dtype=np.uint8)
+
+    def read(self, size):
+        """
+        Read the next bytes.
+
+        Args:
+            size (int): The number of bytes to read.
+
+        Returns:
+            bytes: Exactly ``size`` bytes.
+
+        Raises:
+            EOFError: If the pixel order ends first.
+        """
+
+        needed = size * 8 - len(self._carry)
+        bits = self._carry
+        if needed > 0:
+            stop = self.cursor + -(-needed // self.per_pixel)
+            if stop > len(self.positions):
+                raise EOFError("The stream runs past the end of the image")
+            read = extract_bits(self.pixels, self.positions[self.cursor:stop], self.depth,
+                                self.used)
+            bits = np.concatenate([bits, read]) if len(bits) else read
+            self.cursor = stop
+        self._carry = bits[size * 8:].copy()
+        return bits_to_bytes(bits[:size * 8])
+
+
+# Cut a payload source into chunks
+def read_chunks(source, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Cut a payload source into chunks of ``chunk_size`` bytes, the last one
+    shorter.
+
+    Args:
+        source: Bytes, a binary file object (anything with ``read``), or an
+            iterable of bytes.
+        chunk_size (int): The chunk length in bytes.
+
+    Yields:
+        bytes: The chunks, in order.
+    """
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        pieces = [source]
+    elif hasattr(source, 'read'):
+        pieces = iter(lambda: source.read(chunk_size), b'')
+    else:
+        pieces = source
+
+    buffer = bytearray()
+    for piece in pieces:
+        piece = memoryview(piece).cast('B')
+        if buffer:
+            taken = min(len(piece), chunk_size - len(buffer))
+            buffer += piece[:taken]
+            piece = piece[taken:]
+            if len(buffer) < chunk_size:
+                continue
+            yield bytes(buffer)
+            buffer.clear()
+        # Whole chunks of a large piece are sliced out without copying it
+        whole = len(piece) - len(piece) % chunk_size
+        for offset in range(0, whole, chunk_size):
+            yield bytes(piece[offset:offset + chunk_size])
+        buffer += piece[whole:]
+    if buffer:
+        yield bytes(buffer)
+
+# Measure what is left to read in a payload source
+def source_size(source):
+    """
+    Measure the bytes left in a payload source, when it can be known upfront.
+
+    Args:
+        source: A source accepted by ``read_chunks``.
+
+    Returns:
+        int: The number of bytes, or None for iterables and unseekable files.
+    """
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return memoryview(source).nbytes
+    seekable = getattr(source, 'seekable', None)
+    if seekable is None or not seekable():
+        return None
+    position = source.tell()
+    end = source.seek(0, 2)
+    source.seek(position)
+    return end - position
+
+# Compute the container payload length of a stream
+def stream_size(size, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Compute the container payload length of a stream of ``size`` bytes.
+
+    Args:
+        size (int): The plaintext length in bytes.
+        chunk_size (int): The chunk length in bytes.
+
+    Returns:
+        int: The payload length in bytes, records included.
+    """
+
+    from stego.crypto import chunk_token_size
+
+    whole, rest = divmod(size, chunk_size)
+    length = whole * (RECORD_LENGTH.size + chunk_token_size(chunk_size))
+    if rest or not whole:
+        length += RECORD_LENGTH.size + chunk_token_size(rest)
+    return length
+
+# Hide a stream of tokens inside an image
+def embed_stream(img, tokens, password, depth=1, alpha=False):
+    """
+    Hide a stream of tokens inside an image, as a ``FLAG_STREAM`` container.
+
+    The bits of each token are written as soon as the iterable produces it.
+    The image is only changed once the whole stream is written.
+
+    Args:
+        img (PIL.Image.Image): An image in one of the ``CARRIER_MODES``. Its
+            pixels are replaced in place.
+        tokens: An iterable of raw tokens, see ``stego.crypto.encrypt_chunks``.
+        password (str): The password that keys the pixel order.
+        depth (int): The number of low bits to use in each channel, 1 to 4.
+        alpha (bool): Also use the alpha channel of LA and RGBA images.
+
+    Returns:
+        int: The number of bits written, including the header.
+
+    Raises:
+        OverflowError: If the stream does not fit in the image.
+        ValueError: If the mode, depth or alpha setting is not supported.
+    """
+
+    if not 1 <= depth <= MAX_DEPTH:
+        raise ValueError(f"Bits per channel must be between 1 and {MAX_DEPTH}")
+    header_channels, payload_channels = channel_layout(img.mode, alpha)
+    flags = FLAG_STREAM | FLAG_RAW | (FLAG_ALPHA if alpha else 0)
+
+    with span('decode'):
+        pixels = np.array(img, dtype=np.uint8)
+    width, height = img.size
+    positions = slot_permutation(password, width * height)
+    start = header_pixels(img.mode)
+    writer = BitWriter(pixels, positions, start, depth, payload_channels)
+    length = chunks = 0
+    # One span for the whole loop: a span per chunk would grow with the stream
+    with span('stream'):
+        for token in tokens:
+            record = RECORD_LENGTH.pack(len(token)) + token
+            length += len(record)
+            if length > MAX_STREAM_BYTES:
+                raise OverflowError(f"A stream holds at most {MAX_STREAM_BYTES} bytes")
+            writer.write(record)
+            chunks += 1
+        bits = writer.close()
+    with span('embed'):
+        header_bits = bytes_to_bits(pack_header(length, depth, flags))
+        embed_bits(pixels, header_bits, positions[:start], 1, header_channels)
+        img.paste(Image.fromarray(pixels, img.mode))
+    count('chunks', chunks)
+    count('bits_written', HEADER_BITS + bits)
+    count('pixels_touched', writer.cursor)
+    return HEADER_BITS + bits
+
+# Read the tokens of a stream container
+def read_stream(pixels, positions, mode, header):
+    """
+    Read the tokens of a ``FLAG_STREAM`` container, one at a time.
+
+    Args:
+        pixels (numpy.ndarray): The pixel array of an image.
+        positions: The pixel order the container was written in.
+        mode (str): The image mode, one of the ``CARRIER_MODES``.
+        header (Header): The container header, see ``find_header``.
+
+    Yields:
+        bytes: The raw token of each chunk, in order.
+
+    Raises:
+        ValueError: If the records do not add up to the announced length.
+    """
+
+    payload_channels = channel_layout(mode, bool(header.flags & FLAG_ALPHA))[1]
+    reader = BitReader(pixels, positions, header_pixels(mode), header.bits_per_channel,
+                       payload_channels)
+    remaining = header.length
+    while remaining:
+        if remaining < RECORD_LENGTH.size:
+            raise ValueError("The stream ends inside a record")
+        (size,) = RECORD_LENGTH.unpack(reader.read(RECORD_LENGTH.size))
+        remaining -= RECORD_LENGTH.size
+        if size > remaining:
+            raise ValueError("A record of the stream runs past its end")
+        count('bits_read', (RECORD_LENGTH.size + size) * 8)
+        yield reader.read(size)
+        remaining -= size
+
+# Split the records of a stream payload read in one piece
+def split_records(payload):
+    """
+    Split a ``FLAG_STREAM`` payload already in memory into its tokens.
+
+    Args:
+        payload (bytes): The container payload.
+
+    Yields:
+        bytes: The raw token of each chunk, in order.
+
+    Raises:
+        ValueError: If the records do not add up to the payload length.
+    """
+
+    offset = 0
+    while offset < len(payload):
+        if len(payload) - offset < RECORD_LENGTH.size:
+            raise ValueError("The stream ends inside a record")
+        (size,) = RECORD_LENGTH.unpack_from(payload, offset)
+        offset += RECORD_LENGTH.size
+        if size > len(payload) - offset:
+            raise ValueError("A record of the stream runs past its end")
+        yield payload[offset:offset + size]
+        offset += size
@@ -0,0 +1,488 @@
+"""
+Memory-bounded hide and extract for very large images.
+
+Tiled containers are ordinary version 1 containers written in the banded
+``TiledPermutation`` order, with ``FLAG_TILED`` set. The bands holding the
+header and the payload are known from the payload length alone, so:
+
+- extraction decodes the band with the header and then only the bands the
+  payload lies in;
+- hiding decodes, patches and writes out one band at a time.
+
+Bands are decoded straight from the strips or tiles of 8-bit RGB TIFF files
+(uncompressed or Deflate, with or without the horizontal predictor), without
+going through a full-image decode: only the rows of the band are read from
+uncompressed strips, and Deflate strips are inflated front to back up to the
+last row of the band, carrying on from there for the band below. Peak memory
+is then about one band plus the payload, however the file is split in strips.
+
+Other files, LZW or JPEG TIFFs and PNGs among them, are decoded whole once,
+with a ``RuntimeWarning``, so only the permutation and payload handling stay
+bounded for them. The output is always a striped TIFF with one strip per band,
+which this module reads back band by band.
+"""
+
+import os
+import struct
+import warnings
+import zlib
+
+import numpy as np
+from PIL import Image
+
+from stego.container import (
+    FLAG_TILED, HEADER_BITS, HEADER_PIXELS, pack_header, parse_header,
+)
+from stego.engine import CHANNELS, bits_to_bytes, bytes_to_bits, channel_indices
+from stego.metrics import count, span
+from stego.permutation import BAND_ROWS, TiledPermutation
+
+
+# TIFF tags and values read or written here
+TAG_WIDTH = 256
+TAG_HEIGHT = 257
+TAG_BITS_PER_SAMPLE = 258
+TAG_COMPRESSION = 259
+TAG_PHOTOMETRIC = 262
+TAG_STRIP_OFFSETS = 273
+TAG_SAMPLES_PER_PIXEL = 277
+TAG_ROWS_PER_STRIP = 278
+TAG_STRIP_BYTE_COUNTS = 279
+TAG_PLANAR_CONFIG = 284
+TAG_PREDICTOR = 317
+TAG_TILE_WIDTH = 322
+TAG_TILE_LENGTH = 323
+TAG_TILE_OFFSETS = 324
+TAG_TILE_BYTE_COUNTS = 325
+
+COMPRESSION_NONE = 1
+COMPRESSION_DEFLATE = (8, 32946)
+PREDICTOR_HORIZONTAL = 2
+
+TIFF_SHORT = 3
+TIFF_LONG = 4
+
+# Bytes of a Deflate strip read, and inflated, at a time
+INFLATE_BLOCK = 1 << 20
+
+# zlib level of the output strips for the stego.output presets that fit
+PRESET_LEVELS = {'fast': 1, 'default': 6, 'small': 9, 'tiff': 6}
+
+
+class BandReader:
+    """
+    Decode an image one ``BAND_ROWS``-row band at a time.
+
+    Args:
+        path (str): The path to the image.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with Image.open(path) as img:
+            self.size = img.size
+            self._chunks = _tiff_chunks(img)
+            if self._chunks is None:
+                kind = img.info.get('compression', 'raw') if img.format == 'TIFF' else img.format
+                warnings.warn(
+                    f"{path}: {kind} {img.mode} images cannot be decoded band by band, "
+                    f"the whole image is decoded at once", RuntimeWarning, stacklevel=3,
+                )
+        self._full = None
+        self._cached = (None, None)
+        self._inflaters = {}
+
+    @property
+    def band_count(self):
+        return -(-self.size[1] // BAND_ROWS)
+
+    def read_band(self, band):
+        """
+        Decode one band.
+
+        Args:
+            band (int): The band index, from the top of the image.
+
+        Returns:
+            numpy.ndarray: A read-only ``(rows, width, 3)`` ``uint8`` array.
+        """
+
+        if self._cached[0] == band:
+            return self._cached[1]
+        width, height = self.size
+        top = band * BAND_ROWS
+        bottom = min(height, top + BAND_ROWS)
+        if self._chunks is None:
+            if self._full is None:
+                with Image.open(self.path) as img:
+                    self._full = np.asarray(img.convert("RGB"))
+            rows = self._full[top:bottom]
+        else:
+            rows = self._decode_rows(top, bottom)
+        self._cached = (band, rows)
+        return rows
+
+    # Assemble rows from the parts of the TIFF strips or tiles that hold them
+    def _decode_rows(self, top, bottom):
+        width = self.size[0]
+        rows = np.empty((bottom - top, width, CHANNELS), dtype=np.uint8)
+        chunks = self._chunks
+        inflaters = {}
+        with open(self.path, 'rb') as tiff:
+            for index, (box, offset, byte_count) in enumerate(chunks['layout']):
+                left, chunk_top, chunk_width, chunk_height = box
+                if chunk_top >= bottom or chunk_top + chunk_height <= top:
+                    continue
+                row_bytes = chunk_width * CHANNELS
+                first = max(top, chunk_top)
+                start = (first - chunk_top) * row_bytes
+                length = (min(bottom, chunk_top + chunk_height) - first) * row_bytes
+                if chunks['compression'] == COMPRESSION_NONE:
+                    tiff.seek(offset + start)
+                    data = tiff.read(max(0, min(length, byte_count - start)))
+                else:
+                    inflater = self._inflaters.get(index) or _StripInflater(offset, byte_count)
+                    inflaters[index] = inflater
+                    data = inflater.read(tiff, start, length)
+                pixels = np.frombuffer(data, dtype=np.uint8)
+                pixels = pixels[:len(pixels) // row_bytes * row_bytes]
+                pixels = pixels.reshape(-1, chunk_width, CHANNELS)
+                if chunks['predictor'] == PREDICTOR_HORIZONTAL:
+                    pixels = np.cumsum(pixels, axis=1, dtype=np.uint8)
+                visible = min(chunk_width, width - left)
+                rows[first - top:first - top + len(pixels), left:left + visible] = (
+                    pixels[:, :visible]
+                )
+        # Only the strips of this band are kept inflating, for the band below
+        self._inflaters = inflaters
+        return rows
+
+
+class _StripInflater:
+    """
+    Inflate a Deflate strip front to back, a block at a time.
+
+    Reads go forward from where the last one stopped, so the bands of a strip
+    read top to bottom inflate it once. A read behind that starts over.
+
+    Args:
+        offset (int): The file offset of the strip.
+        byte_count (int): The compressed size of the strip.
+    """
+
+    def __init__(self, offset, byte_count):
+        self.offset = offset
+        self.byte_count = byte_count
+        self._reset()
+
+    def _reset(self):
+        self._inflater = zlib.decompressobj()
+        self._consumed = 0
+        self._position = 0
+        self._buffer = b''
+
+    def read(self, tiff, start, length):
+        """
+        Inflate part of the strip.
+
+        Args:
+            tiff (file): The TIFF file, opened for binary reading.
+            start (int): The offset of the part in the inflated strip.
+            length (int): The size of the part.
+
+        Returns:
+            bytes: The part, shorter if the strip ends first.
+        """
+
+        if start < self._position:
+            self._reset()
+        end = start + length
+        pieces = []
+        while self._position < end:
+            if not self._buffer:
+                self._buffer = self._inflate(tiff)
+                if not self._buffer:
+                    break
+            take = min(len(self._buffer), end - self._position)
+            if self._position + take > start:
+                pieces.append(self._buffer[max(0, start - self._position):take])
+            self._buffer = self._buffer[take:]
+            self._position += take
+        return b''.join(pieces)
+
+    # Inflate the next block, or return nothing at the end of the strip
+    def _inflate(self, tiff):
+        while True:
+            if self._inflater.unconsumed_tail:
+                data = self._inflater.unconsumed_tail
+            elif self._consumed < self.byte_count and not self._inflater.eof:
+                tiff.seek(self.offset + self._consumed)
+                data = tiff.read(min(INFLATE_BLOCK, self.byte_count - self._consumed))
+                if not data:
+                    return b''
+                self._consumed += len(data)
+            else:
+                return b''
+            inflated = self._inflater.decompress(data, INFLATE_BLOCK)
+            if inflated:
+                return inflated
+
+
+# Describe the strips or tiles of a TIFF this module can decode itself
+def _tiff_chunks(img):
+    if img.format != 'TIFF' or img.mode != 'RGB':
+        return None
+    tags = img.tag_v2
+    if tags.get(TAG_PLANAR_CONFIG, 1) != 1 or tuple(tags.get(TAG_BITS_PER_SAMPLE, (8,))) not in ((8,), (8, 8, 8)):
+        return None
+    compression = tags.get(TAG_COMPRESSION, COMPRESSION_NONE)
+    predictor = tags.get(TAG_PREDICTOR, 1)
+    if compression != COMPRESSION_NONE and compression not in COMPRESSION_DEFLATE:
+        return None
+    if predictor not in (1, PREDICTOR_HORIZONTAL):
+        return None
+
+    width, height = img.size
+    layout = []
+    if TAG_TILE_OFFSETS in tags:
+        tile_width, tile_height = tags[TAG_TILE_WIDTH], tags[TAG_TILE_LENGTH]
+        across = -(-width // tile_width)
+        for index, (offset, byte_count) in enumerate(zip(tags[TAG_TILE_OFFSETS], tags[TAG_TILE_BYTE_COUNTS])):
+            box = ((index % across) * tile_width, (index // across) * tile_height, tile_width, tile_height)
+            layout.append((box, offset, byte_count))
+    elif TAG_STRIP_OFFSETS in tags:
+        rows_per_strip = min(tags.get(TAG_ROWS_PER_STRIP, height), height)
+        for index, (offset, byte_count) in enumerate(zip(tags[TAG_STRIP_OFFSETS], tags[TAG_STRIP_BYTE_COUNTS])):
+            top = index * rows_per_strip
+            layout.append(((0, top, width, min(rows_per_strip, height - top)), offset, byte_count))
+    else:
+        return None
+    return {'compression': compression, 'predictor': predictor, 'layout': layout}
+
+
+class StripWriter:
+    """
+    Write an 8-bit RGB striped TIFF one strip at a time.
+
+    The strips are written as they come and the directory is appended by
+    ``close``, so only the strip being written is held in memory. The output
+    file has to be seekable.
+
+    Args:
+        stream (file): A binary file opened for writing.
+        width (int): The image width in pixels.
+        height (int): The image height in pixels.
+        rows_per_strip (int): The number of rows in each strip.
+        compress_level (int): zlib level for Deflate strips, 0 for uncompressed.
+    """
+
+    def __init__(self, stream, width, height, rows_per_strip=BAND_ROWS, compress_level=6):
+        self.stream = stream
+        self.width = width
+        self.height = height
+        self.rows_per_strip = rows_per_strip
+        self.compress_level = compress_level
+        self.offsets = []
+        self.byte_counts = []
+        self._start = stream.tell()
+        # Byte order, magic number and a placeholder for the directory offset
+        stream.write(b'II' + struct.pack('<HI', 42, 0))
+
+    def write_strip(self, rows):
+        """
+        Append a strip.
+
+        Args:
+            rows (numpy.ndarray): A ``(rows, width, 3)`` ``uint8`` array.
+        """
+
+        data = np.ascontiguousarray(rows, dtype=np.uint8).tobytes()
+        if self.compress_level:
+            data = zlib.compress(data, self.compress_level)
+        self.offsets.append(self._tell())
+        self.byte_counts.append(len(data))
+        self.stream.write(data)
+        if len(data) % 2:
+            self.stream.write(b'\0')
+
+    def _tell(self):
+        return self.stream.tell() - self._start
+
+    # Write an out-of-line tag value and return its offset
+    def _write_array(self, fmt, values):
+        offset = self._tell()
+        self.stream.write(struct.pack('<%d%s' % (len(values), fmt), *values))
+        if self._tell() % 2:
+            self.stream.write(b'\0')
+        return offset
+
+    def close(self):
+        """
+        Write the image directory. The stream itself is left open.
+
+        Raises:
+            ValueError: If the file outgrew the 4 GiB limit of classic TIFF.
+        """
+
+        def entry(tag, kind, values):
+            if len(values) * (2 if kind == TIFF_SHORT else 4) <= 4:
+                fmt = '<%d%s' % (len(values), 'H' if kind == TIFF_SHORT else 'I')
+                inline = struct.pack(fmt, *values).ljust(4, b'\0')
+            else:
+                offset = self._write_array('H' if kind == TIFF_SHORT else 'I', values)
+                inline = struct.pack('<I', offset)
+            return struct.pack('<HHI', tag, kind, len(values)) + inline
+
+        compression = COMPRESSION_DEFLATE[0] if self.compress_level else COMPRESSION_NONE
+        entries = [
+            entry(TAG_WIDTH, TIFF_LONG, [self.width]),
+            entry(TAG_HEIGHT, TIFF_LONG, [self.height]),
+            entry(TAG_BITS_PER_SAMPLE, TIFF_SHORT, [8, 8, 8]),
+            entry(TAG_COMPRESSION, TIFF_SHORT, [compression]),
+            entry(TAG_PHOTOMETRIC, TIFF_SHORT, [2]),
+            entry(TAG_STRIP_OFFSETS, TIFF_LONG, self.offsets),
+            entry(TAG_SAMPLES_PER_PIXEL, TIFF_SHORT, [CHANNELS]),
+            entry(TAG_ROWS_PER_STRIP, TIFF_LONG, [self.rows_per_strip]),
+            entry(TAG_STRIP_BYTE_COUNTS, TIFF_LONG, self.byte_counts),
+            entry(TAG_PLANAR_CONFIG, TIFF_SHORT, [1]),
+        ]
+        directory = self._tell()
+        if directory + 6 + 12 * len(entries) > 0xFFFFFFFF:
+            raise ValueError("Tiled output is larger than the 4 GiB a TIFF file can hold")
+        self.stream.write(struct.pack('<H', len(entries)) + b''.join(entries) + struct.pack('<I', 0))
+        end = self.stream.tell()
+        self.stream.seek(self._start + 4)
+        self.stream.write(struct.pack('<I', directory))
+        self.stream.seek(end)
+
+
+# Read the bits at the first positions of a pixel order, band by band
+def _gather_bits(reader, positions, count):
+    indices = channel_indices(positions, count)
+    band_channels = reader.size[0] * BAND_ROWS * CHANNELS
+    bands = indices // band_channels
+    bits = np.empty(count, dtype=np.uint8)
+    for band in np.unique(bands):
+        selected = bands == band
+        flat = reader.read_band(int(band)).reshape(-1)
+        bits[selected] = flat[indices[selected] - band * band_channels] & 1
+    return bits
+
+# Compute how many payload bits a tiled container can hold
+def tiled_capacity_bits(width, height):
+    """
+    Compute how many payload bits a tiled container can hold, header excluded.
+
+    Args:
+        width (int): The image width.
+        height (int): The image height.
+
+    Returns:
+        int: The number of payload bits.
+    """
+
+    return max(0, width * height * CHANNELS - HEADER_BITS)
+
+# Hide a payload inside a large image, one band at a time
+def embed_payload_tiled(image_path, payload, output_path, password, compress_level=6, flags=0):
+    """
+    Hide a payload as a tiled container, writing a striped TIFF.
+
+    Args:
+        image_path (str): The path to the carrier image.
+        payload (bytes): The bytes to hide.
+        output_path: The path of the TIFF file to write, or a writable and
+            seekable binary file object.
+        password (str): The password that keys the pixel order.
+        compress_level (int): zlib level for the output strips, 0 for none.
+        flags (int): ``FLAG_*`` values describing the payload. ``FLAG_TILED``
+            is always added.
+
+    Returns:
+        int: The number of bits written, including the header.
+
+    Raises:
+        ValueError: If the payload does not fit or the output is not a TIFF.
+    """
+
+    to_path = isinstance(output_path, (str, os.PathLike))
+    if to_path and not os.fspath(output_path).lower().endswith(('.tif', '.tiff')):
+        raise ValueError("Tiled output must be a .tif or .tiff file")
+    reader = BandReader(image_path)
+    width, height = reader.size
+    capacity = tiled_capacity_bits(width, height)
+    if len(payload) * 8 > capacity:
+        raise ValueError(f"Payload needs {len(payload) * 8} bits but the image only holds {capacity}")
+    bits = bytes_to_bits(pack_header(len(payload), flags=flags | FLAG_TILED) + payload)
+
+    with span('permutation'):
+        indices = channel_indices(TiledPermutation(password, width, height), len(bits))
+        band_channels = width * BAND_ROWS * CHANNELS
+        bands = indices // band_channels
+    # A path is written beside itself and moved into place once complete, so
+    # the carrier can be the output and a failure leaves no partial file
+    temporary = f"{os.fspath(output_path)}.{os.getpid()}.tmp" if to_path else None
+    output = open(temporary, 'wb') if to_path else output_path
+    try:
+        start = output.tell()
+        writer = StripWriter(output, width, height, BAND_ROWS, compress_level)
+        # Decoding, patching and encoding are interleaved band by band
+        with span('bands'):
+            for band in range(reader.band_count):
+                rows = reader.read_band(band)
+                selected = np.flatnonzero(bands == band)
+                if len(selected):
+                    rows = rows.copy()
+                    flat = rows.reshape(-1)
+                    local = indices[selected] - band * band_channels
+                    flat[local] = (flat[local] & 0xFE) | bits[selected]
+                writer.write_strip(rows)
+            writer.close()
+        count('bytes_out', output.tell() - start)
+    except BaseException:
+        if to_path:
+            output.close()
+            os.remove(temporary)
+        raise
+    if to_path:
+        output.close()
+        os.replace(temporary, output_path)
+    count('bits_written', len(bits))
+    count('pixels_touched', -(-len(bits) // CHANNELS))
+    return len(bits)
+
+# Recover a payload from a large image, decoding only the bands it lies in
+def extract_payload_tiled(image_path, password):
+    """
+    Recover the payload of a tiled container.
+
+    Args:
+        image_path (str): The path to the image.
+        password (str): The password that keys the pixel order.
+
+    Returns:
+        tuple: The header flags and the payload, or None if the image has no
+        tiled container for this password.
+    """
+
+    reader = BandReader(image_path)
+    width, height = reader.size
+    if width * height < HEADER_PIXELS:
+        return None
+    positions = TiledPermutation(password, width, height)
+    with span('extract'):
+        header = parse_header(bits_to_bytes(_gather_bits(reader, positions, HEADER_BITS)))
+    count('bits_read', HEADER_BITS)
+    count('pixels_touched', HEADER_PIXELS)
+    if header is None or not header.flags & FLAG_TILED or header.bits_per_channel != 1:
+        return None
+    bit_count = header.length * 8
+    if bit_count > tiled_capacity_bits(width, height):
+        return None
+    with span('permutation'):
+        body = positions[HEADER_PIXELS:HEADER_PIXELS + -(-bit_count // CHANNELS)]
+    with span('extract'):
+        payload = bits_to_bytes(_gather_bits(reader, body, bit_count))
+    count('bits_read', bit_count)
+    count('pixels_touched', len(body))
+    return header.flags, payload
@@ -0,0 +1,253 @@
+"""
+The format of the browser tool (``script.js``), read and written in Python.
+
+The browser tool XORs the UTF-8 text with the UTF-8 password, repeated,
+encodes the result as base64, and writes the 8 bits of each base64 character
+into the lowest bit of R, G and B of the pixels, in row-major order from the
+top-left pixel. Alpha is skipped, and there is no header, length or end
+marker. Its output is always an RGBA PNG.
+
+With no end marker, a reader has to find where the message stops. The lowest
+bits are read in chunks, as ``stego.engine.read_until_marker`` does, until a
+byte outside the base64 alphabet ends the run of characters. Carrier bits
+after the message can still happen to spell base64 characters (1 byte in 4
+does), so the reader tries the run cut to each whole number of base64
+quads, longest first, and keeps the first one that decrypts to printable
+text. Padding (``=``) ends the message outright.
+
+The XOR cipher has no authentication: any password "decrypts". A wrong one
+almost never yields printable text, which is how it is told apart, but this
+is a heuristic, and the format offers no secrecy worth the name. It is read
+here so images made in the browser can be processed server-side; new images
+should use the containers of ``stego.core``.
+"""
+
+import base64
+
+import numpy as np
+from PIL import Image
+
+from stego.core import IncorrectPasswordError, NoHiddenTextError
+from stego.engine import (
+    FIRST_CHUNK_PIXELS, MAX_CHUNK_PIXELS, bytes_to_bits, embed_bits, extract_bits,
+)
+from stego.metrics import count, operation, span
+from stego.output import check_output, save_image
+
+
+# The channels the browser writes, of its RGBA pixels
+WEB_CHANNELS = (0, 1, 2)
+BASE64_ALPHABET = b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/='
+# Base64 quads of carrier bits tried after the message, at most
+MAX_TRAILING_QUADS = 8
+
+_is_base64 = np.zeros(256, dtype=bool)
+_is_base64[np.frombuffer(BASE64_ALPHABET, dtype=np.uint8)] = True
+
+
+# XOR bytes with a repeated key
+def xor_bytes(data, key):
+    """
+    XOR bytes with a key repeated over their length, as ``script.js`` does.
+
+    Args:
+        data (bytes): The bytes.
+        key (bytes): The key, not empty.
+
+    Returns:
+        bytes: The result.
+    """
+
+    values = np.frombuffer(data, dtype=np.uint8)
+    return (values ^ np.resize(np.frombuffer(key, dtype=np.uint8), len(values))).tobytes()
+
+# Encrypt text as the browser tool does
+def encrypt_web_text(text, password):
+    """
+    Encrypt text the way ``encryptText`` of ``script.js`` does.
+
+    Args:
+        text (str): The text.
+        password (str): The password, not empty.
+
+    Returns:
+        bytes: The base64 characters, as ASCII.
+    """
+
+    return base64.b64encode(xor_bytes(text.encode(), password.encode()))
+
+# Decrypt text encrypted by the browser tool
+def decrypt_web_text(token, password):
+    """
+    Decrypt text the way ``decryptText`` of ``script.js`` does, strictly.
+
+    Args:
+        token (bytes): The base64 characters.
+        password (str): The password, not empty.
+
+    Returns:
+        str: The text, or None if it does not decode to printable UTF-8 text.
+    """
+
+    try:
+        text = xor_bytes(base64.b64decode(token, validate=True), password.encode()).decode()
+    except ValueError:
+        return None
+    if all(char.isprintable() or char in '\t\n\r' for char in text):
+        return text
+    return None
+
+# Convert an image to the pixels the browser reads
+def web_pixels(img):
+    """
+    Convert an image to the pixels a canvas of the browser holds.
+
+    Args:
+        img (PIL.Image.Image): The image.
+
+    Returns:
+        PIL.Image.Image: The image in RGB or RGBA mode.
+    """
+
+    if img.mode in ('RGB', 'RGBA'):
+        return img
+    return img.convert('RGBA' if 'transparency' in img.info or img.mode.endswith('A') else 'RGB')
+
+# Read the run of base64 characters at the start of the pixels
+def read_web_token(pixels):
+    """
+    Read the bytes at the start of the pixels while they are base64 characters.
+
+    Args:
+        pixels (numpy.ndarray): A ``(height, width, 3 or 4)`` ``uint8`` array.
+
+    Returns:
+        bytes: The run of base64 characters, possibly followed by carrier
+        bits that spell some by chance.
+    """
+
+    total = pixels.shape[0] * pixels.shape[1]
+    pieces = []
+    start = stop = 0
+    # Chunks of a multiple of 8 pixels, 24 bits, end on a byte boundary
+    size = FIRST_CHUNK_PIXELS
+    while start < total:
+        stop = min(start + size, total)
+        bits = extract_bits(pixels, np.arange(start, stop), 1, WEB_CHANNELS)
+        data = np.packbits(bits[:len(bits) - len(bits) % 8])
+        outside = np.flatnonzero(~_is_base64[data])
+        if outside.size:
+            pieces.append(data[:outside[0]])
+            break
+        pieces.append(data)
+        start = stop
+        size = min(size * 2, MAX_CHUNK_PIXELS)
+    count('pixels_touched', stop)
+    return b''.join(piece.tobytes() for piece in pieces)
+
+# Recover the text from the run of base64 characters
+def find_web_text(run, password):
+    """
+    Find the message in a run of base64 characters, see the module
+    documentation.
+
+    Args:
+        run (bytes): The characters ``read_web_token`` read.
+        password (str): The password.
+
+    Returns:
+        str: The text, or None if no cut of the run decrypts to printable
+        text.
+    """
+
+    padding = run.find(b'=')
+    if padding != -1:
+        end = padding + (2 if run[padding + 1:padding + 2] == b'=' else 1)
+        cuts = [end] if end % 4 == 0 else []
+    else:
+        longest = len(run) - len(run) % 4
+        cuts = range(longest, max(0, longest - 4 * MAX_TRAILING_QUADS), -4)
+    for end in cuts:
+        text = decrypt_web_text(run[:end], password)
+        if text is not None:
+            return text
+    return None
+
+# Hide text inside an image in the format of the browser tool
+def hide_web_text(image_path, text, output_image_path, password, preset=None):
+    """
+    Hide text inside an image exactly as the browser tool does.
+
+    Use it to write images the browser tool's users expect; the format is
+    weak, see the module documentation.
+
+    Args:
+        image_path: The path to the image, or a binary file object.
+        text (str): The text, not empty.
+        output_image_path: The path, or writable binary file object, to save the
+            image with hidden text to. It must be lossless, such as PNG.
+        password (str): The password, not empty.
+        preset (str): The output preset, see ``stego.output``.
+
+    Returns:
+        int: The number of bits written into the image.
+
+    Raises:
+        ValueError: If the text or password is empty, or the text does not fit.
+    """
+
+    if not text or not password:
+        raise ValueError("The browser format needs a text and a password")
+    with operation('hide'):
+        count('bytes_in', len(text.encode()))
+        with span('open'):
+            img = web_pixels(Image.open(image_path))
+        check_output(img.mode, output_image_path, preset)
+        with span('encrypt'):
+            bits = bytes_to_bits(encrypt_web_text(text, password))
+        if len(bits) > img.width * img.height * len(WEB_CHANNELS):
+            raise ValueError(f"The text needs {len(bits)} bits but the image only holds "
+                             f"{img.width * img.height * len(WEB_CHANNELS)}")
+        with span('decode'):
+            pixels = np.array(img, dtype=np.uint8)
+        with span('embed'):
+            embed_bits(pixels, bits, np.arange(-(-len(bits) // len(WEB_CHANNELS))), 1,
+                       WEB_CHANNELS)
+            img = Image.fromarray(pixels, img.mode)
+        count('bits_written', len(bits))
+        save_image(img, output_image_path, preset)
+        return len(bits)
+
+# Extract text hidden by the browser tool
+def extract_web_text(image_path, password):
+    """
+    Extract the text hidden inside an image by the browser tool.
+
+    Args:
+        image_path: The path to the image, or a binary file object.
+        password (str): The password used to hide the text.
+
+    Returns:
+        str: The text.
+
+    Raises:
+        NoHiddenTextError: If the image does not start with base64 characters.
+        IncorrectPasswordError: If they do not decrypt to printable text.
+    """
+
+    with operation('extract'):
+        with span('open'):
+            img = web_pixels(Image.open(image_path))
+        with span('decode'):
+            pixels = np.asarray(img, dtype=np.uint8)
+        with span('extract'):
+            run = read_web_token(pixels)
+        count('bytes_in', len(run))
+        if len(run) < 4 or not password:
+            raise NoHiddenTextError("No hidden text found.")
+        with span('decrypt'):
+            text = find_web_text(run, password)
+        if text is None:
+            raise IncorrectPasswordError("Incorrect password! Cannot decrypt.")
+        count('bytes_out', len(text.encode()))
+        return text
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from stego.crypto import encrypt_text
+from stego.engine import END_MARKER, bytes_to_bits, embed_bits
+from stego.permutation import make_permutation
+
+
+@pytest.fixture
+def make_image(tmp_path):
+    """Write images of random pixels to the test's directory."""
+
+    # Pick the array shape from the mode, so fromarray gives the mode back
+    def make(name='carrier.png', size=(64, 48), mode='RGB', seed=0):
+        channels = {'L': 1, 'LA': 2, 'RGB': 3, 'RGBA': 4}[mode]
+        shape = (size[1], size[0]) + ((channels,) if channels > 1 else ())
+        pixels = np.random.default_rng(seed).integers(0, 256, shape, dtype=np.uint8)
+        path = tmp_path / name
+        Image.fromarray(pixels).save(path)
+        return path
+
+    return make
+
+
+# Write text the way the original scripts did: the base64 token and the end
+# marker in the lowest bits of the RGB channels, in a given pixel order
+def write_end_marker_image(carrier, output, text, password, order):
+    with Image.open(carrier) as img:
+        pixels = np.array(img.convert('RGB'))
+    height, width = pixels.shape[:2]
+    marker = np.array([int(bit) for bit in END_MARKER], dtype=np.uint8)
+    bits = np.concatenate([bytes_to_bits(encrypt_text(text, password).encode()), marker])
+    embed_bits(pixels, bits, make_permutation(password, width * height, order))
+    Image.fromarray(pixels).save(output)
+    return output
@@ -0,0 +1,55 @@
+import os
+import time
+
+from stego.cache import DecodeCache
+from stego.core import extract_bytes, extract_text, hide_bytes, hide_text
+
+
+def test_memory_cache_decodes_once(make_image, tmp_path):
+    hide_text(make_image(), "cached", tmp_path / 'out.png', 'pw')
+    cache = DecodeCache()
+    for _ in range(3):
+        assert extract_text(tmp_path / 'out.png', 'pw', cache=cache) == "cached"
+    stats = cache.stats()
+    assert (stats['misses'], stats['hits'], stats['entries']) == (1, 2, 1)
+
+
+def test_disk_cache_outlives_the_instance(make_image, tmp_path):
+    hide_text(make_image(), "on disk", tmp_path / 'out.png', 'pw')
+    directory = tmp_path / 'cache'
+    first = DecodeCache(directory=directory)
+    assert extract_text(tmp_path / 'out.png', 'pw', cache=first) == "on disk"
+    cache = DecodeCache(directory=directory)
+    assert extract_text(tmp_path / 'out.png', 'pw', cache=cache) == "on disk"
+    assert cache.stats()['disk_hits'] == 1
+
+
+def test_cache_reads_deeper_bits_and_file_objects(make_image, tmp_path):
+    data = os.urandom(2000)
+    hide_bytes(make_image(), data, tmp_path / 'out.png', 'pw', depth=3)
+    cache = DecodeCache()
+    assert extract_bytes(tmp_path / 'out.png', 'pw', cache=cache) == data
+    with open(tmp_path / 'out.png', 'rb') as f:
+        assert extract_bytes(f, 'pw', cache=cache) == data
+    assert cache.stats()['hits'] >= 1
+
+
+def test_changed_file_is_decoded_again(make_image, tmp_path):
+    carrier = make_image()
+    output = tmp_path / 'out.png'
+    cache = DecodeCache()
+    hide_text(carrier, "first", output, 'pw')
+    assert extract_text(output, 'pw', cache=cache) == "first"
+    time.sleep(0.01)
+    hide_text(carrier, "second", output, 'pw')
+    assert extract_text(output, 'pw', cache=cache) == "second"
+    assert cache.stats()['misses'] == 2
+
+
+def test_cache_evicts_past_its_budget(make_image, tmp_path):
+    cache = DecodeCache(max_bytes=1)
+    for n in range(3):
+        hide_text(make_image(seed=n), f"image {n}", tmp_path / f'{n}.png', 'pw')
+        assert extract_text(tmp_path / f'{n}.png', 'pw', cache=cache) == f"image {n}"
+    stats = cache.stats()
+    assert (stats['entries'], stats['evictions']) == (1, 2)
@@ -0,0 +1,64 @@
+import os
+
+import pytest
+from PIL import Image
+
+from stego.candidates import extract_with_candidates
+from stego.container import FLAG_RAW, embed_payload
+from stego.core import (
+    IncorrectPasswordError, NoHiddenTextError, hide_bytes, hide_file, hide_for_recipients,
+    hide_text,
+)
+from stego.crypto import encrypt_bytes
+from stego.permutation import LEGACY
+from tests.conftest import write_end_marker_image
+
+
+WRONG = ['wrong-1', 'wrong-2']
+
+
+def test_finds_the_right_key_id(make_image, tmp_path):
+    hide_text(make_image(), "found", tmp_path / 'out.png', 'right')
+    candidates = {'a': WRONG[0], 'b': 'right', 'c': WRONG[1]}
+    match = extract_with_candidates(tmp_path / 'out.png', candidates)
+    assert match == ('b', b"found", None)
+    assert extract_with_candidates(tmp_path / 'out.png', WRONG + ['right']).key_id == 2
+
+
+def test_files_and_shared_images(make_image, tmp_path):
+    (tmp_path / 'notes.txt').write_bytes(b'notes')
+    hide_file(make_image(), tmp_path / 'notes.txt', tmp_path / 'file.png', 'right')
+    match = extract_with_candidates(tmp_path / 'file.png', WRONG + ['right'])
+    assert match == (2, b'notes', 'notes.txt')
+
+    hide_for_recipients(make_image(), {'alice': 'for alice', 'bob': 'for bob'},
+                        tmp_path / 'shared.png')
+    assert extract_with_candidates(tmp_path / 'shared.png', WRONG + ['bob']).plaintext == b'for bob'
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_end_marker_images(make_image, tmp_path, workers):
+    image = write_end_marker_image(make_image(), tmp_path / 'old.png', "old", 'right', LEGACY)
+    match = extract_with_candidates(image, WRONG + ['right'], workers=workers)
+    assert match == (2, b"old", None)
+    with pytest.raises(NoHiddenTextError):
+        extract_with_candidates(image, WRONG + ['right'], legacy=False)
+
+
+def test_no_candidate_opens_the_image(make_image, tmp_path):
+    data = os.urandom(64)
+    hide_bytes(make_image(), data, tmp_path / 'out.png', 'right')
+    with pytest.raises(NoHiddenTextError):
+        extract_with_candidates(tmp_path / 'out.png', WRONG, legacy=False)
+    with pytest.raises(NoHiddenTextError):
+        extract_with_candidates(tmp_path / 'out.png', [])
+
+
+def test_header_without_decryption_is_an_incorrect_password(make_image, tmp_path):
+    # The container is keyed by one password, the token encrypted with another
+    with Image.open(make_image()) as img:
+        img = img.convert('RGB')
+    embed_payload(img, encrypt_bytes(b'secret', 'other'), 'right', FLAG_RAW)
+    img.save(tmp_path / 'out.png')
+    with pytest.raises(IncorrectPasswordError):
+        extract_with_candidates(tmp_path / 'out.png', WRONG + ['right'], legacy=False)
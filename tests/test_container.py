@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+from stego.container import HEADER, MAGIC, MAX_SLOTS, pack_header, parse_header
+from stego.core import (
+    PayloadTooLargeError, capacity, check_fits, extract_bytes, hide_bytes,
+)
+
+
+def test_header_round_trip():
+    header = parse_header(pack_header(1234, bits_per_channel=3, flags=0x22, slots=4, slot=2))
+    assert (header.version, header.bits_per_channel, header.flags, header.length,
+            header.slots, header.slot) == (1, 3, 0x22, 1234, 4, 2)
+
+
+@pytest.mark.parametrize('data', [
+    b'XMSG' + pack_header(10)[4:],
+    pack_header(10)[:4] + b'\x02' + pack_header(10)[5:],
+    HEADER.pack(MAGIC, 1, 0, 0, 0, 10),
+    HEADER.pack(MAGIC, 1, 5, 0, 0, 10),
+    HEADER.pack(MAGIC, 1, 1, 0, 0x12, 10),
+])
+def test_header_rejects_foreign_data(data):
+    assert parse_header(data) is None
+
+
+@pytest.mark.parametrize('mode, depth, alpha, tiled, output', [
+    ('RGB', 1, False, False, 'out.png'),
+    ('RGB', 4, False, False, 'out.png'),
+    ('L', 2, False, False, 'out.png'),
+    ('RGBA', 1, True, False, 'out.png'),
+    ('RGB', 1, False, True, 'out.tif'),
+])
+def test_capacity_boundary(make_image, tmp_path, mode, depth, alpha, tiled, output):
+    carrier = make_image('carrier.tif' if tiled else 'carrier.png', mode=mode)
+    room = capacity(carrier, depth, alpha, tiled)
+    data = os.urandom(room.max_plaintext)
+    assert check_fits(carrier, len(data), depth, alpha, tiled) == room
+    hide_bytes(carrier, data, tmp_path / output, 'pw', tiled, depth, alpha)
+    assert extract_bytes(tmp_path / output, 'pw', tiled) == data
+
+    with pytest.raises(PayloadTooLargeError):
+        check_fits(carrier, len(data) + 1, depth, alpha, tiled)
+    with pytest.raises(PayloadTooLargeError):
+        hide_bytes(carrier, data + b'x', tmp_path / f'over-{output}', 'pw', tiled, depth, alpha)
+    assert not (tmp_path / f'over-{output}').exists()
+
+
+def test_capacity_rejects_unsupported_settings(make_image):
+    carrier = make_image()
+    for settings in ({'depth': 0}, {'depth': 5}, {'tiled': True, 'depth': 2},
+                     {'slots': MAX_SLOTS + 1}, {'tiled': True, 'slots': 2}):
+        with pytest.raises(ValueError):
+            capacity(carrier, **settings)
@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+from stego.core import (
+    NoHiddenTextError, PayloadTypeError, StegoError, extract_bytes,
+    extract_file, extract_text, hide_bytes, hide_file, hide_text,
+)
+from stego.permutation import KEYED, LEGACY
+from tests.conftest import write_end_marker_image
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MESSAGE = "Grüße — the quick brown fox jumps over the lazy dog."
+
+
+@pytest.mark.parametrize('mode, depth, alpha', [
+    ('RGB', 1, False), ('RGB', 2, False), ('RGB', 4, False), ('L', 1, False),
+    ('LA', 1, True), ('RGBA', 1, False), ('RGBA', 3, True),
+])
+def test_text_round_trip(make_image, tmp_path, mode, depth, alpha):
+    carrier = make_image(mode=mode)
+    hide_text(carrier, MESSAGE, tmp_path / 'out.png', 'pw', depth=depth, alpha=alpha)
+    assert extract_text(tmp_path / 'out.png', 'pw') == MESSAGE
+
+
+def test_bytes_and_file_round_trip(make_image, tmp_path):
+    carrier = make_image()
+    data = os.urandom(300)
+    hide_bytes(carrier, data, tmp_path / 'bytes.png', 'pw')
+    assert extract_bytes(tmp_path / 'bytes.png', 'pw') == data
+
+    (tmp_path / 'notes.txt').write_bytes(data)
+    hide_file(carrier, tmp_path / 'notes.txt', tmp_path / 'file.png', 'pw')
+    assert extract_file(tmp_path / 'file.png', 'pw') == ('notes.txt', data)
+    with pytest.raises(PayloadTypeError):
+        extract_text(tmp_path / 'file.png', 'pw')
+
+
+def test_tiled_round_trip(make_image, tmp_path):
+    carrier = make_image(size=(300, 600))
+    with pytest.warns(RuntimeWarning, match='decoded at once'):
+        hide_text(carrier, MESSAGE, tmp_path / 'out.tif', 'pw', tiled=True)
+    assert extract_text(tmp_path / 'out.tif', 'pw', tiled=True) == MESSAGE
+
+
+def test_wrong_password_and_missing_payload(make_image, tmp_path):
+    carrier = make_image()
+    hide_text(carrier, MESSAGE, tmp_path / 'out.png', 'pw')
+    with pytest.raises(StegoError):
+        extract_text(tmp_path / 'out.png', 'other')
+    with pytest.raises(NoHiddenTextError):
+        extract_text(carrier, 'pw', legacy=False)
+
+
+@pytest.mark.parametrize('order', [KEYED, LEGACY])
+def test_end_marker_round_trip(make_image, tmp_path, order):
+    image = write_end_marker_image(make_image(), tmp_path / 'old.png', MESSAGE, 'pw', order)
+    assert extract_text(image, 'pw') == MESSAGE
+    assert extract_text(image, 'pw', legacy=True) == MESSAGE
+    with pytest.raises(NoHiddenTextError):
+        extract_text(image, 'pw', legacy=False)
+    with pytest.raises(StegoError):
+        extract_text(image, 'other', legacy=True)
+
+
+# The image of the original scripts, in the repository since the start
+def test_baseline_image():
+    image = os.path.join(ROOT, 'hidden_image.png')
+    expected = " just some initial text to hide in the image."
+    assert extract_text(image, 'konopasswordlagena') == expected
+    assert extract_text(image, 'konopasswordlagena', legacy=True) == expected
+    with pytest.raises(StegoError):
+        extract_text(image, 'not the password')
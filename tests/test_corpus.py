@@ -0,0 +1,10 @@
+import pytest
+
+from corpus.verify import check_entry, load_entries
+
+
+@pytest.mark.parametrize(
+    'entry', load_entries(), ids=lambda entry: f"{entry['image']}-{entry['password']}"
+)
+def test_corpus_entry(entry):
+    assert check_entry(entry) == []
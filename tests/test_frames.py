@@ -0,0 +1,60 @@
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from stego.container import capacity_bits
+from stego.core import PayloadTooLargeError, capacity, extract_bytes, hide_bytes
+from stego.frames import frame_rooms
+
+
+# Write a multi-page TIFF of random pages of the given sizes
+def _pages(path, sizes):
+    rng = np.random.default_rng(0)
+    pages = [Image.fromarray(rng.integers(0, 256, (height, width, 3), dtype=np.uint8))
+             for width, height in sizes]
+    pages[0].save(path, save_all=True, append_images=pages[1:])
+    return path
+
+
+def test_rooms_follow_the_size_of_each_page(tmp_path):
+    path = _pages(tmp_path / 'mixed.tif', [(40, 30), (10, 10)])
+    with Image.open(path) as img:
+        rooms = frame_rooms(img)
+        assert img.tell() == 0
+    assert rooms == [capacity_bits(40 * 30, 'RGB') // 8, capacity_bits(10 * 10, 'RGB') // 8]
+    assert capacity(path).payload_bytes == sum(rooms)
+
+
+def test_mixed_pages_hold_exactly_their_capacity(tmp_path):
+    path = _pages(tmp_path / 'mixed.tif', [(40, 30), (10, 10)])
+    room = capacity(path)
+    data = os.urandom(room.max_plaintext)
+    hide_bytes(path, data, tmp_path / 'out.tif', 'pw')
+    assert extract_bytes(tmp_path / 'out.tif', 'pw') == data
+
+    # One byte more is refused from the headers, before any frame is decoded
+    with pytest.raises(PayloadTooLargeError):
+        hide_bytes(path, data + b'x', tmp_path / 'over.tif', 'pw')
+    assert not (tmp_path / 'over.tif').exists()
+
+
+def test_animated_png_round_trip(tmp_path):
+    frames = [Image.fromarray(np.full((20, 30, 3), shade, dtype=np.uint8))
+              for shade in (10, 120, 240)]
+    frames[0].save(tmp_path / 'anim.png', save_all=True, append_images=frames[1:])
+    room = capacity(tmp_path / 'anim.png')
+    assert room.payload_bytes == 3 * (capacity_bits(20 * 30, 'RGB') // 8)
+    data = os.urandom(room.max_plaintext)
+    hide_bytes(tmp_path / 'anim.png', data, tmp_path / 'out.png', 'pw')
+    with Image.open(tmp_path / 'out.png') as out:
+        assert out.n_frames == 3
+    assert extract_bytes(tmp_path / 'out.png', 'pw') == data
+
+
+def test_gif_output_is_rejected(tmp_path):
+    path = _pages(tmp_path / 'pages.tif', [(20, 20), (20, 20)])
+    with pytest.raises(ValueError):
+        hide_bytes(path, b'data', tmp_path / 'out.gif', 'pw')
+    assert not (tmp_path / 'out.gif').exists()
@@ -0,0 +1,25 @@
+import pytest
+
+import stego
+from bench.import_time import EAGER_MODULES, LAZY_MODULES, probe
+
+
+@pytest.mark.parametrize('module', LAZY_MODULES)
+def test_lazy_imports_load_nothing_heavy_and_print_nothing(module):
+    result = probe(module)
+    assert result['loaded'] == []
+    assert not result['printed']
+
+
+@pytest.mark.parametrize('module', EAGER_MODULES)
+def test_eager_imports_print_nothing(module):
+    assert not probe(module)['printed']
+
+
+# Every lazy name of the package resolves to the object of its module
+def test_lazy_names_resolve():
+    for name in stego.__all__:
+        value = getattr(stego, name)
+        assert getattr(__import__(stego._API[name], fromlist=[name]), name) is value
+    with pytest.raises(AttributeError):
+        stego.no_such_name
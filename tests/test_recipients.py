@@ -0,0 +1,38 @@
+import pytest
+
+from stego.container import MAX_SLOTS
+from stego.core import (
+    PayloadTooLargeError, StegoError, capacity, extract_bytes, extract_text,
+    hide_for_recipients,
+)
+
+
+def test_each_recipient_reads_their_own_message(make_image, tmp_path):
+    recipients = {f'pw-{n}': f"message for recipient {n}" for n in range(3)}
+    hide_for_recipients(make_image(), recipients, tmp_path / 'out.png')
+    for password, message in recipients.items():
+        assert extract_text(tmp_path / 'out.png', password) == message
+    with pytest.raises(StegoError):
+        extract_text(tmp_path / 'out.png', 'pw-9', legacy=False)
+
+
+def test_recipients_take_bytes_and_pairs(make_image, tmp_path):
+    hide_for_recipients(make_image(), [('a', b'\x00\x01'), ('b', 'text')], tmp_path / 'out.png')
+    assert extract_bytes(tmp_path / 'out.png', 'a') == b'\x00\x01'
+    assert extract_text(tmp_path / 'out.png', 'b') == 'text'
+
+
+def test_slot_capacity_boundary(make_image, tmp_path):
+    carrier = make_image()
+    room = capacity(carrier, slots=2)
+    fits = {'a': b'a' * room.max_plaintext, 'b': b'b'}
+    hide_for_recipients(carrier, fits, tmp_path / 'out.png')
+    assert extract_bytes(tmp_path / 'out.png', 'a') == fits['a']
+    with pytest.raises(PayloadTooLargeError):
+        hide_for_recipients(carrier, {'a': fits['a'] + b'a', 'b': b'b'}, tmp_path / 'over.png')
+
+
+def test_too_many_recipients(make_image, tmp_path):
+    recipients = {f'pw-{n}': 'hi' for n in range(MAX_SLOTS + 1)}
+    with pytest.raises(ValueError):
+        hide_for_recipients(make_image(), recipients, tmp_path / 'out.png')
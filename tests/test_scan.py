@@ -0,0 +1,52 @@
+import os
+
+import numpy as np
+from PIL import Image
+
+from stego.container import FLAG_RAW, embed_payload
+from stego.core import capacity, hide_bytes, hide_text
+from stego.crypto import encrypt_bytes
+from stego.scan import CLEAN, DAMAGED, FOUND, INTACT, LOSSY, SUSPECT, scan_image
+
+
+# A smooth image, whose low bits are not random like those of noise
+def _smooth(path):
+    rows, columns = np.mgrid[0:120, 0:160]
+    pixels = np.stack([rows + columns // 2, rows * 2, columns], axis=2) % 256
+    Image.fromarray(pixels.astype(np.uint8)).save(path)
+    return path
+
+
+def test_keys_give_the_state_of_the_payload(tmp_path):
+    carrier = _smooth(tmp_path / 'carrier.png')
+    hide_text(carrier, "scanned", tmp_path / 'intact.png', 'right')
+    keys = {'k1': 'wrong', 'k2': 'right'}
+    result = scan_image(str(tmp_path / 'intact.png'), keys)
+    assert (result['verdict'], result['key_id']) == (INTACT, 'k2')
+    assert scan_image(str(tmp_path / 'intact.png'), keys, verify=False)['verdict'] == FOUND
+
+    # A header of the key in front of a token it does not decrypt
+    with Image.open(carrier) as img:
+        img = img.convert('RGB')
+    embed_payload(img, encrypt_bytes(b'secret', 'other'), 'right', FLAG_RAW)
+    img.save(tmp_path / 'damaged.png')
+    assert scan_image(str(tmp_path / 'damaged.png'), keys)['verdict'] == DAMAGED
+
+
+def test_payload_across_frames_is_intact(tmp_path):
+    pages = [Image.open(_smooth(tmp_path / f'{n}.png')).convert('RGB') for n in range(2)]
+    pages[0].save(tmp_path / 'pages.tif', save_all=True, append_images=pages[1:])
+    data = os.urandom(capacity(tmp_path / 'pages.tif').max_plaintext)
+    hide_bytes(tmp_path / 'pages.tif', data, tmp_path / 'out.tif', 'right')
+    assert scan_image(str(tmp_path / 'out.tif'), {'k': 'right'})['verdict'] == INTACT
+
+
+def test_statistics_without_keys(tmp_path):
+    carrier = _smooth(tmp_path / 'carrier.png')
+    assert scan_image(str(carrier))['verdict'] == CLEAN
+    data = os.urandom(capacity(carrier).max_plaintext)
+    hide_bytes(carrier, data, tmp_path / 'full.png', 'pw')
+    assert scan_image(str(tmp_path / 'full.png'))['verdict'] == SUSPECT
+
+    Image.open(carrier).save(tmp_path / 'photo.jpg')
+    assert scan_image(str(tmp_path / 'photo.jpg'))['verdict'] == LOSSY
@@ -0,0 +1,48 @@
+import asyncio
+import json
+
+import pytest
+
+from stego.server import HTTPError, StegoServer, read_request
+
+
+# Read a request from raw bytes
+def _read(data):
+    async def read():
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        return await read_request(reader)
+
+    return asyncio.run(read())
+
+
+def test_request_with_body():
+    request = _read(b'POST /extract?x=1 HTTP/1.1\r\nContent-Length: 2\r\n\r\n{}')
+    assert request == ('POST', '/extract', {'content-length': '2'}, b'{}')
+
+
+@pytest.mark.parametrize('length', [b'abc', b'-5', b'+5', b'1_0', b'\xb2', b''])
+def test_malformed_content_length_is_a_bad_request(length):
+    with pytest.raises(HTTPError) as raised:
+        _read(b'POST /hide HTTP/1.1\r\nContent-Length: ' + length + b'\r\n\r\n')
+    assert raised.value.status == 400
+
+
+# A malformed request gets an answer instead of killing the connection task
+def test_malformed_request_is_answered():
+    async def exchange():
+        server = await asyncio.start_server(StegoServer(None).handle, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b'POST /hide HTTP/1.1\r\nContent-Length: -1\r\n\r\n')
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        return response
+
+    head, _, body = asyncio.run(exchange()).partition(b'\r\n\r\n')
+    assert head.startswith(b'HTTP/1.1 400 ')
+    assert 'Content-Length' in json.loads(body)['error']
@@ -0,0 +1,56 @@
+import io
+import os
+
+import pytest
+
+from stego.core import (
+    PayloadTooLargeError, StegoError, capacity, extract_bytes, extract_stream, hide_bytes,
+    hide_stream,
+)
+from stego.stream import stream_size
+
+
+CHUNK = 256
+
+
+@pytest.mark.parametrize('kind', ['bytes', 'file', 'iterable'])
+def test_stream_round_trip(make_image, tmp_path, kind):
+    data = os.urandom(CHUNK * 5 + 17)
+    source = {'bytes': data, 'file': io.BytesIO(data),
+              'iterable': (data[n:n + 100] for n in range(0, len(data), 100))}[kind]
+    hide_stream(make_image(size=(128, 96)), source, tmp_path / 'out.png', 'pw', depth=2,
+                chunk_size=CHUNK)
+    sink = io.BytesIO()
+    assert extract_stream(tmp_path / 'out.png', 'pw', sink) == len(data)
+    assert sink.getvalue() == data
+    assert extract_bytes(tmp_path / 'out.png', 'pw') == data
+
+
+def test_stream_sink_takes_other_payloads(make_image, tmp_path):
+    hide_bytes(make_image(), b'plain bytes', tmp_path / 'out.png', 'pw')
+    sink = io.BytesIO()
+    extract_stream(tmp_path / 'out.png', 'pw', sink)
+    assert sink.getvalue() == b'plain bytes'
+
+
+def test_stream_capacity_boundary(make_image, tmp_path):
+    carrier = make_image()
+    room = capacity(carrier).payload_bytes
+    size = 0
+    while stream_size(size + 1, CHUNK) <= room:
+        size += 1
+    data = os.urandom(size)
+    hide_stream(carrier, data, tmp_path / 'out.png', 'pw', chunk_size=CHUNK)
+    assert extract_bytes(tmp_path / 'out.png', 'pw') == data
+    with pytest.raises(PayloadTooLargeError):
+        hide_stream(carrier, data + b'x', tmp_path / 'over.png', 'pw', chunk_size=CHUNK)
+    # A source of unknown size fails when the image is full
+    with pytest.raises(PayloadTooLargeError):
+        hide_stream(carrier, iter([data, b'x']), tmp_path / 'over.png', 'pw', chunk_size=CHUNK)
+    assert not (tmp_path / 'over.png').exists()
+
+
+def test_stream_wrong_password(make_image, tmp_path):
+    hide_stream(make_image(), b'x' * 600, tmp_path / 'out.png', 'pw', chunk_size=CHUNK)
+    with pytest.raises(StegoError):
+        extract_stream(tmp_path / 'out.png', 'other', io.BytesIO(), legacy=False)